@@ -5,6 +5,11 @@
 # A program that repairs references in a set of
 # DITA source files.
 #
+# The repaired files are written together at the end as one
+# transaction, journaled in the .ditarepair directory, so an
+# interrupted repair can be finished or undone with
+# ditajournal.py.
+#
 # Tested with Python 3.12.2
 # May 21, 2024
 #
@@ -22,6 +27,7 @@ from xml.parsers.expat import *
 import sys
 import os
 import xml.dom.minidom
+from DITAmod import RepairTransaction, REPAIR_DIR
 
 # setting this to True traces execution in great detail
 dbgflag = False
@@ -113,6 +119,9 @@ def FindSourceFiles(filelist,dir):
         fdir = f[0]
         # get list of files in this directory
         flist = f[2]
+        # leave out the backups of a repair
+        if REPAIR_DIR in f[1]:
+            f[1].remove(REPAIR_DIR)
         for ff in flist:
             fpath = os.path.join(fdir,ff)
             # is it a source file?
@@ -408,10 +417,10 @@ def CheckHrefs(fl,flag):
     #    the DOCTYPE
     #    any <!-- ... -> comment lines
     #
+    # (the file is written with the others by txn.commit)
+    #
     if fixed>0:
-        fout = open(outfile,"w")
-        fout.write(fstr)
-        fout.close()
+        txn.add(outfile,fstr)
         print("writing",fixed,"changes to",outfile)
         
                         
@@ -580,6 +589,14 @@ if fixflag:
 else:
     print(" scan only")
 
+# repairs are planned during the scan and written at the end
+txn = RepairTransaction(os.path.join(source_dir,REPAIR_DIR))
+if fixflag and txn.blocked():
+    print("An unfinished repair is recorded in",txn.journal)
+    print("finish it with ditajournal.py --resume, undo it with --rollback,")
+    print("or look at it with ditajournal.py")
+    sys.exit(1)
+
 ###################################
 #
 # MAIN PROCESSING SECTION
@@ -616,5 +633,14 @@ if dbgflag:
 # scan all files checking hrefs and (optionally) fix problems
 for f in filelist:
     CheckHrefs(f,fixflag)
+
+# write the repaired files
+if len(txn)>0:
+    try:
+        txn.commit()
+    except KeyboardInterrupt:
+        print("repair interrupted: finish it with ditajournal.py --resume or undo it with --rollback")
+        raise
+    print(len(txn.entries),"files repaired (undo with ditajournal.py --rollback)")
     
 print("DITARepair: exit")
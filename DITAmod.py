@@ -17,19 +17,46 @@
 ###################################
 
 # import needed modules
-from   lxml import etree
+#
+# Only cheap modules are imported here. lxml, json, subprocess,
+# multiprocessing and the other heavier modules are imported
+# inside the functions that use them, so tools (and dita.py
+# --help) that never parse XML or save anything start fast.
 import sys
 import os
 import os.path
-import shutil
-import glob
-from   xml.parsers.expat import *
+import collections
+import time
+
+# the names "from xml.parsers.expat import *" brought in
+# when DITAmod imported it at load time
+expatnames=('EXPAT_VERSION','ErrorString','ExpatError','ParserCreate',
+            'XMLParserType','XML_PARAM_ENTITY_PARSING_ALWAYS',
+            'XML_PARAM_ENTITY_PARSING_NEVER',
+            'XML_PARAM_ENTITY_PARSING_UNLESS_STANDALONE','error','errors',
+            'expat_CAPI','features','model','native_encoding','version_info')
 
-# debug flag - setting this to True traces execution in great detail
-dbgflag = False
+#
+# Function to give code that asks for the names DITAmod
+# used to have at load time the module or value, found only
+# then: etree, shutil, glob and the xml.parsers.expat names
+# (imported on first use), and the old module globals
+# dbgflag, keyvalues and project_dir (the default project's
+# settings). "from DITAmod import *" no longer brings these
+# in; scripts import or ask for what they use themselves.
+#
+def __getattr__(name):
+    import importlib
 
-# saved project directory
-project_dir=""
+    if name=='etree':
+        return importlib.import_module("lxml.etree")
+    if name in ('shutil','glob'):
+        return importlib.import_module(name)
+    if name in expatnames:
+        return getattr(importlib.import_module("xml.parsers.expat"),name)
+    if name in ('dbgflag','keyvalues','project_dir'):
+        return getattr(defaultproject,name)
+    raise AttributeError("module 'DITAmod' has no attribute '"+name+"'")
 
 # possible DITA filetype tuple
 ditatypes = (".dita",".ditamap",".xml",".XML")
@@ -47,8 +74,58 @@ TYPE_TOPICID = 3
 TYPE_CONTENTID = 4
 TYPE_EXT = 5
 
-# key values
-keyvalues = {}
+# files larger than this many bytes are scanned with the
+# streaming parser by default (see setstreamsize)
+STREAM_SIZE = 64*1024*1024
+
+# pipelined scans (see setpipeline): files waiting between
+# stages, and files ahead of the readers to hint to the OS
+PIPE_DEPTH = 32
+READ_AHEAD = 16
+
+# the fields ScanTopic can be asked to extract (see
+# setfields), each with the fields that come with it;
+# directory, basename, topicid and doctype are always there
+SCAN_FIELDS = {
+    'elementids': ('idlines',),
+    'hrefs':      ('reftypes','hreflines'),
+    'keyrefs':    ('keyreftypes','keyreflines'),
+    'keys':       ('keyhrefs',),
+    'keywords':   ('keywordlines',),
+    'indexterms': (),
+    'title':      (),
+}
+
+# bytes fed to the parser at a time when reading prologs, so
+# that it stops soon after the prolog (see ReadMetadata)
+META_CHUNK = 512
+
+# project snapshot files (see Snapshot): magic bytes, format
+# version, and the order of their sections
+SNAPSHOT_MAGIC = b"DITASNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SECTIONS = ("stroffsets","strings","fields","recoffsets","records",
+                     "paths","byfile","keys","mapfiles","edges","redges","meta")
+
+# records a RecordStore buffers before writing them to its
+# database, and the database page cache size in KiB
+STORE_BATCH = 500
+STORE_CACHE = 16*1024
+
+# directory (in the project) a RepairTransaction keeps its
+# journal and backups in, and the threads that write files
+REPAIR_DIR = ".ditarepair"
+REPAIR_THREADS = 16
+
+# false positive rate of the shard Bloom filters (see BloomFilter)
+BLOOM_FP = 0.01
+
+# most paths remembered by the path cache (see PathCache)
+PATH_CACHE_SIZE = 100000
+
+# MinHash settings: words per shingle, number of hash functions
+SHINGLE_WORDS = 5
+MINHASH_SIZE = 64
 
 ###################################
 # FUNCTION DEFINITION SECTION
@@ -63,195 +140,85 @@ def getMapDirs(mapfiles):
         print("getMapDirs for",len(mapfiles),"files")
 
     mdir = []
+    # set used for membership tests, the list keeps the order
+    seen = set()
 
     for f in mapfiles:
         if isURL(f):
             continue
         
-        mfd = os.path.dirname(os.path.abspath(f))
+        mfd = os.path.dirname(canonPath(f))
         
-        if not (mfd in mdir):
+        if not (mfd in seen):
+            seen.add(mfd)
             mdir.append(mfd)
                         
     return mdir
 
 #
-# Function to return a list of all files
-# used by a DITA map. We return:
-#
-#   mapfiles - file path
-#   idlist - dictionary list of file information
+# Function to return the map files to start from
+# for a map path (a .ditamap file or a directory
+# of .ditamap files).
+# (on the default project, see Project.getRootMaps)
 #
-def GetMapInventory(mapfiles,idlist,mappath):
-        
-    if dbgflag:
-        print("EnterGetMapInventory",mappath)
+def getRootMaps(mappath):
+    return defaultproject.getRootMaps(mappath)
 
-    # intialize list of map filepaths
-    maps=[]
-
-    # save project directory
-    setpdir(mappath)
-    
-    if os.path.exists(mappath):
-        if os.path.isdir(mappath):
-            # get a list of the ditamaps in the directory
-            maps = glob.glob(mappath+"/*.ditamap")
-        else:
-            # input was not a directory
-            maps=[mappath]
-        if dbgflag:
-            # display the maps to be used
-            for m in maps:
-                print("map file:",m)
-            print(" ")
-            
-    else:
-        print("GetMapInventory error",mappath,"does not exist")
-
-    if dbgflag:
-        print("map count =",len(maps))
-            
-    # remember files we have scanned
-    filedict={}
-    # first collect information in the maps
-    for map in maps:
-        filedict[map]=False
-        
-    # initialize not scanned count
-    notscanned=len(filedict)
-    
-    # keep scanning until we don't find any new references to unscanned files
-    while notscanned>0:
-        if dbgflag:
-            print(notscanned,"files to be scanned")
-        ns=0
-        olddict=filedict.copy()
-        for ff in olddict:
-            # Check for unscanned files 
-            if filedict[ff]==False:
-                # file has not yet been scanned
-                mapfiles.append(ff)
-                # scan this file
-                filedict[ff]=True
-                loclist=ScanSourceFile(ff,idlist)
-                # look for hrefs to add to the scan list
-                for lcl in loclist:
-                    if 'hrefs' in lcl:
-                       # there is an href
-                       for href in lcl['hrefs']:
-                           if isURL(href):
-                               # URL href
-                               filedict[href]=False
-                               ns=ns+1
-                               if dbgflag:
-                                   print(href,"URL not yet scanned")
-                           else:
-                               # file href
-                               xdir, xfile, xtopic, xcont = parseHref(href)
-                               if len(xdir)>0:
-                                   absdir=os.path.normpath(xdir)
-                                   absdir=os.path.abspath(absdir)
-                                   xfpath=absdir+os.sep+xfile
-                               else:
-                                   xfpath=xfile
-                               if not xfpath in filedict:
-                                   # href file not already scanned
-                                   filedict[xfpath]=False
-                                   ns=ns+1
-                                   if dbgflag:
-                                       print(href,"file not yet scanned")
-                
-        notscanned=ns
+#
+# Function to return the file part of a normalized
+# reference (everything before the #topicid).
+#
+def hrefFile(h):
+    p = h.find('#')
+    if p > -1:
+        return h[0:p]
+    return h
 
-        
-    return
+#
+# Function to return a list of all files
+# used by a DITA map
+# (on the default project, see Project.GetMapInventory)
+#
+def GetMapInventory(mapfiles,idlist,mappath,graph=None,index=None):
+    return defaultproject.GetMapInventory(mapfiles,idlist,mappath,graph,index)
 
 #
+# Function to scan every file reachable from a set of
+# map files through href/conref/data references.
+# (on the default project, see Project.ScanMapClosure)
+#
+def ScanMapClosure(maps,mapfiles,idlist,graph=None,index=None):
+    return defaultproject.ScanMapClosure(maps,mapfiles,idlist,graph,index)
+
 #
 # Function to return a list of all source files
 # in a directory (dir).
+# (on the default project, see Project.GetFileInventory)
 #
-# In each list output entry we have:
-#    file-path file-doctype (or None)
-#
-def GetFileInventory(filelist,dir,idlist):
-    global keyvalues
-
-    keyvalues={}
-        
-    if dbgflag:
-        print ("Enter GetFileInventory",dir)
-    rc = True
-
-    # save project directory
-    setpdir(dir)
-    
-    # validate we have a directory
-    if os.path.isdir(dir) != True:
-        print ("Error",dir,"is not a directory") 
-        return False
-
-    # temporary list of all files in the directory
-    allfiles = os.walk(dir)
-
-    # build up the filelist
-    for f in allfiles:
-        # get current directory
-        fdir = f[0]
-        # get list of files in this directory
-        flist = f[2]
-        for ff in flist:
-            fpath = os.path.join(fdir,ff)
-            # remember file path
-            filelist.append(fpath)
-            
-    if dbgflag:
-        print(len(filelist),"files found")
-
-    # scan the files (if required)
-    if idlist!=None:
-        # scan the files in the list
-        for fle in filelist:
-            ScanSourceFile(fle,idlist)
-                    
-    return rc
+def GetFileInventory(filelist,dir,idlist,graph=None,index=None):
+    return defaultproject.GetFileInventory(filelist,dir,idlist,graph,index)
 
 #
-# Functions to set/return project directory
+# Function to return the project directory
+# (on the default project, see Project.getpdir)
 #
 def getpdir():
-    return project_dir
+    return defaultproject.getpdir()
 
+#
+# Function to set the project directory
+# (on the default project, see Project.setpdir)
+#
 def setpdir(p):
-    global project_dir
-
-    if dbgflag:
-        print("setpdir",p)
-        
-    if os.path.isdir(p):
-        project_dir=p
-    else:
-        ps=os.path.split(p)
-        project_dir=ps[0]
+    return defaultproject.setpdir(p)
 
-    if dbgflag:
-        print("setpdir to",project_dir)
-    
-       
 #
 # Function to display a file path relative to
 # the project directory.
+# (on the default project, see Project.ppath)
 #
 def ppath(f):
-    pd=getpdir()
-    if isURL(f):
-        return f
-    else:
-        if len(f)>0:
-        	return os.path.relpath(f,pd)
-        else:
-        	return f
+    return defaultproject.ppath(f)
 
 #
 # Function to extract file path from big list
@@ -268,12 +235,39 @@ def GetInputPath():
     source_spec = os.getcwd()
 
     # use first argument (if provided)
-    for i in range(len(sys.argv)):
-       if i==1:
-            source_spec=sys.argv[i]
+    args = GetArgs()
+    if len(args)>0:
+        source_spec=args[0]
             
     return source_spec
 
+#
+# Function to return the command line arguments
+# that are not --options
+#
+def GetArgs():
+    args=[]
+    for a in sys.argv[1:]:
+        if not a.startswith("--"):
+            args.append(a)
+    return args
+
+#
+# Function to return the value of a command line option.
+#
+#   --name=value returns "value"
+#   --name       returns True
+#   (missing)    returns the default
+#
+def GetOption(name,default=None):
+    opt="--"+name
+    for a in sys.argv[1:]:
+        if a==opt:
+            return True
+        if a.startswith(opt+"="):
+            return a[len(opt)+1:]
+    return default
+
 #
 # Function to test for possible DITA source file extension
 #
@@ -339,284 +333,208 @@ def isURL(f):
 
 #
 # Function to get keys defined
+# (on the default project, see Project.getKeys)
+#
 def getKeys():
-    return keyvalues
+    return defaultproject.getKeys()
 
+#
+# Function to set the debug flag
+# (on the default project, see Project.setdebug)
+#
 def setdebug(flag):
-    """
-    Set the debug flag:
-    
-    True = print details of execution
-    False = print minimal progress messages
-    
-    """
-    global dbgflag
-    dbgflag = flag
-    if dbgflag:
-        print ("**setdebug - debug flag set to",dbgflag) 
-    return
+    return defaultproject.setdebug(flag)
 
 #
-# Function to return the dbgflag value
+# Function to set the signature flag
+# (on the default project, see Project.setsignatures)
 #
-def debugMode():
-    return dbgflag
+def setsignatures(flag):
+    return defaultproject.setsignatures(flag)
 
 #
-# Function to collect information from a DITA source file
+# Functions to set/return the extraction profile
+# (on the default project, see Project.setfields)
 #
-# Each entry in the output list is a dictionary containing
-# these keys:
+def setfields(fields):
+    return defaultproject.setfields(fields)
+
+def getfields():
+    return defaultproject.getfields()
+
 #
-# directory
-# basename
-# topicid
-# elementids
-# hrefs
-# keyrefs
-# doctype
+# Function to set the streaming file size
+# (on the default project, see Project.setstreamsize)
 #
-def ScanSourceFile(fl,ilist):
-    if dbgflag:
-        print("Enter ScanSourceFile",fl)
-
-    # file path
-    f = fl
-    absf=os.path.abspath(fl)
-    # initialize the dictionary
-    dict={}
-    locallist=[]
-
-    # bail if a URL
-    if isURL(fl):
-        dict['directory']=""
-        dict["basename"]=fl
-        ilist.append(dict)
-        return locallist
+def setstreamsize(n):
+    return defaultproject.setstreamsize(n)
 
-    # bail if it is not the right filetype
-    if not isDITAext(absf):
-        dict['directory']=os.path.dirname(absf)
-        dict['basename']=os.path.basename(absf)
-        dict['doctype']=None
-        ilist.append(dict)
-        return locallist
-        
-    # try to parse the file as XML
-    try:
-        # create a tree for the source file
-        tree = etree.parse(f)
+#
+# Function to turn pipelined scanning on or off
+# (on the default project, see Project.setpipeline)
+#
+def setpipeline(readers,parsers=0,depth=PIPE_DEPTH):
+    return defaultproject.setpipeline(readers,parsers,depth)
 
-        # quick exit on error
-        if not tree:
-            print("ScanSourceFile error",f,"not parsed")
-            dict['directory']=os.path.dirname(absf)
-            dict['basename']=os.path.basename(absf)
-            dict['doctype']=None
-            ilist.append(dict)
-            return locallist
+#
+# Functions to set/return the snapshot files are read from
+# (on the default project, see Project.setsnapshot)
+#
+def setsnapshot(snap):
+    return defaultproject.setsnapshot(snap)
 
-        # get the root element for file
-        root = tree.getroot()
-        roottag = root.tag
-
-        # set the doctype
-        docinfo = tree.docinfo
-        tdoctype = docinfo.doctype
-        # make sure it is really DOCTYPE (other things can occur)
-        if len(tdoctype)>9 and tdoctype.find('<!DOCTYPE')>-1:
-            doctype=tdoctype
-        else:
-            doctype=None
-        dt=doctype
-            
-        if dbgflag:
-            print(" root tag is", roottag)
-        
-        if roottag == 'dita':
-            # there may be other topics inside this topic
-            topics = root.getchildren()
-            if dbgflag:
-                for t in topics:
-                    print("topic: ",t.tag,t.get('id'))
-        else:
-            # there is only a single topic in the file
-            topics = [root]
+def getsnapshot():
+    return defaultproject.getsnapshot()
 
-        # get ID info for this topic(s)
-        for t in topics:
-            ScanTopic(t,f,dt,locallist)
+#
+# Functions to set/return the RecordStore the records are
+# kept in (on the default project, see Project.setstore)
+#
+def setstore(store):
+    return defaultproject.setstore(store)
 
-        # add to big list
-        for ll in locallist:
-            ilist.append(ll)
+def getstore():
+    return defaultproject.getstore()
 
-    except:
-        if dbgflag:
-            print("ScanSourceFile EXCEPTION!",f)
-        # file cannot be parsed
-        # or also file may not exist.
-        if isURL(f):
-            # record data for a URL
-            dict['directory']=""
-            dict['basename']=f
-            dict['doctype']=None
-            ilist.append(dict)
-        else:
-            if os.path.exists(f):
-                if dbgflag:
-                    print("  file could not be parsed")
-                # record data for non-parseable file
-                dict['directory']=os.path.dirname(absf)
-                dict['basename']=os.path.basename(absf)
-                dict['doctype']=None
-                ilist.append(dict)
-            else:
-                # do nothing if file does not exist
-                if dbgflag:
-                    print("  file does not exist")
+#
+# Function to limit directory scans to one shard
+# (on the default project, see Project.setshard)
+#
+def setshard(shard,nshards=1,bydir=False):
+    return defaultproject.setshard(shard,nshards,bydir)
+
+#
+# Function to set the progress object
+# (on the default project, see Project.setprogress)
+#
+def setprogress(p):
+    return defaultproject.setprogress(p)
 
+#
+# Function to return the progress object (or None)
+# (on the default project, see Project.getprogress)
+#
+def getprogress():
+    return defaultproject.getprogress()
 
-    # free up resources
-    tree=None
-    
-    return locallist
+#
+# Function to return the dbgflag value
+# (on the default project, see Project.debugMode)
+#
+def debugMode():
+    return defaultproject.debugMode()
+
+#
+# Function to collect information from a DITA source file
+# (on the default project, see Project.ScanSourceFile)
+#
+def ScanSourceFile(fl,ilist):
+    return defaultproject.ScanSourceFile(fl,ilist)
 
 #
 # Function to scan a file topic for information
+# (on the default project, see Project.ScanTopic)
+#
+def ScanTopic(t,f,doctype,ilist):
+    return defaultproject.ScanTopic(t,f,doctype,ilist)
+
 #
-# where: t = starting element
+# Function to collect information from a DITA source file
+# without building a tree for it, for files too large to
+# hold in memory.
+# (on the default project, see Project.ScanSourceStream)
+#
+def ScanSourceStream(f,ilist):
+    return defaultproject.ScanSourceStream(f,ilist)
+
+#
+# Function to return the normalized target of a reference
+# or key definition, "" if there is no href.
+#
+# where: h = href attribute value (or None)
 #        f = file path
-#        doctype = DOCTYPE string
-#        ilist = id list
+#        topicdir = absolute directory of the file
 #
-def ScanTopic(t,f,doctype,ilist):
-    if dbgflag:
-        print("Enter ScanTopic",f,doctype,t.tag)
-        
-    # initialize what we return
-    dict={}
-    
-    # try to fetch the topic ID attribute
-    topicid = t.get("id", default="")
-    # file path split
-    topicdir=os.path.dirname(f)
-    topicdir=os.path.abspath(topicdir)
-    topicfile=os.path.basename(f)
-    
-    elementids=[]
-    
-    kids = t.getchildren()
-    # loop through all the child elements of the starting element
-    for kid in kids:
-        if dbgflag:
-            print("child element",kid.tag,kid.get('id'))
-        if kid.tag == 'topic':
-            if dbgflag:
-                print("Recursive ScanTopic in",f)
-            # scan the sub-topics of this topic
-            ScanTopic(kid,f,doctype,ilist)
-        elif "<!-- " in str(etree.tostring(kid)):
-            # ignore comments
-            pass
-        else:
-            # collect all the content IDs in this topic
-            ScanContentIDs(kid,elementids)
-        # fill in key/value pairs
-        xpstr="@keys"
-        keysa = kid.xpath(xpstr)
-        if keysa!=[]:
-            hrefa = kid.get("href")
-            if debugMode():
-                print("key/value",keysa,hrefa)
-            if hrefa!=None:
-                ksplit = keysa[0].split(" ")
-                for kkk in ksplit:
-                    keyvalues[kkk]=hrefa
-                                        
-
-    # find all the external and internal references in the file
-    eref=[]
-    for r in refs:
-        xpstr=".//@"+r
-        xrefs = t.xpath(xpstr)
-        if dbgflag and len(xrefs)>0:
-            print("  found",r,len(xrefs),"times")
-        for xx in xrefs:
-            if dbgflag:
-                print("   href is",xx)
-            if isURL(xx):
-                eref.append(xx)
-            else:
-                if xx[0]=="#":
-                    # internal reference
-                    if dbgflag:
-                        print("    internal reference",xx)
-                    ipath=f+xx
-                    eref.append(normHref(ipath))
-                else:
-                    # external reference
-                    relpat=topicdir+os.sep+xx
-                    relpat=normHref(relpat)
-                    if dbgflag:
-                        print("    external reference",relpat)
-                    eref.append(relpat)
-
-    # find all the key references in the file
-    kref=[]
-    for kr in keytypes:
-        xpstr=".//@"+kr
-        xrefs = t.xpath(xpstr)
-        if dbgflag and len(xrefs)>0:
-            print("  found",kr,len(xrefs),"times")
-        for xx in xrefs:
-            kref.append(xx)
-
-    # find all the key definitions in the file
-    keylist=[]
-    xpstr=".//@keys"
-    xrefs = t.xpath(xpstr)
-    if dbgflag and len(xrefs)>0:
-        print("  found",len(xrefs),"keys")
-    for xx in xrefs:
-        for kxx in xx[0].split(" "):
-            keylist.append(kxx)
-                
-    # find all keywords defined in the file
-    keywords=[]
-    xpstr=".//*/keyword"
-    keys=t.xpath(xpstr)
-    if len(keys)>0:
-        if dbgflag:
-            print("  found",len(keys),"keywords")
-        for xx in keys:
-            if xx.text==None:
-                keywords.append("")
-            else:
-                keywords.append(xx.text)
-            
-    # store information to return
-    xdir, xfile, xtopic, xcont = parseHref(f)
-    dict['directory']=topicdir
-    dict['basename']=xfile
-    dict['topicid']=topicid
-    dict['elementids']=elementids
-    dict['hrefs']=eref
-    dict['keyrefs']=kref
-    dict['keys']=keylist
-    dict['doctype']=doctype
-    dict['keywords']=keywords
-    
-    # add the information collected to the big list
-    ilist.append(dict)
-        
-    return [f]
+def refTarget(h,f,topicdir):
+    if h==None or len(h)==0:
+        return ""
+    if isURL(h):
+        return h
+    if h[0]=="#":
+        return normHref(f+h)
+    return normHref(topicdir+os.sep+h)
+
+#
+# Function to compute the MinHash signature of a text.
+#
+# The text is cut into overlapping shingles of SHINGLE_WORDS
+# words. For each of MINHASH_SIZE hash functions the smallest
+# hash of any shingle is kept. The fraction of positions where
+# two signatures agree estimates the Jaccard similarity of the
+# two shingle sets. Hashes are stable across runs so signatures
+# can be saved with an inventory.
+#
+def MinHash(text):
+    import re
+    import zlib
+
+    words=re.findall(r"\w+",text.lower())
+    shingles=set()
+    if len(words)<SHINGLE_WORDS:
+        if len(words)>0:
+            shingles.add(zlib.crc32(" ".join(words).encode("utf-8")))
+    else:
+        for i in range(len(words)-SHINGLE_WORDS+1):
+            sh=" ".join(words[i:i+SHINGLE_WORDS])
+            shingles.add(zlib.crc32(sh.encode("utf-8")))
+    if len(shingles)==0:
+        return []
+    sig=[]
+    for a, b in minhashParams():
+        sig.append(min([(a*x+b)%MERSENNE61 for x in shingles]))
+    return sig
+
+# prime modulus for the MinHash hash functions
+MERSENNE61 = (1<<61)-1
+
+# cached (a, b) hash function coefficients
+minhashcoef = []
+
+#
+# Function to return the MinHash hash function coefficients,
+# generated from a fixed seed so they never change
+#
+def minhashParams():
+    import random
+
+    global minhashcoef
+    if len(minhashcoef)==0:
+        # build the list before publishing it, so threads
+        # scanning at the same time never see half of it
+        rnd=random.Random(20240523)
+        coef=[]
+        for i in range(MINHASH_SIZE):
+            coef.append((rnd.randrange(1,MERSENNE61),rnd.randrange(0,MERSENNE61)))
+        minhashcoef=coef
+    return minhashcoef
+
+#
+# Function to estimate the similarity of two MinHash signatures
+#
+def sigSimilarity(s1,s2):
+    if len(s1)==0 or len(s1)!=len(s2):
+        return 0.0
+    same=0
+    for i in range(len(s1)):
+        if s1[i]==s2[i]:
+            same=same+1
+    return same/len(s1)
 
 #
 # Function to  scan for content ids in a single topic
 #
-def ScanContentIDs(t,elist):
-    if dbgflag:
+def ScanContentIDs(t,elist,lines=None):
+    if debugMode():
         print("Enter ScanContentIDs", t.tag)
 
     allid=t.xpath("//*/@id")
@@ -625,6 +543,9 @@ def ScanContentIDs(t,elist):
             pass
         else:
             elist.append(aid)
+            # and the line it is on
+            if lines!=None:
+                lines.append(aid.getparent().sourceline)
  
 
     
@@ -632,9 +553,13 @@ def ScanContentIDs(t,elist):
 # Function to return list of matches in a larger list
 #
 def returnList(mtype, s, inlist):
-    if dbgflag:
+    if debugMode():
         print("Enter returnList",mtype,s,len(inlist))
 
+    if isinstance(inlist,RecordStore):
+        # an indexed query instead of a scan
+        return inlist.match(mtype,s)
+
     retlist = []
 
     for idx in inlist:
@@ -679,7 +604,7 @@ def parseKeyref(h):
             kkey=h
             kid=""
 
-    if dbgflag:
+    if debugMode():
         print("parseKeyref returns",kkey,kid)
         
     return kkey, kid
@@ -741,18 +666,118 @@ def makeRef(d,f,t,c):
 
     return ref
 
+#
+# Class that makes paths absolute and relative, and hrefs
+# canonical, as pure string operations.
+#
+# os.path.abspath and relpath ask the OS for the working
+# directory on every call; here it is read once (reset()
+# reads it again, after an os.chdir). The same paths and
+# hrefs come up again and again in a scan, so the results
+# are kept in a least recently used cache of at most maxsize
+# entries, and interned so equal paths share one string.
+#
+class PathCache:
+
+    def __init__(self,maxsize=PATH_CACHE_SIZE):
+        self.maxsize=maxsize
+        self.reset()
+
+    def reset(self):
+        self.cwd=os.getcwd()
+        # (kind, path...) -> result, least recently used first
+        self.memo=collections.OrderedDict()
+        self.hits=0
+
+    def get(self,key):
+        r=self.memo.get(key)
+        if r!=None:
+            self.hits=self.hits+1
+            try:
+                self.memo.move_to_end(key)
+            except KeyError:
+                # evicted by another thread meanwhile
+                pass
+        return r
+
+    def put(self,key,r):
+        r=sys.intern(r)
+        self.memo[key]=r
+        if len(self.memo)>self.maxsize:
+            try:
+                self.memo.popitem(last=False)
+            except KeyError:
+                pass
+        return r
+
+    #
+    # os.path.abspath without the system call
+    #
+    def abspath(self,p):
+        key=("abs",p)
+        r=self.get(key)
+        if r==None:
+            if not os.path.isabs(p):
+                p=os.path.join(self.cwd,p)
+            r=self.put(key,os.path.normpath(p))
+        return r
+
+    #
+    # os.path.relpath without the system calls
+    #
+    def relpath(self,p,start=os.curdir):
+        key=("rel",p,start)
+        r=self.get(key)
+        if r!=None:
+            return r
+        sdrive, spath = os.path.splitdrive(self.abspath(start))
+        pdrive, ppath = os.path.splitdrive(self.abspath(p))
+        if os.path.normcase(sdrive)!=os.path.normcase(pdrive):
+            raise ValueError("path is on mount %r, start on mount %r" % (pdrive,sdrive))
+        slist=[x for x in spath.split(os.sep) if x]
+        plist=[x for x in ppath.split(os.sep) if x]
+        i=0
+        while i<len(slist) and i<len(plist) and os.path.normcase(slist[i])==os.path.normcase(plist[i]):
+            i=i+1
+        rel=[os.pardir]*(len(slist)-i)+plist[i:]
+        if len(rel)==0:
+            return self.put(key,os.curdir)
+        return self.put(key,os.path.join(*rel))
+
+    #
+    # Function to create a normalized href (see normHref)
+    #
+    def href(self,h):
+        key=("href",h)
+        r=self.get(key)
+        if r==None:
+            d,f,t,c=parseHref(h)
+            p=self.abspath(d+os.sep+f)
+            r=self.put(key,makeRef(os.path.dirname(p),os.path.basename(p),t,c))
+        return r
+
+# the path cache all reference handling goes through
+pathcache = PathCache()
+
+#
+# Function to return the absolute form of a path
+# (see PathCache.abspath)
+#
+def canonPath(p):
+    return pathcache.abspath(p)
+
+#
+# Function to return a path relative to a start directory
+# (see PathCache.relpath)
+#
+def relPath(p,start=os.curdir):
+    return pathcache.relpath(p,start)
+
 #
 # Function to create a normalized href
 #
 def normHref(h):
-    d,f,t,c=parseHref(h)
-    p=os.path.normpath(d+os.sep+f)
-    p=os.path.abspath(p)
-    dd=os.path.dirname(p)
-    ff=os.path.basename(p)
-    newh=makeRef(dd,ff,t,c)
-        
-    return newh
+    return pathcache.href(h)
 
 #
 # Function used for debugging to dump out internal
@@ -772,7 +797,7 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
     fdir=item['directory']
     fbase=item['basename']
     
-    if dbgflag:
+    if debugMode():
         print("Enter findHref","fdir:",fdir,"fbase:",fbase)
         print("              ","hdir:",hdir,"hfile:",hfile)
         print("              ","htopic:",htopic,"hcontent:",hcontent)
@@ -782,6 +807,10 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
     # don't check URL references
     if isURL(hdir)==True:
         return True
+
+    if isinstance(idlist,RecordStore):
+        # an indexed query instead of a scan
+        return idlist.findHref(hdir,hfile,htopic,hcontent)
       
         
     # look for files in directory first
@@ -802,7 +831,7 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
                         if len(con_list)>0:
                             rc = True
                         else:
-                            if dbgflag:
+                            if debugMode():
                                 print(hcontent,"*contentid* not found in list")
                             rc = False
                     else:
@@ -810,7 +839,7 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
                         rc=True
                 else:
                     # topicid not found
-                    if dbgflag:
+                    if debugMode():
                         print(htopic,"*topicid* not found in list")
                     # check if reference was to a contentid instead
                     if hcontent=="":
@@ -819,7 +848,7 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
                         if len(con_list)>0:
                             rc = True
                         else:
-                            if dbgflag:
+                            if debugMode():
                                 print(htopic,"*contentid(topicid)* not found in list")
                             rc = False
                     else:
@@ -830,12 +859,12 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
                 rc = True
         else:
             # file was not found
-            if dbgflag:
+            if debugMode():
                 print(hfile,"*file* not found in list")
             rc = False
     else:
         # directory was not found
-        if dbgflag:
+        if debugMode():
             print(hdir,"*dir* not found in list")
         rc = False
     
@@ -845,164 +874,4793 @@ def findHref(item,hdir,hfile,htopic,hcontent,idlist):
 #
 # Function to try to repair all hrefs in a file.
 #  Input must be an XML file with a DOCTYPE.
+# (on the default project, see Project.FixHrefs)
 #
-def FixHrefs(tree,item,href,idlist):
-    filepath=fpath(item)
-    topicdir=os.path.dirname(filepath)
-    topicdir=os.path.abspath(topicdir)
-    if dbgflag:
-        print("Enter FixHrefs",filepath)
-        print("   ==>",href)
-        
+def FixHrefs(tree,item,href,idlist,line=0):
+    return defaultproject.FixHrefs(tree,item,href,idlist,line)
 
-    # count of references fixed
-    fixed = 0
-    oldref=None
+#
+# Function to return the graph node for a list item:
+# file path, or file#topicid when the topic has an id
+#
+def itemNode(item):
+    node=fpath(item)
+    if 'topicid' in item and item['topicid']!="":
+        node=node+"#"+item['topicid']
+    return node
 
-    # set the file and doctype
-    f = filepath
-    
-    # skip files that are not DITA source files (i.e. no DOCTYPE)
-    if isSource(item)==False:
-        print("FixHrefs error",f,"is not XML source")
-        return
-        
-    # get the root element in the file
-    root = tree.getroot()
-    # prepare to iterate over elements in the file
-    iter = root.getiterator()
-    
-    # loop on all elements to find the reference to be fixed
-    
-    for e in iter:
-        # stop if we have made a fix already
-        if fixed>0:
-            break
-        # inner loop on type of reference
-        for r in refs:
-            # get the reference string
-            hr = e.get(r)
-            # put href in normalized form
-            if hr==None:
-                relpat=""
-            elif hr[0]=="#":
-                    # internal reference
-                    relpat=filepath+hr
-                    if dbgflag:
-                        print("    internal reference",relpat)
-                    
+#
+# Function to split a node or reference into its
+# file node and file#topicid node
+#
+def nodeParts(n):
+    p=n.find('#')
+    if p<0:
+        return n, n
+    rest=n[p+1:]
+    pp=max(rest.find('/'),rest.find("\\"))
+    if pp>-1:
+        rest=rest[0:pp]
+    return n[0:p], n[0:p]+"#"+rest
+
+#
+# Function to build a reference graph from a list
+# of scanned items (for lists that were not scanned
+# with a graph, or were loaded from a saved inventory)
+#
+def BuildRefGraph(idlist):
+    graph=RefGraph()
+    for item in idlist:
+        graph.addRecord(item)
+    graph.resolveKeys()
+    return graph
+
+#
+# Class holding the references between files and topics.
+#
+# Nodes are file paths and file#topicid strings. Each edge
+# is stored in the forward table under its source topic and
+# source file, and in the reverse table under its target
+# topic and target file, so "what does X use" and "who uses X"
+# are both answered by a single dictionary lookup.
+#
+# Edge types are href, conref and data for direct references
+# and keyref and conkeyref for references through a key.
+#
+class RefGraph:
+
+    def __init__(self):
+        # node -> set of (target, type)
+        self.fwd={}
+        # node -> set of (source, type)
+        self.rev={}
+        # all the distinct (source, target, type) edges
+        self.edges=set()
+        # key -> (defining node, normalized target or "")
+        self.keydefs={}
+        # key -> set of (source, type)
+        self.keyusers={}
+        # key references waiting for their key definition
+        self.pending=[]
+
+    #
+    # Function to add one typed edge
+    #
+    def addEdge(self,src,dst,etype):
+        edge=(src,dst,etype)
+        if edge in self.edges:
+            return
+        self.edges.add(edge)
+        for s in set(nodeParts(src)):
+            if s in self.fwd:
+                self.fwd[s].add((dst,etype))
             else:
-                    # external reference
-                    relpat=topicdir+os.sep+hr
-                    relpat=normHref(relpat)
-                    if dbgflag:
-                        print("    external reference",relpat)
-                    
-            if relpat==href:
-                # save the reference value
-                oldref = hr
-                newref=""
-                # parse the reference
-                hdir, hfile, htopic, hcontent = parseHref(relpat)
-
-                # Fix #1: try using another file extension
-                fdata = os.path.splitext(hfile)
-                ext = fdata[1]
-                newext=""
-                if ext==".dita" or ext==".ditamap":
-                    newext=".xml"
-                elif ext==".xml":
-                    newext=".dita"
-                if newext!="":
-                    hfile2=fdata[0]+newext
-                    if dbgflag:
-                        print("FixHrefs try #1",hfile2)
-                    # try to find file with new extension
-                    ret2=findHref(item,hdir,hfile2,htopic,hcontent,idlist)
-                    if ret2:
-                        # we found the ref in a file with a
-                        # different file extension
-                        newref = makeRef(hdir,hfile2,htopic,hcontent)
-                        newref=os.path.relpath(newref,topicdir)
-                        if dbgflag:
-                            print("fix #1 succeeds",newref)
-
-                if newref=="":
-                        # Fix #2: try looking for file in another directory
-                        if dbgflag:
-                            print("FixHrefs try #2")
-                        file_list = returnList(TYPE_FILE,hfile,idlist)
-                        ll = len(file_list)
-                        if ll==1:
-                            # we found the file in another directory
-                            l0 = file_list[0]
-                            filedir = os.path.dirname(f)
-                            newdir = l0['directory']
-                            reldir = os.path.relpath(newdir,filedir)
-                            # will this file satisfy the reference?
-                            ret2 = findHref(item,newdir,hfile,htopic,hcontent,idlist)
-                            if ret2:
-                                # this file is OK, use it instead
-                                newref = makeRef(reldir,hfile,htopic,hcontent)
-                                if dbgflag:
-                                    print("FixHrefs #2 succeeds",newref)
-                        else:
-                            if dbgflag:
-                                print(" file",hfile,"found in",ll,"places")
-                                for ffl in file_list:
-                                    print(ppath(fpath(ffl)))
-
-                if newref=="":
-                        # Fix #3: try looking for new topicid in same file
-                        if dbgflag:
-                            print("FixHrefs try #3")
-                        file_list = returnList(TYPE_FILE,hfile,idlist)
-                        ll = len(file_list)
-                        if ll==1:
-                            # we found the file, get its topicid
-                            l0 = file_list[0]
-                            htopic2 = l0['topicid']
-                            filedir = os.path.dirname(f)
-                            newdir = l0['directory']
-                            reldir = os.path.relpath(newdir,filedir)
-                            # will this topicid satisfy the reference?
-                            ret2 = findHref(item,newdir,hfile,htopic2,hcontent,idlist)
-                            if ret2:
-                                # this topicid is OK, use it instead
-                                newref = makeRef(reldir,hfile,htopic2,hcontent)
-                                if dbgflag:
-                                    print("FixHrefs #3 succeeds",newref)
-                                                            
-                        else:
-                            if ll>0:
-                                print(" file",hfile,"found in",ll,"places, cannot fix")
-                                if dbgflag:
-                                    for ffl in file_list:
-                                        print(ppath(fpath(ffl)))
-                            else:
-                                if dbgflag:
-                                    print(" file",hfile,"not found")
-                                
-                if newref!="":
-                    # we have a changed reference, fix it in the source file
-                    print("  change from:",r,oldref)
-                    print("           to:",r,newref)
-                    e.set(r,newref)
-                    fixed=fixed+1
-                    
+                self.fwd[s]={(dst,etype)}
+        for d in set(nodeParts(dst)):
+            if d in self.rev:
+                self.rev[d].add((src,etype))
+            else:
+                self.rev[d]={(src,etype)}
+
+    #
+    # Function to add the references of a scanned list item
+    #
+    def addRecord(self,item):
+        if not 'hrefs' in item:
+            return
+        src=itemNode(item)
+        hrefs=item['hrefs']
+        types=item.get('reftypes',[])
+        for i in range(len(hrefs)):
+            if i<len(types):
+                etype=types[i]
+            else:
+                etype='href'
+            self.addEdge(src,hrefs[i],etype)
+        self.addKeys(item)
+
+    #
+    # Function to add the key definitions and key references
+    # of a scanned list item
+    #
+    def addKeys(self,item):
+        src=itemNode(item)
+        # remember the keys defined here (first definition wins)
+        keys=item.get('keys',[])
+        khrefs=item.get('keyhrefs',[])
+        for i in range(len(keys)):
+            if not keys[i] in self.keydefs:
+                if i<len(khrefs):
+                    self.keydefs[keys[i]]=(src,khrefs[i])
                 else:
-                    if dbgflag:
-                        print("FixHrefs, all fixes failed, giving up")
+                    self.keydefs[keys[i]]=(src,"")
+        # key references are resolved once all keys are known
+        krefs=item.get('keyrefs',[])
+        ktypes=item.get('keyreftypes',[])
+        for i in range(len(krefs)):
+            if i<len(ktypes):
+                etype=ktypes[i]
+            else:
+                etype='keyref'
+            key, kid = parseKeyref(krefs[i])
+            if key in self.keyusers:
+                self.keyusers[key].add((src,etype))
+            else:
+                self.keyusers[key]={(src,etype)}
+            self.pending.append((src,key,etype))
 
-    # check for logic error
-    if oldref==None:
-        print("FixHrefs ERROR",href,"not found")
-        
-    return fixed
-                        
-        
-                        
+    #
+    # Function to turn key references into edges to
+    # the targets of their keys
+    #
+    def resolveKeys(self):
+        left=[]
+        for src, key, etype in self.pending:
+            if key in self.keydefs and self.keydefs[key][1]!="":
+                self.addEdge(src,self.keydefs[key][1],etype)
+            else:
+                left.append((src,key,etype))
+        self.pending=left
 
+    #
+    # Function to return the keys used but never defined
+    #
+    def undefinedKeys(self):
+        undef=set()
+        for key in self.keyusers:
+            if not key in self.keydefs:
+                undef.add(key)
+        return undef
 
-                
-            
+    #
+    # Function to return what a node refers to,
+    # as a list of (target, type)
+    #
+    def targets(self,node,etype=None):
+        out=self.fwd.get(node,())
+        if etype==None:
+            return list(out)
+        return [e for e in out if e[1]==etype]
+
+    #
+    # Function to return what refers to a node,
+    # as a list of (source, type)
+    #
+    def sources(self,node,etype=None):
+        out=self.rev.get(node,())
+        if etype==None:
+            return list(out)
+        return [e for e in out if e[1]==etype]
+
+    #
+    # Function to return the maps and topics affected by
+    # a change to a set of files.
+    #
+    # Content pulled in with conref/conkeyref changes the
+    # referencing topic, which in turn affects whatever pulls
+    # its content. Topics that link to a changed topic
+    # (href/keyref/data) are affected, but not their own
+    # referrers. Maps are affected when they reach an affected
+    # file through map references. Changed maps also affect
+    # every user of a key they define.
+    #
+    # Returns two sets of file paths: maps, topics
+    #
+    def impact(self,changed):
+        topics=set()
+        maps=set()
+        # files whose content changed (directly or through conref)
+        work=collections.deque()
+        for f in changed:
+            if not f in topics:
+                topics.add(f)
+                work.append(f)
+        # users of keys defined in changed files
+        cfiles=set(changed)
+        for key in self.keydefs:
+            if nodeParts(self.keydefs[key][0])[0] in cfiles:
+                for src, etype in self.keyusers.get(key,()):
+                    sfile=nodeParts(src)[0]
+                    if not sfile in topics:
+                        topics.add(sfile)
+                        if etype=='conkeyref':
+                            work.append(sfile)
+        while len(work)>0:
+            f=work.popleft()
+            for src, etype in self.rev.get(f,()):
+                sfile=nodeParts(src)[0]
+                if sfile in topics:
+                    continue
+                topics.add(sfile)
+                if etype in ('conref','conkeyref') or isDITAMap(sfile):
+                    # content changed, keep going
+                    work.append(sfile)
+        # walk up through the maps to the root maps
+        work=collections.deque(topics)
+        seen=set(topics)
+        while len(work)>0:
+            f=work.popleft()
+            if isDITAMap(f):
+                maps.add(f)
+            for src, etype in self.rev.get(f,()):
+                sfile=nodeParts(src)[0]
+                if isDITAMap(sfile) and not sfile in seen:
+                    seen.add(sfile)
+                    work.append(sfile)
+        topics=topics-maps
+        return maps, topics
+
+    #
+    # Function to return all the nodes that are the
+    # source or target of an edge
+    #
+    def nodes(self):
+        allnodes=set()
+        for src, dst, etype in self.edges:
+            allnodes.add(src)
+            allnodes.add(dst)
+        return allnodes
+
+    #
+    # Functions to export the graph. Node names are shown
+    # relative to the project directory (rel is the function
+    # that makes them relative, ppath by default).
+    #
+    def writeDOT(self,out,rel=None):
+        if rel==None:
+            rel=ppath
+        out.write("digraph refs {\n")
+        for n in sorted(self.nodes()):
+            out.write("  %s;\n" % dotQuote(rel(n)))
+        for src, dst, etype in sorted(self.edges):
+            out.write("  %s -> %s [label=%s];\n" % (dotQuote(rel(src)),dotQuote(rel(dst)),dotQuote(etype)))
+        out.write("}\n")
+
+    def writeGraphML(self,out,rel=None):
+        from xml.sax.saxutils import quoteattr
+
+        if rel==None:
+            rel=ppath
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        out.write('  <key id="type" for="edge" attr.name="type" attr.type="string"/>\n')
+        out.write('  <graph id="refs" edgedefault="directed">\n')
+        for n in sorted(self.nodes()):
+            out.write('    <node id=%s/>\n' % quoteattr(rel(n)))
+        for src, dst, etype in sorted(self.edges):
+            out.write('    <edge source=%s target=%s><data key="type">%s</data></edge>\n' % (quoteattr(rel(src)),quoteattr(rel(dst)),etype))
+        out.write('  </graph>\n')
+        out.write('</graphml>\n')
+
+    def writeJSON(self,out,rel=None):
+        import json
+
+        if rel==None:
+            rel=ppath
+        data={}
+        data['nodes']=[rel(n) for n in sorted(self.nodes())]
+        data['edges']=[]
+        for src, dst, etype in sorted(self.edges):
+            data['edges'].append({'source':rel(src),'target':rel(dst),'type':etype})
+        data['keys']={}
+        for key in sorted(self.keydefs):
+            kdef=self.keydefs[key]
+            data['keys'][key]={'defined':rel(kdef[0]),'target':rel(kdef[1])}
+        json.dump(data,out,indent=1)
+        out.write("\n")
+
+#
+# Function to quote a DOT identifier
+#
+def dotQuote(s):
+    return '"'+s.replace("\\","\\\\").replace('"','\\"')+'"'
+
+#
+# Function to save a scanned inventory to a file so
+# later runs can start from it instead of a full scan.
+# (on the default project, see Project.SaveInventory)
+#
+def SaveInventory(path,source_spec,mapfiles,idlist,extra=None):
+    return defaultproject.SaveInventory(path,source_spec,mapfiles,idlist,extra)
+
+#
+# Function to load an inventory saved by SaveInventory.
+# The saved lists are appended to mapfiles and idlist.
+# (on the default project, see Project.LoadInventory)
+#
+def LoadInventory(path,mapfiles,idlist,extra=None):
+    return defaultproject.LoadInventory(path,mapfiles,idlist,extra)
+
+#
+# Function to save a scanned inventory as a snapshot file
+# (on the default project, see Project.SaveSnapshot)
+#
+def SaveSnapshot(path,source_spec,mapfiles,idlist):
+    return defaultproject.SaveSnapshot(path,source_spec,mapfiles,idlist)
+
+#
+# Function to scan one shard of a directory into a partial
+# index file
+# (on the default project, see Project.ScanShard)
+#
+def ScanShard(dir,path,shard,nshards,bydir=False):
+    return defaultproject.ScanShard(dir,path,shard,nshards,bydir)
+
+#
+# Function to merge the partial index files of the shards
+# (on the default project, see Project.MergeShards)
+#
+def MergeShards(paths,mapfiles,idlist):
+    return defaultproject.MergeShards(paths,mapfiles,idlist)
+
+#
+# Function to return the commit a revision names (HEAD by
+# default) in the git repository holding repodir, or None
+# if there is no such commit or git could not be run
+#
+def GitRevision(repodir,rev="HEAD"):
+    import subprocess
+
+    if not os.path.isdir(repodir):
+        repodir=os.path.dirname(repodir) or "."
+    try:
+        return runGit(repodir,["rev-parse","--verify","-q",rev+"^{commit}"]).strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+#
+# Function to ask git which files changed in a working tree.
+#
+#   repodir - directory inside the git repository
+#   rev - revision to compare with (None for HEAD)
+#   staged - True to compare the content staged for commit
+#            (the git index) with rev, False to compare the
+#            working tree; None (the default) compares the
+#            index when rev is None and the working tree
+#            otherwise
+#
+# Files that are not tracked yet (but not ignored) count
+# as changed when comparing the working tree.
+#
+# Returns a list of real file paths (symbolic links
+# resolved, as git resolves the top of the repository), or
+# None if git could not be run. Match them to the paths of
+# a scan with realPaths.
+#
+def GitChangedFiles(repodir,rev=None,staged=None):
+    import subprocess
+
+    if debugMode():
+        print("Enter GitChangedFiles",repodir,rev)
+
+    if not os.path.isdir(repodir):
+        repodir=os.path.dirname(repodir) or "."
+
+    try:
+        top=runGit(repodir,["rev-parse","--show-toplevel"]).strip()
+        if staged==None:
+            staged=(rev==None)
+        if rev==None:
+            rev="HEAD"
+        # -z: names are NUL terminated and never quoted
+        if staged:
+            names=runGit(repodir,["diff","--name-only","-z","--cached",rev,"--"]).split("\0")
+        else:
+            names=runGit(repodir,["diff","--name-only","-z",rev,"--"]).split("\0")
+            names=names+runGit(repodir,["ls-files","-z","--others","--exclude-standard","--full-name"]).split("\0")
+    except (OSError,subprocess.CalledProcessError) as e:
+        print("GitChangedFiles error",e)
+        return None
+
+    changed=[]
+    for n in names:
+        if len(n)>0:
+            changed.append(os.path.realpath(os.path.join(top,n)))
+
+    return changed
+
+#
+# Function to return the staged content of a file (its blob
+# in the git index), or None if the file is not in the index
+# or git could not be run
+#
+def GitStagedData(f):
+    import subprocess
+
+    try:
+        return subprocess.run(["git","-C",os.path.dirname(f) or ".","show",":./"+os.path.basename(f)],
+                              check=True,capture_output=True).stdout
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+#
+# Function to return the paths in a list of scanned files
+# (mapfiles) of the files in another list (changed), found
+# by comparing real paths, so that the paths git reports
+# match however the scan reached the files. Files that are
+# not in mapfiles are left out.
+#
+def realPaths(changed,mapfiles):
+    real={}
+    for f in mapfiles:
+        if not isURL(f):
+            real.setdefault(os.path.realpath(f),f)
+    out=[]
+    for c in changed:
+        rc=os.path.realpath(c)
+        if rc in real:
+            out.append(real[rc])
+    return out
+
+#
+# Function to run a git command and return its output
+#
+def runGit(repodir,args):
+    import subprocess
+
+    return subprocess.run(["git","-C",repodir]+args,check=True,
+                          capture_output=True,text=True).stdout
+
+#
+# Function to bring a saved inventory up to date after
+# some files changed.
+# (on the default project, see Project.RescanFiles)
+#
+def RescanFiles(changed,mapfiles,idlist,staged=False):
+    return defaultproject.RescanFiles(changed,mapfiles,idlist,staged)
+
+#
+# Function to return the key targets defined in a list
+# of scanned items: key -> normalized href. As in DITA
+# the first definition of a key wins.
+#
+def getKeyTargets(idlist):
+    ktargets={}
+    for item in idlist:
+        keys=item.get('keys',[])
+        khrefs=item.get('keyhrefs',[])
+        for i in range(min(len(keys),len(khrefs))):
+            if not keys[i] in ktargets:
+                ktargets[keys[i]]=khrefs[i]
+    return ktargets
+
+#
+# Class that resolves conref and conkeyref targets to
+# the content they point to.
+#
+# Each target (file#topicid/elementid) is resolved once and
+# the result is remembered, so a shared warning or step used
+# thousands of times costs a single lookup after the first.
+# If the target element has a conref or conkeyref itself,
+# the chain is followed, and the conrefs inside the content
+# at the end of it are resolved too (see expand); a target
+# met again while its own chain is being resolved is
+# reported as a cycle, with the chain from the target back
+# to itself. The memo holds the expanded content.
+#
+# resolve() returns a ConrefResult.
+#
+class ConrefResolver:
+
+    def __init__(self,keytargets=None,maxtrees=64):
+        # key -> normalized href (see getKeyTargets)
+        if keytargets==None:
+            keytargets={}
+        self.keytargets=keytargets
+        # target -> ConrefResult
+        self.memo={}
+        # targets whose chain is being resolved, outermost first
+        self.active=[]
+        # parsed files, least recently used first
+        self.trees=collections.OrderedDict()
+        self.maxtrees=maxtrees
+        # number of resolve() calls answered from the memo
+        self.hits=0
+
+    #
+    # Function to return the parsed tree of a file, or
+    # None if it cannot be parsed
+    #
+    def tree(self,f):
+        from lxml import etree
+
+        if f in self.trees:
+            self.trees.move_to_end(f)
+            return self.trees[f]
+        try:
+            t=etree.parse(f)
+        except (OSError,etree.XMLSyntaxError):
+            t=None
+        self.trees[f]=t
+        if len(self.trees)>self.maxtrees:
+            self.trees.popitem(last=False)
+        return t
+
+    #
+    # Function to return the normalized target of a conref
+    # or conkeyref on element e of file f, or None and an
+    # error message
+    #
+    def targetOf(self,e,f):
+        cref=e.get('conref')
+        if cref!=None and len(cref)>0:
+            if cref[0]=="#":
+                return normHref(canonPath(f)+cref), ""
+            return normHref(os.path.dirname(canonPath(f))+os.sep+cref), ""
+        ckref=e.get('conkeyref')
+        if ckref!=None and len(ckref)>0:
+            key, kid = parseKeyref(ckref)
+            if not key in self.keytargets or self.keytargets[key]=="":
+                return None, "key "+key+" is not defined"
+            ktarget=self.keytargets[key]
+            if kid=="":
+                return ktarget, ""
+            if ktarget.find('#')>-1:
+                return ktarget+"/"+kid, ""
+            return ktarget+"#/"+kid, ""
+        return None, "no conref"
+
+    #
+    # Function to resolve a normalized target
+    #
+    def resolve(self,target):
+        if target in self.memo:
+            self.hits=self.hits+1
+            return self.memo[target]
+        if target in self.active:
+            # the chain from where target was first met back to it
+            cycle=self.active[self.active.index(target):]+[target]
+            return ConrefResult(False,None,cycle,"conref cycle",None)
+
+        self.active.append(target)
+        try:
+            result=self.resolveTarget(target)
+        finally:
+            self.active.pop()
+        if result.error=="conref cycle" and target in result.chain[1:]:
+            # target is on the cycle: keep its chain up to where
+            # it closes, so the memo answers with the whole cycle
+            end=result.chain.index(target,1)
+            result=ConrefResult(False,result.tag,result.chain[:end+1],result.error,None)
+        self.memo[target]=result
+        return result
+
+    def resolveTarget(self,target):
+        from lxml import etree
+
+        hdir, hfile, htopic, hcontent = parseHref(target)
+        f=hdir+os.sep+hfile
+        t=self.tree(f)
+        if t==None:
+            return ConrefResult(False,None,[target],"file not found or not parsed",None)
+
+        # find the topic, then the element inside it
+        root=t.getroot()
+        if htopic=="":
+            topic=root
+        else:
+            found=root.xpath("descendant-or-self::*[@id=$i]",i=htopic)
+            if len(found)==0:
+                return ConrefResult(False,None,[target],"topic "+htopic+" not found",None)
+            topic=found[0]
+        if hcontent=="":
+            e=topic
+        else:
+            found=topic.xpath(".//*[@id=$i]",i=hcontent)
+            if len(found)==0:
+                return ConrefResult(False,None,[target],"element "+hcontent+" not found",None)
+            e=found[0]
+
+        if e.get('conref')==None and e.get('conkeyref')==None:
+            # the end of the chain: the content, with the conrefs
+            # inside it resolved in turn
+            return self.expand(e,f,target)
+
+        # the target pulls its content from somewhere else
+        nxt, msg = self.targetOf(e,f)
+        if nxt==None:
+            return ConrefResult(False,e.tag,[target],msg,None)
+        sub=self.resolve(nxt)
+        if sub.ok and sub.tag!=e.tag:
+            return ConrefResult(False,e.tag,[target]+sub.chain,
+                                "type mismatch: "+e.tag+" uses "+str(sub.tag),None)
+        return ConrefResult(sub.ok,e.tag,[target]+sub.chain,sub.error,sub.fragment)
+
+    #
+    # Function to return element e of file f (the content of
+    # target) with the conrefs and conkeyrefs inside it
+    # replaced by what they resolve to. They are resolved while
+    # target is still active, so a conref inside the content
+    # that leads back to it is reported as a cycle.
+    #
+    def expand(self,e,f,target):
+        import copy
+        from lxml import etree
+
+        e=copy.deepcopy(e)
+        e.tail=None
+        todo=[e]
+        while len(todo)>0:
+            for kid in list(todo.pop()):
+                if not isinstance(kid.tag,str):
+                    # comments and processing instructions
+                    continue
+                if kid.get('conref')==None and kid.get('conkeyref')==None:
+                    todo.append(kid)
+                    continue
+                nxt, msg = self.targetOf(kid,f)
+                if nxt==None:
+                    return ConrefResult(False,e.tag,[target],msg,None)
+                sub=self.resolve(nxt)
+                if not sub.ok:
+                    return ConrefResult(False,e.tag,[target]+sub.chain,sub.error,None)
+                if sub.tag!=kid.tag:
+                    return ConrefResult(False,e.tag,[target]+sub.chain,
+                                        "type mismatch: "+kid.tag+" uses "+str(sub.tag),None)
+                pulled=etree.fromstring(sub.fragment)
+                pulled.tail=kid.tail
+                kid.getparent().replace(kid,pulled)
+        return ConrefResult(True,e.tag,[target],"",etree.tostring(e,with_tail=False))
+
+#
+# Class holding the result of resolving a conref target
+#
+#   ok - True if the content was found
+#   tag - element type of the target
+#   chain - targets followed, starting with the one asked for
+#   error - why resolution failed ("" when ok)
+#   fragment - serialized content at the end of the chain
+#
+class ConrefResult:
+
+    def __init__(self,ok,tag,chain,error,fragment):
+        self.ok=ok
+        self.tag=tag
+        self.chain=chain
+        self.error=error
+        self.fragment=fragment
+
+#
+# Class holding an inverted index of the terms used in
+# the topics: keywords, index terms and (optionally) the
+# words of topic titles, each mapped to the topics
+# (file#topicid) that use them.
+#
+# Terms can be looked up exactly, by prefix, and without
+# regard to case. The index can be saved and loaded, and
+# updated for changed files with removeFile/addRecord.
+#
+class TermIndex:
+
+    def __init__(self,titles=False):
+        # index title words too?
+        self.titles=titles
+        # term -> set of (kind, location)
+        self.terms={}
+        # file path -> set of terms found in it
+        self.files={}
+        # sorted term lists for prefix lookups (built when needed)
+        self.sorted=None
+        self.lsorted=None
+
+    #
+    # Function to add one term
+    #
+    def addTerm(self,term,kind,loc,f):
+        if len(term)==0:
+            return
+        if term in self.terms:
+            self.terms[term].add((kind,loc))
+        else:
+            self.terms[term]={(kind,loc)}
+            self.sorted=None
+            self.lsorted=None
+        if f in self.files:
+            self.files[f].add(term)
+        else:
+            self.files[f]={term}
+
+    #
+    # Function to add the terms of a scanned list item
+    #
+    def addRecord(self,item):
+        import re
+
+        if not 'keywords' in item:
+            return
+        f=fpath(item)
+        loc=itemNode(item)
+        for kw in item['keywords']:
+            self.addTerm(kw.strip(),"keyword",loc,f)
+        for it in item.get('indexterms',[]):
+            self.addTerm(it,"indexterm",loc,f)
+        if self.titles:
+            for w in re.findall(r"\w+",item.get('title',"")):
+                self.addTerm(w,"title",loc,f)
+
+    #
+    # Function to drop every term location in a file
+    # (before the file is scanned again)
+    #
+    def removeFile(self,f):
+        if not f in self.files:
+            return
+        for term in self.files[f]:
+            locs=self.terms[term]
+            for kl in list(locs):
+                if nodeParts(kl[1])[0]==f:
+                    locs.discard(kl)
+            if len(locs)==0:
+                del self.terms[term]
+                self.sorted=None
+                self.lsorted=None
+        del self.files[f]
+
+    #
+    # Function to look up a term. Returns a sorted list of
+    # (term, kind, location).
+    #
+    #   prefix - match every term starting with the string
+    #   nocase - ignore case when matching
+    #
+    def lookup(self,s,prefix=False,nocase=False):
+        import bisect
+
+        if not prefix and not nocase:
+            found=[s] if s in self.terms else []
+        elif not nocase:
+            if self.sorted==None:
+                self.sorted=sorted(self.terms)
+            found=[]
+            i=bisect.bisect_left(self.sorted,s)
+            while i<len(self.sorted) and self.sorted[i].startswith(s):
+                found.append(self.sorted[i])
+                i=i+1
+        else:
+            if self.lsorted==None:
+                self.lsorted=sorted((t.casefold(),t) for t in self.terms)
+            ls=s.casefold()
+            found=[]
+            i=bisect.bisect_left(self.lsorted,(ls,""))
+            while i<len(self.lsorted):
+                lt, t = self.lsorted[i]
+                if lt==ls or (prefix and lt.startswith(ls)):
+                    found.append(t)
+                    i=i+1
+                else:
+                    break
+        out=[]
+        for t in found:
+            for kind, loc in self.terms[t]:
+                out.append((t,kind,loc))
+        return sorted(out)
+
+    #
+    # Functions to save and load the index (JSON)
+    #
+    def save(self,path):
+        import json
+
+        data={'version':1,'titles':self.titles,'terms':{}}
+        for t in self.terms:
+            data['terms'][t]=sorted(self.terms[t])
+        tmp=path+".tmp"
+        out=open(tmp,"w",encoding="utf-8")
+        json.dump(data,out)
+        out.close()
+        os.replace(tmp,path)
+
+    def load(self,path):
+        import json
+
+        try:
+            fin=open(path,"r",encoding="utf-8")
+            data=json.load(fin)
+            fin.close()
+        except (OSError,ValueError) as e:
+            print("TermIndex error",path,e)
+            return False
+        if data.get('version')!=1:
+            print("TermIndex error",path,"has an unknown version")
+            return False
+        self.titles=data['titles']
+        for t in data['terms']:
+            for kind, loc in data['terms'][t]:
+                self.addTerm(t,kind,loc,nodeParts(loc)[0])
+        return True
+
+#
+# Function to run func on every item of a list in
+# parallel and return the results in list order.
+#
+#   jobs - number of workers (0 = one per CPU, 1 = no workers)
+#
+# Worker processes are forked where the platform allows it,
+# so the calling script does not need a __main__ guard;
+# elsewhere threads are used.
+#
+def ParallelMap(func,items,jobs=0):
+    import multiprocessing
+    import concurrent.futures
+
+    if jobs<=0:
+        jobs=os.cpu_count() or 1
+    if jobs==1 or len(items)<2:
+        return [func(i) for i in items]
+
+    chunk=max(1,len(items)//(jobs*8))
+    if "fork" in multiprocessing.get_all_start_methods():
+        ctx=multiprocessing.get_context("fork")
+        with concurrent.futures.ProcessPoolExecutor(jobs,mp_context=ctx) as pool:
+            return list(pool.map(func,items,chunksize=chunk))
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+        return list(pool.map(func,items))
+
+#
+# Function to tell the OS that files will be read soon, so
+# it can start fetching them (a no-op where posix_fadvise
+# is not available)
+#
+def adviseFiles(files):
+    if not hasattr(os,"posix_fadvise"):
+        return
+    for f in files:
+        try:
+            fd=os.open(f,os.O_RDONLY)
+        except (OSError,ValueError):
+            continue
+        try:
+            os.posix_fadvise(fd,0,0,os.POSIX_FADV_WILLNEED)
+        except OSError:
+            pass
+        os.close(fd)
+
+#
+# Class for rewriting a set of files as one transaction, so
+# a repair that is interrupted can be finished or undone.
+#
+# The new contents of every file are planned first (add),
+# then commit applies them in two parallel passes:
+#
+#   prepare - each new file is written to a temporary file
+#             next to it, and the original is hard-linked
+#             into the backup directory (the original is
+#             never written to, so the link is its backup)
+#   apply   - each temporary file is renamed over the
+#             original, which is atomic
+#
+# The journal (journal.json in dir) records the files, their
+# temporary and backup files and the hashes of their old
+# and new contents, and the state the transaction reached:
+#
+#   preparing - nothing has been replaced yet
+#   prepared  - some files may have been replaced; resume
+#               replaces the rest, rollback restores them
+#   applied   - every file was replaced; rollback restores
+#               them all
+#   conflicts - a rollback left some files alone; the
+#               journal and backups of those files are kept
+#               so rollback can be tried again
+#   unreadable - the journal cannot be read (see error)
+#
+# Files whose contents match neither hash were changed by
+# something else and are left alone (see conflicts). A new
+# transaction cannot be committed while the journal is
+# prepared, conflicts or unreadable (see blocked).
+#
+class RepairTransaction:
+
+    def __init__(self,dir,jobs=REPAIR_THREADS):
+        self.dir=dir
+        self.journal=os.path.join(dir,"journal.json")
+        self.jobs=jobs
+        # planned edits: path -> new contents
+        self.edits={}
+        # journal entries and state (None = no journal)
+        self.entries=[]
+        self.state=None
+        # files skipped by resume or rollback
+        self.conflicts=[]
+        # why the journal could not be read
+        self.error=None
+        self.load()
+
+    #
+    # Function to read the journal, if there is one; a journal
+    # that cannot be read leaves the state "unreadable"
+    #
+    def load(self):
+        import json
+
+        if not os.path.exists(self.journal):
+            return
+        try:
+            fin=open(self.journal,"r",encoding="utf-8")
+            try:
+                data=json.load(fin)
+            finally:
+                fin.close()
+            state=data['state']
+            entries=data['entries']
+            for e in entries:
+                if not ('path' in e and 'tmp' in e and 'backup' in e):
+                    raise ValueError("journal entry without its files")
+        except (OSError,ValueError,KeyError,TypeError) as e:
+            self.error=str(e) or e.__class__.__name__
+            self.state="unreadable"
+            self.entries=[]
+            return
+        self.state=state
+        self.entries=entries
+
+    #
+    # Function to test if the journal must be dealt with
+    # (resumed, rolled back or discarded) before another
+    # transaction is committed
+    #
+    def blocked(self):
+        return self.state in ("prepared","conflicts","unreadable")
+
+    #
+    # Function to write the journal so that a crash leaves
+    # either the old or the new journal behind
+    #
+    def save(self,state):
+        import json
+
+        self.state=state
+        tmp=self.journal+".tmp"
+        out=open(tmp,"w",encoding="utf-8")
+        json.dump({'version':1,'state':state,'time':time.time(),'entries':self.entries},out)
+        out.flush()
+        os.fsync(out.fileno())
+        out.close()
+        os.replace(tmp,self.journal)
+        syncDir(self.dir)
+
+    #
+    # Function to plan the new contents of a file (bytes, or
+    # text written as open(path,"w") would); a later edit of
+    # the same file replaces an earlier one
+    #
+    def add(self,path,data):
+        self.edits[canonPath(path)]=data
+
+    def __len__(self):
+        return len(self.edits)
+
+    #
+    # Function to apply the planned edits. Returns False if
+    # an unfinished transaction is still in the journal (it
+    # must be resumed or rolled back first).
+    #
+    def commit(self):
+        if self.blocked():
+            print("RepairTransaction error: an unfinished repair is recorded in",self.journal)
+            return False
+        # the last transaction can no longer be rolled back
+        self.discard()
+        if len(self.edits)==0:
+            return True
+
+        os.makedirs(os.path.join(self.dir,"backup"))
+        self.entries=[]
+        for path in sorted(self.edits):
+            e={}
+            e['path']=path
+            e['tmp']=os.path.join(os.path.dirname(path),"."+os.path.basename(path)+REPAIR_DIR)
+            e['backup']=os.path.join("backup",str(len(self.entries)))
+            self.entries.append(e)
+        self.save("preparing")
+        try:
+            self.parallel(self.prepareEntry,self.entries)
+        except BaseException:
+            # nothing has been replaced, so just clean up
+            self.discard()
+            raise
+        self.edits={}
+        self.save("prepared")
+        self.parallel(self.applyEntry,self.entries)
+        self.parallel(syncDir,sorted(set([os.path.dirname(e['path']) for e in self.entries])))
+        self.save("applied")
+        return True
+
+    #
+    # Function to finish an interrupted transaction
+    #
+    def resume(self):
+        self.conflicts=[]
+        if self.state=="preparing":
+            # nothing was replaced and the new contents are gone
+            self.discard()
+            return False
+        if self.state!="prepared":
+            return self.state=="applied"
+        self.parallel(self.resumeEntry,self.entries)
+        self.parallel(syncDir,sorted(set([os.path.dirname(e['path']) for e in self.entries])))
+        self.save("applied")
+        return len(self.conflicts)==0
+
+    #
+    # Function to put back the files the transaction
+    # replaced. When some files were changed by something
+    # else (see conflicts), the journal and backups of those
+    # files are kept, in state "conflicts", and the rest are
+    # removed; otherwise the journal is removed.
+    #
+    def rollback(self):
+        self.conflicts=[]
+        if self.state=="preparing":
+            self.discard()
+            return True
+        if self.state in (None,"unreadable"):
+            return False
+        self.parallel(self.rollbackEntry,self.entries)
+        self.parallel(syncDir,sorted(set([os.path.dirname(e['path']) for e in self.entries])))
+        if len(self.conflicts)==0:
+            self.discard()
+            return True
+        kept=[]
+        for e in self.entries:
+            if e['path'] in self.conflicts:
+                kept.append(e)
+            else:
+                backup=os.path.join(self.dir,e['backup'])
+                if os.path.exists(backup):
+                    os.remove(backup)
+                if os.path.exists(e['tmp']):
+                    os.remove(e['tmp'])
+        self.entries=kept
+        self.save("conflicts")
+        return False
+
+    #
+    # Function to remove the journal, the backups and any
+    # temporary files
+    #
+    def discard(self):
+        import shutil
+
+        for e in self.entries:
+            if os.path.exists(e['tmp']):
+                os.remove(e['tmp'])
+        if os.path.exists(self.dir):
+            shutil.rmtree(self.dir)
+        self.entries=[]
+        self.state=None
+
+    #
+    # Function to run func on every item on the transaction's
+    # threads (the work is waiting on the disk)
+    #
+    def parallel(self,func,items):
+        import concurrent.futures
+
+        if self.jobs<=1 or len(items)<2:
+            for i in items:
+                func(i)
+            return
+        with concurrent.futures.ThreadPoolExecutor(self.jobs) as pool:
+            for r in pool.map(func,items):
+                pass
+
+    #
+    # Functions for one file of the transaction
+    #
+    def prepareEntry(self,e):
+        import shutil
+
+        path=e['path']
+        data=self.edits[path]
+        if isinstance(data,str):
+            out=open(e['tmp'],"w")
+            out.write(data)
+        else:
+            out=open(e['tmp'],"wb")
+            out.write(data)
+        out.flush()
+        os.fsync(out.fileno())
+        out.close()
+        e['new']=fileHash(e['tmp'])
+        e['old']=None
+        if os.path.exists(path):
+            e['old']=fileHash(path)
+            shutil.copymode(path,e['tmp'])
+            backup=os.path.join(self.dir,e['backup'])
+            try:
+                os.link(path,backup)
+            except OSError:
+                shutil.copy2(path,backup)
+
+    #
+    # Function to return where a file of the transaction
+    # stands: "replaced", "pending" (still has its old
+    # contents) or "changed" (by something else)
+    #
+    def entryState(self,e):
+        cur=fileHash(e['path'])
+        if cur==e.get('new'):
+            return "replaced"
+        if cur==e.get('old'):
+            return "pending"
+        return "changed"
+
+    def applyEntry(self,e):
+        os.replace(e['tmp'],e['path'])
+
+    def resumeEntry(self,e):
+        cur=fileHash(e['path'])
+        if cur==e['new']:
+            # already replaced
+            return
+        if cur==e['old'] and os.path.exists(e['tmp']):
+            os.replace(e['tmp'],e['path'])
+        else:
+            self.conflicts.append(e['path'])
+
+    def rollbackEntry(self,e):
+        import shutil
+
+        cur=fileHash(e['path'])
+        if cur==e['old']:
+            # never replaced
+            return
+        if cur!=e['new']:
+            self.conflicts.append(e['path'])
+            return
+        if e['old']==None:
+            os.remove(e['path'])
+            return
+        # copy the backup back in beside the file, then rename
+        # it over the file
+        backup=os.path.join(self.dir,e['backup'])
+        if os.path.exists(e['tmp']):
+            os.remove(e['tmp'])
+        try:
+            os.link(backup,e['tmp'])
+        except OSError:
+            shutil.copy2(backup,e['tmp'])
+        os.replace(e['tmp'],e['path'])
+
+#
+# Function to return the SHA-256 of a file's contents (None
+# if there is no file)
+#
+def fileHash(path):
+    import hashlib
+
+    try:
+        fin=open(path,"rb")
+    except FileNotFoundError:
+        return None
+    h=hashlib.sha256()
+    while True:
+        b=fin.read(1024*1024)
+        if len(b)==0:
+            break
+        h.update(b)
+    fin.close()
+    return h.hexdigest()
+
+#
+# Function to flush a directory's entries (new and renamed
+# files) to disk, where the OS allows it
+#
+def syncDir(dir):
+    try:
+        fd=os.open(dir,os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    os.close(fd)
+
+#
+# Function to count the elements and attributes in a file.
+#
+# The file is read with iterparse and every element is
+# cleared once it has been counted, so memory use does not
+# grow with the size of the file.
+#
+# Returns (tag Counter, attribute Counter); both are empty
+# if the file cannot be parsed.
+#
+def CountTags(f):
+    from lxml import etree
+
+    tags=collections.Counter()
+    attrs=collections.Counter()
+    try:
+        for event, e in etree.iterparse(f,events=("end",)):
+            tags[e.tag]+=1
+            for a in e.attrib:
+                attrs[a]+=1
+            # free what has been counted
+            e.clear(keep_tail=True)
+            while e.getprevious() is not None:
+                del e.getparent()[0]
+    except (OSError,etree.XMLSyntaxError) as e:
+        if debugMode():
+            print("CountTags error",f,e)
+    return tags, attrs
+
+#
+# Function to read the prolog metadata of every topic in a
+# file (see prologMetadata for what a topic's entry holds).
+#
+# Topics are found as ScanTopic finds them: the root element
+# (or the children of a dita root) and the topic elements
+# nested in a topic. The file is read META_CHUNK bytes at a
+# time and fed to a pull parser. Only topic and dita roots
+# can hold more topics, so for any other root (a concept, a
+# task and so on, which is most files) reading stops at the
+# end of its prolog, well before the body. Other files are
+# read to the end, and what has been handled is cleared so
+# that memory use stays flat.
+#
+# Returns the list of topic entries, in document order
+# (empty if the file cannot be parsed).
+#
+def ReadMetadata(f):
+    from lxml import etree
+
+    topics=[]
+    # the entries of the topics still open
+    entries={}
+    # prolog elements being read (they are kept until they end)
+    keep=0
+    root=None
+    parser=etree.XMLPullParser(events=("start","end"))
+    try:
+        fin=open(f,"rb")
+    except OSError as e:
+        if debugMode():
+            print("ReadMetadata error",f,e)
+        return topics
+    try:
+        while True:
+            data=fin.read(META_CHUNK)
+            if len(data)>0:
+                parser.feed(data)
+            else:
+                parser.close()
+            for event, e in parser.read_events():
+                parent=e.getparent()
+                if event=="start":
+                    if root is None:
+                        root=e
+                    # is this the start of a topic?
+                    if e is root:
+                        istopic=(e.tag!='dita')
+                    elif parent is root and root.tag=='dita':
+                        istopic=isinstance(e.tag,str)
+                    else:
+                        istopic=(e.tag=='topic' and parent in entries)
+                    if istopic:
+                        entry=prologMetadata(None)
+                        entry['topicid']=e.get("id", default="")
+                        topics.append(entry)
+                        entries[e]=entry
+                    elif parent in entries:
+                        if e.tag=='prolog':
+                            keep=keep+1
+                        elif not root.tag in ('dita','topic') and parent is root \
+                             and not e.tag in ('title','titlealts','shortdesc','abstract'):
+                            # past where the prolog can be
+                            return topics
+                else:
+                    if e.tag=='prolog' and parent in entries:
+                        entries[parent].update(prologMetadata(e))
+                        keep=keep-1
+                        if not root.tag in ('dita','topic'):
+                            return topics
+                    entries.pop(e,None)
+                    # free what has been handled
+                    if keep==0 and parent is not None:
+                        e.clear(keep_tail=True)
+                        while e.getprevious() is not None:
+                            del parent[0]
+            if len(data)==0:
+                break
+    except etree.XMLSyntaxError as ex:
+        if debugMode():
+            print("ReadMetadata error",f,ex)
+        return []
+    finally:
+        fin.close()
+    return topics
+
+#
+# Function to return the metadata in a prolog element as a
+# dictionary of lists (all empty for None):
+#
+#   authors     - (type, name) of each author, type "" if none
+#   created     - created dates
+#   revised     - modified dates of the revisions
+#   expiry      - expiry dates (of created and revised)
+#   permissions - view of each permissions element
+#   othermeta   - (name, content) of each othermeta
+#   audience    - each audience, as its attributes (or text)
+#   products    - each product, as the name and version
+#   copyrights  - each copyright, as the holder and years
+#
+def prologMetadata(p):
+    def text(x):
+        return " ".join(x.xpath("string()").split())
+
+    meta={}
+    for k in ('authors','created','revised','expiry','permissions',
+              'othermeta','audience','products','copyrights'):
+        meta[k]=[]
+    if p is None:
+        return meta
+    for x in p.iter('author'):
+        meta['authors'].append((x.get('type',""),text(x)))
+    for x in p.iter('created','revised'):
+        if x.tag=='created' and x.get('date')!=None:
+            meta['created'].append(x.get('date'))
+        if x.tag=='revised' and x.get('modified')!=None:
+            meta['revised'].append(x.get('modified'))
+        if x.get('expiry')!=None:
+            meta['expiry'].append(x.get('expiry'))
+    for x in p.iter('permissions'):
+        meta['permissions'].append(x.get('view',""))
+    for x in p.iter('othermeta'):
+        meta['othermeta'].append((x.get('name',""),x.get('content',"")))
+    for x in p.iter('audience'):
+        attrs=["%s=%s" % (a,x.get(a)) for a in
+               ('type','othertype','job','otherjob','experiencelevel','name')
+               if x.get(a)!=None]
+        meta['audience'].append(" ".join(attrs) or text(x))
+    for x in p.iter('prodinfo'):
+        name=" ".join([text(y) for y in x.iter('prodname')])
+        versions=[".".join([v.get(a) for a in ('version','release','modification')
+                            if v.get(a)!=None]) for v in x.iter('vrm')]
+        if len(versions)==0:
+            meta['products'].append(name)
+        for v in versions:
+            meta['products'].append((name+" "+v).strip())
+    for x in p.iter('copyright'):
+        holders=", ".join([text(y) for y in x.iter('copyrholder')])
+        years=", ".join([y.get('year',"") for y in x.iter('copyryear')])
+        meta['copyrights'].append(holders+(" ("+years+")" if years!="" else ""))
+    return meta
+
+#
+# Function to return (root name, public ID, system ID) from
+# a DOCTYPE string; the IDs are None when not given.
+#
+def doctypeIDs(doctype):
+    import re
+
+    m=re.match(r"""<!DOCTYPE\s+([^\s>\[]+)(?:\s+PUBLIC\s+(["'])(.*?)\2\s*(?:(["'])(.*?)\4)?|\s+SYSTEM\s+(["'])(.*?)\6)?""",doctype or "")
+    if m==None:
+        return None, None, None
+    if m.group(3)!=None:
+        return m.group(1), m.group(3), m.group(5)
+    return m.group(1), None, m.group(7)
+
+#
+# Class holding the entries of a set of OASIS XML catalogs,
+# used to map DTD public and system IDs to local files so
+# no network access is needed.
+#
+# paths are catalog files; nextCatalog and delegate entries
+# are followed. Without paths, the catalogs listed in the
+# XML_CATALOG_FILES environment variable are used.
+#
+# resolve(publicid,systemid) returns a local path or None.
+# Like libxml2 it tries the system ID first (system,
+# rewriteSystem, systemSuffix) and then the public ID.
+#
+class Catalog:
+
+    def __init__(self,paths=None):
+        if paths==None:
+            paths=os.environ.get("XML_CATALOG_FILES","").split()
+        self.public={}
+        self.system={}
+        self.rewrites=[]
+        self.suffixes=[]
+        self.files=[]
+        for p in paths:
+            self.load(catalogPath(None,p))
+
+    def load(self,path):
+        from lxml import etree
+
+        path=os.path.abspath(path)
+        if path in self.files:
+            return
+        self.files.append(path)
+        try:
+            t=etree.parse(path,etree.XMLParser(no_network=True,load_dtd=False,resolve_entities=False))
+        except (OSError,etree.XMLSyntaxError) as e:
+            print("Catalog error",path,e)
+            return
+        more=[]
+        for e in t.getroot().iter("{*}*"):
+            tag=etree.QName(e).localname
+            if tag=="public" and e.get("publicId")!=None:
+                self.public.setdefault(" ".join(e.get("publicId").split()),catalogPath(e.base,e.get("uri")))
+            elif tag=="system" and e.get("systemId")!=None:
+                self.system.setdefault(e.get("systemId"),catalogPath(e.base,e.get("uri")))
+            elif tag=="rewriteSystem":
+                self.rewrites.append((e.get("systemIdStartString"),catalogPath(e.base,e.get("rewritePrefix"))))
+            elif tag=="systemSuffix":
+                self.suffixes.append((e.get("systemIdSuffix"),catalogPath(e.base,e.get("uri"))))
+            elif tag in ("nextCatalog","delegatePublic","delegateSystem") and e.get("catalog")!=None:
+                more.append(catalogPath(e.base,e.get("catalog")))
+        # catalogs further down the chain come after this one's entries
+        for m in more:
+            self.load(m)
+
+    def resolve(self,publicid,systemid):
+        if systemid:
+            if systemid in self.system:
+                return self.system[systemid]
+            # longest matching prefix wins
+            best=None
+            for start, prefix in self.rewrites:
+                if start and systemid.startswith(start) and (best==None or len(start)>len(best[0])):
+                    best=(start,prefix)
+            if best!=None:
+                return os.path.join(best[1],systemid[len(best[0]):])
+            for suffix, uri in self.suffixes:
+                if suffix and systemid.endswith(suffix):
+                    return uri
+        if publicid:
+            publicid=" ".join(publicid.split())
+            if publicid in self.public:
+                return self.public[publicid]
+        return None
+
+#
+# Function to turn a catalog uri into a local path, relative
+# to the base of the catalog entry (its file or xml:base).
+#
+def catalogPath(base,uri):
+    import urllib.parse
+
+    if uri==None:
+        return None
+    if uri.startswith("file:"):
+        return urllib.parse.unquote(urllib.parse.urlparse(uri).path)
+    if "://" in uri or os.path.isabs(uri):
+        return uri
+    if base!=None:
+        base=catalogPath(None,base)
+        return os.path.normpath(os.path.join(os.path.dirname(base),uri))
+    return os.path.abspath(uri)
+
+#
+# Class caching compiled DTDs (etree.DTD objects), so each
+# distinct DTD is compiled once however many files use it.
+#
+# get(publicid,systemid,base) returns (dtd, error) for the
+# DOCTYPE of a file in directory base; the DTD and the
+# modules and entity files it pulls in are found through the
+# catalog, or as local files relative to the DTD. Nothing is
+# ever fetched from the network.
+#
+# validate(tree,dtd) returns the (line, message) errors for a
+# tree. A DTD object keeps its error log, so validation with
+# the same DTD is serialized when threads share the cache;
+# forked workers (see ValidateInventory) each have a copy.
+#
+class DTDCache:
+
+    def __init__(self,catalog=None):
+        import threading
+
+        if catalog==None:
+            catalog=Catalog()
+        self.catalog=catalog
+        # DTD path: (dtd, error, lock)
+        self.dtds={}
+        self.lock=threading.Lock()
+
+    def get(self,publicid,systemid,base):
+        import threading
+
+        path=self.catalog.resolve(publicid,systemid)
+        if path==None and systemid and not "://" in systemid:
+            # a local DTD next to the file
+            path=os.path.normpath(os.path.join(base,systemid))
+            if not os.path.isfile(path):
+                path=None
+        if path==None:
+            return None, "DTD not in catalog: "+(publicid or systemid or "(no ID)")
+        with self.lock:
+            if not path in self.dtds:
+                dtd, error = self.compile(path)
+                self.dtds[path]=(dtd,error,threading.Lock())
+            return self.dtds[path][:2]
+
+    def compile(self,path):
+        from lxml import etree
+        import urllib.request
+
+        if "://" in path or not os.path.isfile(path):
+            return None, "DTD not found: "+path
+
+        # DTD modules and entity files go through the catalog too
+        catalog=self.catalog
+        class CatalogResolver(etree.Resolver):
+            def resolve(self,url,publicid,context):
+                p=catalog.resolve(publicid,url)
+                if p!=None and os.path.isfile(p):
+                    return self.resolve_filename(p,context)
+                return None
+
+        # load the DTD as the external subset of an empty document
+        parser=etree.XMLParser(load_dtd=True,no_network=True,resolve_entities=False)
+        parser.resolvers.add(CatalogResolver())
+        url="file:"+urllib.request.pathname2url(os.path.abspath(path))
+        stub='<!DOCTYPE x SYSTEM "%s"><x/>' % url
+        try:
+            dtd=etree.fromstring(stub.encode("utf-8"),parser).getroottree().docinfo.externalDTD
+        except etree.XMLSyntaxError as e:
+            return None, "DTD error: "+str(e)
+        if dtd==None:
+            return None, "DTD not loaded: "+path
+        if debugMode():
+            print("compiled DTD",path)
+        return dtd, None
+
+    def validate(self,tree,dtd):
+        lock=None
+        for entry in self.dtds.values():
+            if entry[0] is dtd:
+                lock=entry[2]
+        with lock:
+            dtd.validate(tree)
+            return [(e.line,e.message) for e in dtd.error_log.filter_from_errors()]
+
+# the DTDCache ValidateInventory hands to its workers
+validcache = None
+
+#
+# Function to check the source files in an inventory against
+# the DTDs their DOCTYPEs declare.
+#
+# Each distinct DTD is compiled once, here, before the files
+# are validated in parallel (see ParallelMap); forked worker
+# processes inherit the compiled DTDs rather than compiling
+# their own.
+#
+# Returns a dictionary: file path -> list of (line, message)
+# for the files that are not valid.
+#
+def ValidateInventory(idlist,cache=None,jobs=0):
+    global validcache
+
+    if cache==None:
+        cache=DTDCache()
+    files=[]
+    seen=set()
+    for item in idlist:
+        if isSource(item):
+            f=fpath(item)
+            if not f in seen:
+                seen.add(f)
+                files.append(f)
+                name, publicid, systemid = doctypeIDs(item['doctype'])
+                cache.get(publicid,systemid,item['directory'])
+
+    validcache=cache
+    invalid={}
+    for f, errors in ParallelMap(validateFile,files,jobs):
+        if len(errors)>0:
+            invalid[f]=errors
+    return invalid
+
+#
+# Function to validate one file with the DTD its DOCTYPE
+# declares (see ValidateInventory); returns (file, errors).
+#
+def validateFile(f):
+    from lxml import etree
+
+    try:
+        # the default parser loads no DTD and never uses the network
+        tree=etree.parse(f)
+    except (OSError,etree.XMLSyntaxError) as e:
+        return f, [(0,str(e))]
+    docinfo=tree.docinfo
+    dtd, error = validcache.get(docinfo.public_id,docinfo.system_url,os.path.dirname(f))
+    if dtd==None:
+        return f, [(0,error)]
+    return f, validcache.validate(tree,dtd)
+
+#
+# Function to return the shard (0 to nshards-1) of a file,
+# from its path relative to the top of the tree so every
+# host agrees. With bydir the directory is hashed instead,
+# which keeps a directory (and most references) in one shard.
+#
+def shardOf(rel,nshards,bydir=False):
+    import zlib
+
+    rel=rel.replace(os.sep,"/")
+    if bydir:
+        rel=rel.rpartition("/")[0]
+    return zlib.crc32(rel.encode("utf-8"))%nshards
+
+#
+# Function to return the target of a normalized href as a
+# path relative to root, plus #topicid and /elementid
+#
+def targetKey(h,root):
+    hdir, hfile, htopic, hcontent = parseHref(h)
+    t=relPath(hdir+os.sep+hfile,root).replace(os.sep,"/")
+    if htopic!="":
+        t=t+"#"+htopic
+        if hcontent!="":
+            t=t+"/"+hcontent
+    return t
+
+#
+# Function to return the targets (see targetKey) a record
+# satisfies, following the rules of findHref: the file,
+# file#topicid, file#elementid and file#topicid/elementid
+#
+def recordTargets(item,root):
+    f=relPath(fpath(item),root).replace(os.sep,"/")
+    targets=[f]
+    tid=item.get('topicid',"")
+    if tid!="":
+        targets.append(f+"#"+tid)
+    for e in item.get('elementids',[]):
+        targets.append(f+"#"+e)
+        if tid!="":
+            targets.append(f+"#"+tid+"/"+e)
+    return targets
+
+#
+# Functions to move a path, or the paths in a record, from
+# one copy of a tree (old) to another (new)
+#
+def rebasePath(p,old,new):
+    if p==old or p.startswith(old+os.sep):
+        return new+p[len(old):]
+    return p
+
+def rebaseRecord(item,old,new):
+    if 'directory' in item and item['directory']!="":
+        item['directory']=rebasePath(item['directory'],old,new)
+    for field in ('hrefs','keyhrefs'):
+        if field in item:
+            item[field]=[rebasePath(h,old,new) if h!="" and not isURL(h) else h for h in item[field]]
+
+#
+# Function to return a digest of what a record says, with
+# its paths relative to root so that the same file scanned
+# in two copies of a tree gets the same digest. The source
+# lines and the signature are left out: moving a reference
+# to another line does not change the record.
+#
+# cache (see relTarget) saves working out the same target
+# again for every record that refers to it.
+#
+def recordHash(item,root,cache=None):
+    import hashlib
+    import json
+
+    if cache==None:
+        cache={}
+    data={}
+    for name in item:
+        if name in ('directory','minhash') or name.endswith('lines'):
+            continue
+        v=item[name]
+        if name in ('hrefs','keyhrefs'):
+            v=[relTarget(h,root,cache) for h in v]
+        data[name]=v
+    data['directory']=relPath(item['directory'],root).replace(os.sep,"/")
+    return hashlib.blake2b(json.dumps(data,sort_keys=True).encode("utf-8"),digest_size=16).digest()
+
+#
+# Function to return a normalized href as a target relative
+# to root (see targetKey), or unchanged if it is a URL or
+# empty; cache is a dictionary of the hrefs done so far.
+#
+def relTarget(h,root,cache):
+    t=cache.get(h)
+    if t==None:
+        if h=="" or isURL(h):
+            t=h
+        else:
+            t=targetKey(h,root)
+        cache[h]=t
+    return t
+
+#
+# Class holding what DiffScans compares in a saved scan:
+# an inventory (see SaveInventory) or a snapshot (see
+# SaveSnapshot). Paths are relative to the project directory
+# of the scan, so scans of two copies of a tree compare.
+#
+#   files - file -> the topic ids of its records
+#   records - (file, topic id) -> [(digest, record), ...]
+#   targets - targets the records satisfy (see recordTargets)
+#   bad - (file, target) references to nothing in the scan
+#   defined - keys defined
+#   keytargets - key -> target of its first definition
+#   badkeys - (file, keyref) references to undefined keys
+#
+# Everything is built in one pass over the records. ok is
+# False if the file could not be read.
+#
+class SavedScan:
+
+    def __init__(self,path):
+        self.path=path
+        self.ok=False
+        self.files={}
+        self.records={}
+        self.targets=set()
+        self.bad=set()
+        self.defined=set()
+        self.keytargets={}
+        self.badkeys=set()
+
+        snap=None
+        if isSnapshot(path):
+            try:
+                snap=Snapshot(path)
+            except (OSError,ValueError) as e:
+                print("SavedScan error",path,e)
+                return
+            self.root=canonPath(snap.project)
+            records=snap.records()
+            self.defined.update(snap.keyvalues())
+        else:
+            p=Project()
+            mapfiles=[]
+            records=[]
+            if p.LoadInventory(path,mapfiles,records)==None:
+                return
+            self.root=canonPath(p.getpdir())
+            self.defined.update(p.keyvalues)
+
+        refs=[]
+        keyrefs=[]
+        self.cache={}
+        for item in records:
+            if item.get('directory',"")=="":
+                # a URL
+                continue
+            f=relPath(fpath(item),self.root).replace(os.sep,"/")
+            tid=item.get('topicid')
+            ids=self.files.setdefault(f,[])
+            if tid!=None:
+                ids.append(tid)
+            self.records.setdefault((f,tid),[]).append((recordHash(item,self.root,self.cache),item))
+            self.targets.update(recordTargets(item,self.root))
+            for h in item.get('hrefs',[]):
+                if not isURL(h):
+                    refs.append((f,relTarget(h,self.root,self.cache)))
+            keyhrefs=item.get('keyhrefs',[])
+            for i in range(len(item.get('keys',[]))):
+                k=item['keys'][i]
+                self.defined.add(k)
+                if not k in self.keytargets:
+                    h=keyhrefs[i] if i<len(keyhrefs) else ""
+                    self.keytargets[k]=relTarget(h,self.root,self.cache)
+            for kr in item.get('keyrefs',[]):
+                keyrefs.append((f,kr))
+        if snap!=None:
+            snap.close()
+
+        # the references that lead nowhere, once every
+        # target and key is known
+        for src, t in refs:
+            if not t in self.targets:
+                self.bad.add((src,t))
+        for src, kr in keyrefs:
+            key, kid = parseKeyref(kr)
+            if not key in self.defined:
+                self.badkeys.add((src,kr))
+        self.ok=True
+
+    #
+    # Function to return the targets of the references of a
+    # record, as a set of targets (see targetKey) and keyrefs
+    #
+    def refTargets(self,item):
+        out=set()
+        for h in item.get('hrefs',[]):
+            out.add(relTarget(h,self.root,self.cache))
+        for kr in item.get('keyrefs',[]):
+            out.add("key:"+kr)
+        return out
+
+#
+# Function to compare two saved scans (inventories or
+# snapshots) of a project, such as the last release and
+# this one.
+#
+# Records are matched by file and topic id and compared by
+# digest (see recordHash), so only the records whose digests
+# differ are looked at field by field; everything else is a
+# set operation, and the time grows with the number of
+# records.
+#
+# Returns a dictionary, with paths relative to the projects:
+#   added, removed - files only in the new or the old scan
+#   ids - (file, old topic ids, new topic ids) for the files
+#         in both whose topic ids changed
+#   broken - (file, target) references bad in the new scan
+#            that were not bad in the old one
+#   badkeys - (file, keyref) key references to undefined
+#             keys in the new scan that were not before
+#   keys - keys defined in the old scan and not the new one
+#   keytargets - (key, old target, new target) for the keys
+#                whose first definition points elsewhere
+#   targets - (file#topicid, removed targets, added targets)
+#             for the topics in both whose references changed
+#   same, changed - records in both scans unchanged and changed
+# or None if a scan cannot be read.
+#
+def DiffScans(oldpath,newpath):
+    old=SavedScan(oldpath)
+    if not old.ok:
+        return None
+    new=SavedScan(newpath)
+    if not new.ok:
+        return None
+
+    report={}
+    report['added']=sorted(set(new.files)-set(old.files))
+    report['removed']=sorted(set(old.files)-set(new.files))
+    report['ids']=[]
+    for f in sorted(set(old.files)&set(new.files)):
+        if sorted(old.files[f])!=sorted(new.files[f]):
+            report['ids'].append((f,old.files[f],new.files[f]))
+    report['broken']=sorted(new.bad-old.bad)
+    report['badkeys']=sorted(new.badkeys-old.badkeys)
+    report['keys']=sorted(old.defined-new.defined)
+    report['keytargets']=[]
+    for k in sorted(set(old.keytargets)&set(new.keytargets)):
+        if old.keytargets[k]!=new.keytargets[k]:
+            report['keytargets'].append((k,old.keytargets[k],new.keytargets[k]))
+
+    # only records whose digests differ are compared further
+    report['targets']=[]
+    report['same']=0
+    report['changed']=0
+    for key in sorted(set(old.records)&set(new.records),key=lambda k: (k[0],k[1] or "")):
+        orecs=old.records[key]
+        nrecs=new.records[key]
+        if sorted([d for d, item in orecs])==sorted([d for d, item in nrecs]):
+            report['same']=report['same']+len(nrecs)
+            continue
+        report['changed']=report['changed']+len(nrecs)
+        ot=set()
+        for d, item in orecs:
+            ot.update(old.refTargets(item))
+        nt=set()
+        for d, item in nrecs:
+            nt.update(new.refTargets(item))
+        if ot!=nt:
+            node=key[0]+("#"+key[1] if key[1] else "")
+            report['targets'].append((node,sorted(ot-nt),sorted(nt-ot)))
+    return report
+
+#
+# Class for a Bloom filter: a compact set that answers
+# "maybe present" or "certainly absent".
+#
+# n is the number of items expected and fp the false
+# positive rate wanted; the number of bits and of hashes
+# follow from them. The bit positions of an item come from
+# the two halves of one blake2b digest (double hashing).
+#
+class BloomFilter:
+
+    def __init__(self,n=1,fp=BLOOM_FP):
+        import math
+
+        n=max(1,n)
+        self.size=max(64,int(-n*math.log(fp)/(math.log(2)**2)))
+        self.hashes=max(1,int(round(self.size/n*math.log(2))))
+        self.bits=bytearray((self.size+7)//8)
+
+    def positions(self,s):
+        import hashlib
+
+        d=hashlib.blake2b(s.encode("utf-8"),digest_size=16).digest()
+        h1=int.from_bytes(d[:8],"little")
+        h2=int.from_bytes(d[8:],"little")|1
+        return [(h1+i*h2)%self.size for i in range(self.hashes)]
+
+    def add(self,s):
+        for p in self.positions(s):
+            self.bits[p>>3]|=1<<(p&7)
+
+    def __contains__(self,s):
+        for p in self.positions(s):
+            if not self.bits[p>>3]&(1<<(p&7)):
+                return False
+        return True
+
+    #
+    # Functions to convert to and from a dictionary
+    # that can be saved as JSON
+    #
+    def todict(self):
+        import base64
+
+        return {'size':self.size,'hashes':self.hashes,'bits':base64.b64encode(bytes(self.bits)).decode("ascii")}
+
+    def fromdict(self,data):
+        import base64
+
+        self.size=data['size']
+        self.hashes=data['hashes']
+        self.bits=bytearray(base64.b64decode(data['bits']))
+        return self
+
+#
+# Function to test if a file is a snapshot (see Snapshot)
+#
+def isSnapshot(path):
+    try:
+        fin=open(path,"rb")
+        magic=fin.read(len(SNAPSHOT_MAGIC))
+        fin.close()
+    except OSError:
+        return False
+    return magic==SNAPSHOT_MAGIC
+
+#
+# Function to open the snapshot given with --index=file,
+# or return None if there is none. A file that is not a
+# snapshot is an error, not a reason to scan without it.
+#
+def SnapshotFromArgs():
+    import struct
+
+    path=GetOption("index")
+    if path==None:
+        return None
+    if path==True:
+        print("Error: give the snapshot as --index=file")
+        sys.exit(1)
+    if not os.path.isfile(path):
+        print("Error: snapshot",path,"not found")
+        sys.exit(1)
+    if not isSnapshot(path):
+        print("Error:",path,"is not a project snapshot (see ditaindex.py)")
+        sys.exit(1)
+    try:
+        return Snapshot(path)
+    except (OSError,ValueError,struct.error) as e:
+        print("Error:",path,"cannot be read as a snapshot:",e)
+        sys.exit(1)
+
+#
+# Class for reading a project snapshot written by
+# SaveSnapshot: the records, key space and reference edges
+# of a scan.
+#
+# The file is memory-mapped and its arrays are used in place,
+# so opening it reads only the header, and processes that
+# open the same snapshot share its pages. A record is decoded
+# only when it is asked for.
+#
+# Strings are kept once in a sorted table, so a string is
+# found by a binary search of the table, after which the
+# sorted path, key and edge arrays are searched by index.
+#
+class Snapshot:
+
+    def __init__(self,path):
+        import mmap
+        import struct
+
+        self.path=path
+        fin=open(path,"rb")
+        try:
+            self.map=mmap.mmap(fin.fileno(),0,access=mmap.ACCESS_READ)
+        finally:
+            fin.close()
+        magic, version, n = struct.unpack_from("<8sII",self.map,0)
+        if magic!=SNAPSHOT_MAGIC or version!=SNAPSHOT_VERSION or n!=len(SNAPSHOT_SECTIONS):
+            self.map.close()
+            raise ValueError(path+" is not a version %d snapshot" % SNAPSHOT_VERSION)
+        view=memoryview(self.map)
+        self.sec={}
+        pos=struct.calcsize("<8sII")
+        for name in SNAPSHOT_SECTIONS:
+            off, size = struct.unpack_from("<QQ",self.map,pos)
+            pos=pos+16
+            if name=="strings":
+                self.sec[name]=view[off:off+size]
+            elif name in ("stroffsets","recoffsets"):
+                self.sec[name]=self.array(view[off:off+size],"Q")
+            else:
+                self.sec[name]=self.array(view[off:off+size],"I")
+        self.nstrings=len(self.sec['stroffsets'])-1
+        # decoded strings
+        self.cache={}
+        self.fields=[]
+        f=self.sec['fields']
+        for i in range(0,len(f),2):
+            self.fields.append((self.string(f[i]),f[i+1]))
+        self.source=self.string(self.sec['meta'][0])
+        self.project=self.string(self.sec['meta'][1])
+
+    #
+    # Function to return a section as an array of integers,
+    # in place where the byte order allows
+    #
+    def array(self,view,typecode):
+        import array
+
+        if sys.byteorder=="little":
+            return view.cast(typecode)
+        a=array.array(typecode,view.tobytes())
+        a.byteswap()
+        return a
+
+    def close(self):
+        for name in self.sec:
+            if isinstance(self.sec[name],memoryview):
+                self.sec[name].release()
+        self.sec={}
+        self.map.close()
+
+    #
+    # Function to return string i of the string table
+    #
+    def string(self,i):
+        s=self.cache.get(i)
+        if s==None:
+            off=self.sec['stroffsets']
+            s=sys.intern(str(self.sec['strings'][off[i]:off[i+1]],"utf-8"))
+            self.cache[i]=s
+        return s
+
+    #
+    # Function to return the index of a string in the
+    # string table, or -1
+    #
+    def strIndex(self,s):
+        b=s.encode("utf-8")
+        off=self.sec['stroffsets']
+        strs=self.sec['strings']
+        lo=0
+        hi=self.nstrings
+        while lo<hi:
+            mid=(lo+hi)//2
+            if bytes(strs[off[mid]:off[mid+1]])<b:
+                lo=mid+1
+            else:
+                hi=mid
+        if lo<self.nstrings and bytes(strs[off[lo]:off[lo+1]])==b:
+            return lo
+        return -1
+
+    #
+    # Function to find a value in a sorted array of groups
+    # of width integers, returning the first group's position
+    # (or -1)
+    #
+    def search(self,a,width,value,col=0):
+        lo=0
+        hi=len(a)//width
+        while lo<hi:
+            mid=(lo+hi)//2
+            if a[mid*width+col]<value:
+                lo=mid+1
+            else:
+                hi=mid
+        if lo<len(a)//width and a[lo*width+col]==value:
+            return lo
+        return -1
+
+    def __len__(self):
+        return len(self.sec['recoffsets'])-1
+
+    #
+    # Function to decode record i into a dictionary
+    #
+    def record(self,i):
+        recs=self.sec['records']
+        p=self.sec['recoffsets'][i]
+        mask=recs[p]
+        p=p+1
+        item={}
+        for b in range(len(self.fields)):
+            if not mask&(1<<b):
+                continue
+            name, ftype = self.fields[b]
+            if ftype==0:
+                v=recs[p]
+                item[name]=None if v==0xFFFFFFFF else self.string(v)
+                p=p+1
+            elif ftype==1:
+                n=recs[p]
+                item[name]=[self.string(x) for x in recs[p+1:p+1+n]]
+                p=p+1+n
+            else:
+                n=recs[p]
+                item[name]=[recs[p+1+2*j]|(recs[p+2+2*j]<<32) for j in range(n)]
+                p=p+1+2*n
+        return item
+
+    def records(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    #
+    # Functions to test for and return the records of a file
+    # (an absolute path)
+    #
+    def hasFile(self,f):
+        i=self.strIndex(f)
+        return i>=0 and self.search(self.sec['paths'],3,i)>=0
+
+    def fileRecords(self,f):
+        i=self.strIndex(f)
+        if i<0:
+            return []
+        j=self.search(self.sec['paths'],3,i)
+        if j<0:
+            return []
+        paths=self.sec['paths']
+        start=paths[j*3+1]
+        byfile=self.sec['byfile']
+        return [self.record(byfile[k]) for k in range(start,start+paths[j*3+2])]
+
+    #
+    # Functions to return the key space
+    #
+    def keyValue(self,key):
+        i=self.strIndex(key)
+        if i<0:
+            return None
+        j=self.search(self.sec['keys'],2,i)
+        if j<0:
+            return None
+        return self.string(self.sec['keys'][j*2+1])
+
+    def keyvalues(self):
+        k=self.sec['keys']
+        return dict([(self.string(k[i]),self.string(k[i+1])) for i in range(0,len(k),2)])
+
+    def mapfiles(self):
+        return [self.string(i) for i in self.sec['mapfiles']]
+
+    #
+    # Functions to return the edges from and to a node
+    # (a file path or file#topicid), as lists of
+    # (target, type) and (source, type)
+    #
+    def targets(self,node):
+        out=[]
+        i=self.strIndex(node)
+        e=self.sec['edges']
+        j=self.search(e,3,i) if i>=0 else -1
+        while j>=0 and j*3<len(e) and e[j*3]==i:
+            out.append((self.string(e[j*3+1]),self.string(e[j*3+2])))
+            j=j+1
+        return out
+
+    def sources(self,node):
+        out=[]
+        i=self.strIndex(node)
+        if i<0:
+            return out
+        e=self.sec['edges']
+        r=self.sec['redges']
+        lo=0
+        hi=len(r)
+        while lo<hi:
+            mid=(lo+hi)//2
+            if e[r[mid]*3+1]<i:
+                lo=mid+1
+            else:
+                hi=mid
+        while lo<len(r) and e[r[lo]*3+1]==i:
+            out.append((self.string(e[r[lo]*3]),self.string(e[r[lo]*3+2])))
+            lo=lo+1
+        return out
+
+    #
+    # Function to return the RefGraph of the files reachable
+    # from a list of maps, as ScanMapClosure builds it while
+    # scanning, from the stored edges and without reading any
+    # file. Key references are resolved again against the
+    # keys the reachable files define.
+    #
+    # Returns None if the snapshot does not hold every file
+    # the maps reach (the files must then be scanned).
+    #
+    def refGraph(self,maps):
+        # the stored href/conref/data edges, by source file
+        # (the edges are sorted by source, and there are only
+        # a few edge types, so each is decoded once)
+        byfile={}
+        types={}
+        e=self.sec['edges']
+        last=-1
+        for j in range(0,len(e),3):
+            t=e[j+2]
+            if not t in types:
+                types[t]=self.string(t)
+            etype=types[t]
+            if not etype in refs:
+                continue
+            if e[j]!=last:
+                last=e[j]
+                src=self.string(last)
+                out=byfile.setdefault(nodeParts(src)[0],[])
+            out.append((src,self.string(e[j+1]),etype))
+
+        graph=RefGraph()
+        seen=set()
+        pending=[]
+        for map in maps:
+            absmap=canonPath(map)
+            if not absmap in seen:
+                seen.add(absmap)
+                pending.append(absmap)
+        done=0
+        while done<len(pending):
+            f=pending[done]
+            done=done+1
+            if not isURL(f) and not self.hasFile(f) and os.path.exists(f):
+                return None
+            for src, dst, etype in byfile.get(f,()):
+                graph.addEdge(src,dst,etype)
+                xfpath=dst if isURL(dst) else hrefFile(dst)
+                if not xfpath in seen:
+                    seen.add(xfpath)
+                    pending.append(xfpath)
+            for item in self.fileRecords(f):
+                graph.addKeys(item)
+        graph.resolveKeys()
+        return graph
+
+#
+# Function to open the RecordStore given with --store=file
+# (--store alone uses a temporary database), or return None.
+# A file that is there but is not a record store is left
+# alone and the program stops.
+#
+def StoreFromArgs():
+    path=GetOption("store")
+    if path==None:
+        return None
+    if path==True:
+        path=""
+    try:
+        return RecordStore(path)
+    except ValueError as e:
+        print("Error:",e)
+        sys.exit(1)
+
+#
+# Function to test if a file is a database written by
+# RecordStore: an SQLite file holding its records and
+# keydefs tables
+#
+def isStore(path):
+    import sqlite3
+    import urllib.request
+
+    try:
+        fin=open(path,"rb")
+        magic=fin.read(16)
+        fin.close()
+    except OSError:
+        return False
+    if magic!=b"SQLite format 3\x00":
+        return False
+    try:
+        db=sqlite3.connect("file:"+urllib.request.pathname2url(os.path.abspath(path))+"?mode=ro",uri=True)
+        try:
+            names=set([r[0] for r in db.execute("SELECT name FROM sqlite_master WHERE type='table'")])
+        finally:
+            db.close()
+    except sqlite3.Error:
+        return False
+    return 'records' in names and 'keydefs' in names
+
+#
+# Class keeping the dictionary list of file information
+# (idlist) in an SQLite database instead of memory, for
+# projects too large to hold.
+#
+# It is used in place of the list: scans append the records
+# as they are produced (written in batches of STORE_BATCH),
+# and iterating reads them back one at a time in the order
+# they were added. findHref and returnList run as indexed
+# queries on the store rather than scans of the list, and
+# the project keys live in its keyvalues table (see
+# StoreKeys), so memory does not grow with the project.
+#
+#   path - database file ("" for a temporary one that is
+#          removed when the store is closed); the records
+#          in an earlier store are replaced, and any other
+#          file there raises ValueError
+#
+class RecordStore:
+
+    def __init__(self,path=""):
+        import sqlite3
+
+        self.path=path
+        if path!="" and os.path.exists(path):
+            # only an earlier store is replaced
+            if not isStore(path):
+                raise ValueError(path+" exists and is not a record store")
+            os.remove(path)
+        self.db=sqlite3.connect(path,check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("PRAGMA temp_store=FILE")
+        self.db.execute("PRAGMA cache_size=-%d" % STORE_CACHE)
+        self.db.executescript("""
+            CREATE TABLE records (id INTEGER PRIMARY KEY, directory TEXT,
+                basename TEXT, topicid TEXT, path TEXT, source INTEGER, data TEXT);
+            CREATE INDEX records_file ON records (directory, basename);
+            CREATE INDEX records_base ON records (basename);
+            CREATE INDEX records_topic ON records (source, topicid, path);
+            CREATE TABLE elementids (rec INTEGER, eid TEXT, PRIMARY KEY (rec, eid)) WITHOUT ROWID;
+            CREATE INDEX elementids_eid ON elementids (eid);
+            CREATE TABLE keydefs (key TEXT, rec INTEGER);
+            CREATE INDEX keydefs_key ON keydefs (key);
+            CREATE TABLE keyvalues (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.count=0
+        self.pending=[]
+        self.keyvalues=StoreKeys(self)
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+    #
+    # Functions to add records, as on a list
+    #
+    def append(self,item):
+        self.pending.append(item)
+        self.count=self.count+1
+        if len(self.pending)>=STORE_BATCH:
+            self.flush()
+
+    def extend(self,items):
+        for item in items:
+            self.append(item)
+
+    #
+    # Function to write the buffered records to the database
+    #
+    def flush(self):
+        import json
+
+        if len(self.pending)==0:
+            return
+        first=self.count-len(self.pending)+1
+        rows=[]
+        eids=[]
+        keys=[]
+        for i in range(len(self.pending)):
+            item=self.pending[i]
+            rec=first+i
+            rows.append((rec,item['directory'],item['basename'],item.get('topicid',""),
+                         fpath(item),isSource(item),json.dumps(item)))
+            for e in item.get('elementids',[]):
+                eids.append((rec,e))
+            for k in item.get('keys',[]):
+                for kk in k.split(" "):
+                    keys.append((kk,rec))
+        self.db.executemany("INSERT INTO records VALUES (?,?,?,?,?,?,?)",rows)
+        self.db.executemany("INSERT OR IGNORE INTO elementids VALUES (?,?)",eids)
+        self.db.executemany("INSERT INTO keydefs VALUES (?,?)",keys)
+        self.db.commit()
+        self.pending=[]
+
+    #
+    # Functions to read records, as from a list
+    #
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.flush()
+        return self.decode(self.db.execute("SELECT data FROM records ORDER BY id"))
+
+    def __getitem__(self,i):
+        if i<0:
+            i=i+self.count
+        if i<0 or i>=self.count:
+            raise IndexError("RecordStore index out of range")
+        self.flush()
+        return self.rows("SELECT data FROM records WHERE id=?",(i+1,))[0]
+
+    def decode(self,cursor):
+        import json
+
+        for row in cursor:
+            yield json.loads(row[0])
+
+    def rows(self,sql,args=()):
+        return list(self.decode(self.db.execute(sql,args)))
+
+    def exists(self,sql,args=()):
+        return self.db.execute("SELECT EXISTS ("+sql+")",args).fetchone()[0]==1
+
+    #
+    # Function to return the records matching one part of
+    # a reference (see returnList)
+    #
+    def match(self,mtype,s):
+        self.flush()
+        if mtype==TYPE_DIR:
+            return self.rows("SELECT data FROM records WHERE directory=? ORDER BY id",(s,))
+        elif mtype==TYPE_FILE:
+            return self.rows("SELECT data FROM records WHERE basename=? ORDER BY id",(s,))
+        elif mtype==TYPE_TOPICID:
+            return self.rows("SELECT data FROM records WHERE topicid=? AND topicid!='' ORDER BY id",(s,))
+        elif mtype==TYPE_CONTENTID:
+            return self.rows("SELECT data FROM records WHERE id IN "
+                             "(SELECT rec FROM elementids WHERE eid=?) ORDER BY id",(s,))
+        print("Error, mtype=",mtype)
+        return []
+
+    #
+    # Function to test if a reference has a target, with the
+    # same rules as findHref
+    #
+    def findHref(self,hdir,hfile,htopic,hcontent):
+        self.flush()
+        infile="SELECT id FROM records WHERE directory=? AND basename=?"
+        if not self.exists(infile,(hdir,hfile)):
+            # file was not found
+            return False
+        if htopic=="":
+            # no topicid is present
+            return True
+        topics=infile+" AND topicid=?"
+        if self.exists(topics,(hdir,hfile,htopic)):
+            if hcontent=="":
+                return True
+            # check contentid
+            return self.exists("SELECT 1 FROM elementids WHERE eid=? AND rec IN ("+topics+")",
+                               (hcontent,hdir,hfile,htopic))
+        if hcontent!="":
+            # there is both a topic and content id
+            return False
+        # check if reference was to a contentid instead
+        return self.exists("SELECT 1 FROM elementids WHERE eid=? AND rec IN ("+infile+")",
+                           (htopic,hdir,hfile))
+
+    #
+    # Function to return the (topicid, path) of every source
+    # file record, sorted, as ditaids lists them ("" for
+    # records without a topicid)
+    #
+    def topicIDs(self):
+        self.flush()
+        for row in self.db.execute("SELECT topicid, path FROM records "
+                                   "WHERE source=1 ORDER BY topicid, path"):
+            yield [row[0],row[1]]
+
+    def countSources(self):
+        self.flush()
+        return self.db.execute("SELECT count(*) FROM records WHERE source=1").fetchone()[0]
+
+    #
+    # Functions for the keys the records define (their keys
+    # fields split into names), in the order they were found
+    #
+    def definedKeys(self):
+        self.flush()
+        for row in self.db.execute("SELECT key FROM keydefs ORDER BY rowid"):
+            yield row[0]
+
+    def keyDefined(self,key):
+        self.flush()
+        return self.exists("SELECT 1 FROM keydefs WHERE key=?",(key,))
+
+#
+# Class for the project keys (key name -> href) kept in a
+# RecordStore's database. It is used in place of the
+# project's keyvalues dictionary and keeps the order the
+# keys were first set in, as a dictionary does.
+#
+class StoreKeys:
+
+    def __init__(self,store):
+        self.db=store.db
+
+    def __setitem__(self,key,value):
+        self.db.execute("INSERT INTO keyvalues VALUES (?,?) "
+                        "ON CONFLICT (key) DO UPDATE SET value=excluded.value",(key,value))
+
+    def __getitem__(self,key):
+        row=self.db.execute("SELECT value FROM keyvalues WHERE key=?",(key,)).fetchone()
+        if row==None:
+            raise KeyError(key)
+        return row[0]
+
+    def get(self,key,default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self,key):
+        return self.db.execute("SELECT EXISTS (SELECT 1 FROM keyvalues WHERE key=?)",(key,)).fetchone()[0]==1
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM keyvalues").fetchone()[0]
+
+    def __iter__(self):
+        for row in self.db.execute("SELECT key FROM keyvalues ORDER BY rowid"):
+            yield row[0]
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [row[0] for row in self.db.execute("SELECT value FROM keyvalues ORDER BY rowid")]
+
+    def items(self):
+        return [tuple(row) for row in self.db.execute("SELECT key, value FROM keyvalues ORDER BY rowid")]
+
+    def update(self,other):
+        for k in other:
+            self[k]=other[k]
+
+    def clear(self):
+        self.db.execute("DELETE FROM keyvalues")
+
+#
+# Class recording which root maps reach each file.
+#
+# Every file gets a small integer id and a bitset (a Python
+# int) with bit i set when root map i reaches the file. The
+# bitsets are computed in one propagation over the file-level
+# edges of a RefGraph: a file's bits are or'ed into the files
+# it refers to, and a file is looked at again only when its
+# bits grow.
+#
+class MapMembership:
+
+    def __init__(self,maps,graph):
+        # root maps, bit i stands for maps[i]
+        self.maps=[canonPath(m) for m in maps]
+        # file path -> id, and id -> file path
+        self.fileids={}
+        self.files=[]
+        # id -> bitset of the maps reaching the file
+        self.bits=[]
+
+        work=collections.deque()
+        for i in range(len(self.maps)):
+            fid=self.fileId(self.maps[i])
+            self.bits[fid]|=(1<<i)
+            work.append(fid)
+        queued=set(work)
+        while len(work)>0:
+            fid=work.popleft()
+            queued.discard(fid)
+            fbits=self.bits[fid]
+            for dst, etype in graph.fwd.get(self.files[fid],()):
+                if isURL(dst):
+                    continue
+                did=self.fileId(hrefFile(dst))
+                if self.bits[did]|fbits!=self.bits[did]:
+                    self.bits[did]|=fbits
+                    if not did in queued:
+                        queued.add(did)
+                        work.append(did)
+
+    #
+    # Function to return the id of a file, adding it if needed
+    #
+    def fileId(self,f):
+        if f in self.fileids:
+            return self.fileids[f]
+        fid=len(self.files)
+        self.fileids[f]=fid
+        self.files.append(f)
+        self.bits.append(0)
+        return fid
+
+    #
+    # Function to return the bitset of the maps reaching a file
+    #
+    def bitsOf(self,f):
+        if f in self.fileids:
+            return self.bits[self.fileids[f]]
+        return 0
+
+    #
+    # Function to return the root maps that reach a file
+    #
+    def mapsContaining(self,f):
+        b=self.bitsOf(f)
+        out=[]
+        i=0
+        while b!=0:
+            if b&1:
+                out.append(self.maps[i])
+            b=b>>1
+            i=i+1
+        return out
+
+    #
+    # Function to test if a root map reaches a file
+    #
+    def inMap(self,f,m):
+        i=self.maps.index(canonPath(m))
+        return (self.bitsOf(f)>>i)&1==1
+
+    #
+    # Function to return the files a root map reaches
+    #
+    def filesInMap(self,m):
+        mask=1<<self.maps.index(canonPath(m))
+        return [self.files[i] for i in range(len(self.files)) if self.bits[i]&mask]
+
+#
+# Function to return a Progress object set up from the
+# command line options, or None if none were given:
+#
+#   --progress      report progress to stderr
+#   --status=file   keep the progress in a JSON status file
+#   --maxtime=sec   stop scanning after this many seconds
+#   --maxmem=MB     stop scanning above this much memory
+#
+def ProgressFromArgs():
+    show=GetOption("progress",False)
+    status=GetOption("status")
+    maxtime=float(GetOption("maxtime","0"))
+    maxmem=float(GetOption("maxmem","0"))
+    if not show and status==None and maxtime==0 and maxmem==0:
+        return None
+    return Progress(show,status,maxtime,maxmem)
+
+#
+# Function to return the setpipeline arguments given on the
+# command line:
+#
+#   --readers=n   I/O threads (pipelining is off without it)
+#   --parsers=n   parser threads (default one per CPU)
+#   --depth=n     files waiting between stages
+#
+def PipelineFromArgs():
+    readers=int(GetOption("readers","0"))
+    parsers=int(GetOption("parsers","0"))
+    depth=int(GetOption("depth",str(PIPE_DEPTH)))
+    return (readers,parsers,depth)
+
+#
+# Function to return the memory in use by this process
+# in bytes (0 if it cannot be found)
+#
+def memoryUsed():
+    try:
+        # current resident size on Linux
+        fin=open("/proc/self/statm","r")
+        pages=int(fin.read().split()[1])
+        fin.close()
+        return pages*os.sysconf("SC_PAGE_SIZE")
+    except (OSError,ValueError,AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        # not available on Windows
+        return 0
+    # peak resident size (kilobytes, but bytes on macOS)
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform=="darwin":
+        return rss
+    return rss*1024
+
+#
+# Class counting the work done by a scan and reporting it
+# (files discovered, parsed and checked, throughput, ETA)
+# to stderr and/or a status file, at most every interval
+# seconds.
+#
+# It also holds the run's budgets. over() returns True once
+# the wall time or memory budget is used up or the run was
+# cancelled; the scans then stop and keep what they have.
+#
+class Progress:
+
+    def __init__(self,show=True,statusfile=None,maxtime=0,maxmem=0,interval=2.0):
+        self.show=show
+        self.statusfile=statusfile
+        # budgets: seconds and megabytes, 0 = no limit
+        self.maxtime=maxtime
+        self.maxmem=maxmem
+        self.interval=interval
+        self.discovered=0
+        self.parsed=0
+        self.checked=0
+        self.start=time.monotonic()
+        self.last=self.start
+        # why the run stopped early (None while running)
+        self.stopped=None
+
+    def discover(self,n=1):
+        self.discovered=self.discovered+n
+        self.tick()
+
+    def parse(self,n=1):
+        self.parsed=self.parsed+n
+        self.tick()
+
+    def check(self,n=1):
+        self.checked=self.checked+n
+        self.tick()
+
+    #
+    # Function to report if the interval has passed
+    #
+    def tick(self):
+        now=time.monotonic()
+        if now-self.last>=self.interval:
+            self.last=now
+            self.report(now)
+
+    #
+    # Function to test the budgets; True means stop now
+    #
+    def over(self):
+        if self.stopped!=None:
+            return True
+        if self.maxtime>0 and time.monotonic()-self.start>self.maxtime:
+            self.cancel("time budget of %g seconds used up" % self.maxtime)
+        elif self.maxmem>0 and memoryUsed()>self.maxmem*1024*1024:
+            self.cancel("memory budget of %g MB used up" % self.maxmem)
+        return self.stopped!=None
+
+    #
+    # Function to stop the run, keeping what has been done
+    #
+    def cancel(self,reason):
+        if self.stopped==None:
+            self.stopped=reason
+            sys.stderr.write("scan stopped: "+reason+", results are partial\n")
+            self.report()
+
+    #
+    # Function to write the current state
+    #
+    def report(self,now=None):
+        import json
+
+        if now==None:
+            now=time.monotonic()
+        elapsed=now-self.start
+        rate=0.0
+        if elapsed>0:
+            rate=self.parsed/elapsed
+        left=max(0,self.discovered-self.parsed)
+        eta=None
+        if rate>0:
+            eta=left/rate
+        if self.show:
+            if eta==None:
+                etas="?"
+            else:
+                etas="%d:%02d" % (int(eta)//60,int(eta)%60)
+            sys.stderr.write("progress: %d discovered, %d parsed, %d checked, %.1f files/s, ETA %s\n" %
+                             (self.discovered,self.parsed,self.checked,rate,etas))
+        if self.statusfile!=None:
+            data={'discovered':self.discovered,'parsed':self.parsed,'checked':self.checked,
+                  'elapsed':round(elapsed,3),'rate':round(rate,3),'eta':eta,
+                  'memory':memoryUsed(),'stopped':self.stopped}
+            try:
+                tmp=self.statusfile+".tmp"
+                out=open(tmp,"w")
+                json.dump(data,out)
+                out.close()
+                os.replace(tmp,self.statusfile)
+            except OSError as e:
+                sys.stderr.write("Progress status file error "+str(e)+"\n")
+
+#
+# Class holding everything a scan of one project needs:
+# its settings (debug, signatures, streaming size, progress
+# and budgets), its project directory, its key space and
+# its inventory. Each Project is independent of the others,
+# so several projects can be scanned at the same time in
+# different threads of one process (see ScanProjects).
+#
+# The module functions of the same names (GetMapInventory,
+# ScanSourceFile, setdebug, ppath, ...) work on a default
+# project shared by the command line tools.
+#
+class Project:
+
+    def __init__(self,path=None):
+        # debug flag - setting this to True traces execution in great detail
+        self.dbgflag = False
+        # saved project directory
+        self.project_dir = ""
+        # key values
+        self.keyvalues = {}
+        # signature flag - setting this to True makes ScanTopic compute
+        # a MinHash signature of each topic's text (see setsignatures)
+        self.sigflag = False
+        # fields ScanTopic extracts (see setfields), None for all
+        self.fields = None
+        # files larger than this many bytes are scanned with the
+        # streaming parser (see setstreamsize), 0 turns it off
+        self.streamsize = STREAM_SIZE
+        # pipelined scans: reader and parser threads and queue
+        # depth (see setpipeline), 0 readers scans serially
+        self.readers = 0
+        self.parsers = 0
+        self.depth = PIPE_DEPTH
+        # snapshot the files are read from when it has them
+        # (see setsnapshot), None to scan every file
+        self.snapshot = None
+        # database the records and keys are kept in instead of
+        # memory (see setstore), None to keep them in memory
+        self.store = None
+        # (shard, number of shards, by directory) directory scans
+        # are limited to (see setshard), None for all files
+        self.shard = None
+        # progress reporter used by the scans (see setprogress)
+        self.progress = None
+        # inventory filled by scanMaps/scanFiles
+        self.mapfiles = []
+        self.idlist = []
+        if path!=None:
+            self.setpdir(path)
+
+    #
+    # Functions to scan into the project's own inventory
+    #
+    def scanMaps(self,mappath,graph=None,index=None):
+        self.GetMapInventory(self.mapfiles,self.idlist,mappath,graph,index)
+        return self
+
+    def scanFiles(self,dir,graph=None,index=None):
+        self.GetFileInventory(self.mapfiles,dir,self.idlist,graph,index)
+        return self
+
+    #
+    # Function to return the map files to start from
+    # for a map path (a .ditamap file or a directory
+    # of .ditamap files).
+    #
+    def getRootMaps(self,mappath):
+        import glob
+
+        maps=[]
+        if os.path.exists(mappath):
+            if os.path.isdir(mappath):
+                # get a list of the ditamaps in the directory
+                maps = glob.glob(mappath+"/*.ditamap")
+            else:
+                # input was not a directory
+                maps=[mappath]
+            if self.dbgflag:
+                # display the maps to be used
+                for m in maps:
+                    print("map file:",m)
+                print(" ")
+
+        else:
+            print("GetMapInventory error",mappath,"does not exist")
+
+        return maps
+
+    #
+    # Function to return a list of all files
+    # used by a DITA map. We return:
+    #
+    #   mapfiles - file path
+    #   idlist - dictionary list of file information
+    #
+    def GetMapInventory(self,mapfiles,idlist,mappath,graph=None,index=None):
+
+        if self.dbgflag:
+            print("EnterGetMapInventory",mappath)
+
+        # save project directory
+        self.setpdir(mappath)
+
+        # intialize list of map filepaths
+        maps=self.getRootMaps(mappath)
+
+        if self.dbgflag:
+            print("map count =",len(maps))
+
+        self.ScanMapClosure(maps,mapfiles,idlist,graph,index)
+
+        return
+
+    #
+    # Function to scan every file reachable from a set of
+    # map files through href/conref/data references.
+    #
+    #   maps - map files to start from
+    #   mapfiles - reachable file paths (output)
+    #   idlist - dictionary list of file information (output)
+    #   graph - optional RefGraph, filled as files are scanned
+    #   index - optional TermIndex, filled as files are scanned
+    #
+    # Each file is scanned once; the files already seen
+    # are kept in a set so the walk is linear in the
+    # number of references. With setpipeline the files are
+    # read and parsed ahead of the walk (see PipeScan).
+    #
+    # The walk follows the hrefs, so they are extracted
+    # whatever the extraction profile (see setfields).
+    #
+    def ScanMapClosure(self,maps,mapfiles,idlist,graph=None,index=None):
+
+        profile=self.fields
+        if profile!=None:
+            self.fields=profile|{'hrefs'}
+
+        # put the profile back however the walk ends
+        try:
+            # remember files we have seen, and the files to be scanned
+            # in order (pending[done:] are still to be scanned)
+            seen=set()
+            pending=[]
+            for map in maps:
+                absmap=canonPath(map)
+                if not absmap in seen:
+                    seen.add(absmap)
+                    pending.append(absmap)
+
+            if self.progress!=None:
+                self.progress.discover(len(pending))
+
+            # add a scanned file's records to the graph and index
+            # and queue the files it refers to
+            def merge(ff,loclist):
+                mapfiles.append(ff)
+                if graph!=None:
+                    for lcl in loclist:
+                        graph.addRecord(lcl)
+                if index!=None:
+                    for lcl in loclist:
+                        index.addRecord(lcl)
+                # look for hrefs to add to the scan list
+                for lcl in loclist:
+                    if 'hrefs' in lcl:
+                       # there is an href
+                       for href in lcl['hrefs']:
+                           if isURL(href):
+                               # URL href
+                               xfpath=href
+                           else:
+                               # file href (already normalized by ScanTopic)
+                               xfpath=hrefFile(href)
+                           if not xfpath in seen:
+                               # href file not already scanned
+                               seen.add(xfpath)
+                               pending.append(xfpath)
+                               if self.progress!=None:
+                                   self.progress.discover()
+                               if self.dbgflag:
+                                   print(href,"not yet scanned")
+
+            if self.readers>0:
+                # read, parse and merge in overlapping stages
+                self.PipeScan(pending,idlist,merge)
+            else:
+                # keep scanning until we don't find any new references to unscanned files
+                done=0
+                try:
+                    while done<len(pending):
+                        if self.progress!=None and self.progress.over():
+                            break
+                        if self.dbgflag:
+                            print(len(pending)-done,"files to be scanned")
+                        ff = pending[done]
+                        done=done+1
+                        # scan this file
+                        loclist=self.ScanSourceFile(ff,idlist)
+                        if self.progress!=None:
+                            self.progress.parse()
+                        merge(ff,loclist)
+                except KeyboardInterrupt:
+                    # Ctrl-C: keep what has been scanned so far
+                    self.interrupt()
+        finally:
+            self.fields=profile
+
+        if self.progress!=None and self.progress.stopped==None:
+            self.progress.report()
+        if graph!=None:
+            graph.resolveKeys()
+
+        return
+
+    #
+    #
+    # Function to return a list of all source files
+    # in a directory (dir).
+    #
+    # In each list output entry we have:
+    #    file-path file-doctype (or None)
+    #
+    # If a RefGraph is supplied, the references found
+    # are added to it as the files are scanned; the same
+    # goes for the terms found and a TermIndex.
+    #
+    def GetFileInventory(self,filelist,dir,idlist,graph=None,index=None):
+
+        self.keyvalues=self.newKeys()
+
+        if self.dbgflag:
+            print ("Enter GetFileInventory",dir)
+        rc = True
+
+        # save project directory
+        self.setpdir(dir)
+
+        # validate we have a directory
+        if os.path.isdir(dir) != True:
+            print ("Error",dir,"is not a directory") 
+            return False
+
+        # temporary list of all files in the directory
+        allfiles = os.walk(dir)
+        root = canonPath(dir)
+
+        # build up the filelist
+        for f in allfiles:
+            # get current directory
+            fdir = f[0]
+            # get list of files in this directory
+            flist = f[2]
+            # leave out the backups of a repair
+            if REPAIR_DIR in f[1]:
+                f[1].remove(REPAIR_DIR)
+            if self.shard!=None:
+                # only the files in our shard
+                flist = [ff for ff in flist
+                         if shardOf(relPath(os.path.join(fdir,ff),root),self.shard[1],self.shard[2])==self.shard[0]]
+            for ff in flist:
+                fpath = os.path.join(fdir,ff)
+                # remember file path
+                filelist.append(fpath)
+            if self.progress!=None:
+                self.progress.discover(len(flist))
+
+        if self.dbgflag:
+            print(len(filelist),"files found")
+
+        # add a scanned file's records to the graph and index
+        def merge(fle,loclist):
+            if graph!=None:
+                for lcl in loclist:
+                    graph.addRecord(lcl)
+            if index!=None:
+                for lcl in loclist:
+                    index.addRecord(lcl)
+
+        # scan the files (if required)
+        if idlist!=None:
+            if self.readers>0:
+                # read, parse and merge in overlapping stages
+                self.PipeScan(list(filelist),idlist,merge)
+            else:
+                # scan the files in the list
+                try:
+                    for fle in filelist:
+                        if self.progress!=None and self.progress.over():
+                            break
+                        loclist=self.ScanSourceFile(fle,idlist)
+                        if self.progress!=None:
+                            self.progress.parse()
+                        merge(fle,loclist)
+                except KeyboardInterrupt:
+                    # Ctrl-C: keep what has been scanned so far
+                    self.interrupt()
+            if self.progress!=None and self.progress.stopped==None:
+                self.progress.report()
+            if graph!=None:
+                graph.resolveKeys()
+
+        return rc
+
+    #
+    # Functions to set/return project directory
+    #
+    def getpdir(self):
+        return self.project_dir
+
+    def setpdir(self,p):
+
+        if self.dbgflag:
+            print("setpdir",p)
+
+        if os.path.isdir(p):
+            self.project_dir=p
+        else:
+            ps=os.path.split(p)
+            self.project_dir=ps[0]
+
+        if self.dbgflag:
+            print("setpdir to",self.project_dir)
+
+    #
+    # Function to display a file path relative to
+    # the project directory.
+    #
+    def ppath(self,f):
+        pd=self.getpdir()
+        if isURL(f):
+            return f
+        else:
+            if len(f)>0:
+            	return relPath(f,pd)
+            else:
+            	return f
+
+    #
+    # Function to get keys defined
+    def getKeys(self):
+        return self.keyvalues
+
+    def setdebug(self,flag):
+        """
+        Set the debug flag:
+
+        True = print details of execution
+        False = print minimal progress messages
+
+        """
+        self.dbgflag = flag
+        if self.dbgflag:
+            print ("**setdebug - debug flag set to",self.dbgflag) 
+        return
+
+    def setsignatures(self,flag):
+        """
+        Set the signature flag:
+
+        True = compute a MinHash signature for every topic scanned
+        False = do not compute signatures
+
+        """
+        self.sigflag = flag
+        if self.dbgflag:
+            print ("**setsignatures - signature flag set to",self.sigflag)
+        return
+
+    def setfields(self,fields):
+        """
+        Set the extraction profile, the fields the scans put in
+        the records they make:
+
+        None = all fields
+        list = the fields named (see SCAN_FIELDS), with the
+               fields that come with them; naming one of those
+               (hreflines, say) asks for its group
+
+        The scans skip the work for the other fields, so a tool
+        that needs only a few pays only for those. Key values
+        are only collected with the 'keys' field. Records read
+        from a snapshot are used only when they hold every
+        field asked for.
+
+        """
+        if fields==None:
+            self.fields=None
+        else:
+            self.fields=set()
+            for name in fields:
+                if name in SCAN_FIELDS:
+                    self.fields.add(name)
+                elif name in ('directory','basename','topicid','doctype'):
+                    # always there
+                    pass
+                else:
+                    group=[k for k in SCAN_FIELDS if name in SCAN_FIELDS[k]]
+                    if len(group)>0:
+                        self.fields.add(group[0])
+                    else:
+                        print("setfields error: unknown field",name)
+        if self.dbgflag:
+            print ("**setfields - extraction profile set to",self.fields)
+        return
+
+    def getfields(self):
+        return self.fields
+
+    #
+    # Function to test if the extraction profile asks for
+    # a field (see setfields)
+    #
+    def wants(self,name):
+        return self.fields==None or name in self.fields
+
+    #
+    # Function to remove the fields the extraction profile
+    # did not ask for from a record
+    #
+    def dropFields(self,item):
+        for k in SCAN_FIELDS:
+            if not self.wants(k):
+                item.pop(k,None)
+                for c in SCAN_FIELDS[k]:
+                    item.pop(c,None)
+
+    #
+    # Function to return the names of the fields a topic record
+    # made with the extraction profile holds
+    #
+    def recordFields(self):
+        names=['directory','basename','topicid','doctype']
+        for k in SCAN_FIELDS:
+            if self.wants(k):
+                names.append(k)
+                names.extend(SCAN_FIELDS[k])
+        if self.sigflag:
+            names.append('minhash')
+        return names
+
+    def setstreamsize(self,n):
+        """
+        Set the size (in bytes) above which files are scanned
+        with the streaming parser. 0 = never stream.
+
+        """
+        self.streamsize = n
+        if self.dbgflag:
+            print ("**setstreamsize - streaming files over",self.streamsize,"bytes")
+        return
+
+    def setpipeline(self,readers,parsers=0,depth=PIPE_DEPTH):
+        """
+        Scan with readers I/O threads prefetching file bytes,
+        parsers threads parsing them (0 = one per CPU) and at
+        most depth files waiting between stages (see PipeScan).
+
+        0 readers = scan the files one at a time
+
+        """
+        self.readers = readers
+        self.parsers = parsers
+        if self.parsers<=0:
+            self.parsers = os.cpu_count() or 1
+        self.depth = max(1,depth)
+        if self.dbgflag:
+            print ("**setpipeline -",self.readers,"readers,",self.parsers,"parsers")
+        return
+
+    def setsnapshot(self,snap):
+        """
+        Read the records of the files a Snapshot holds from it
+        instead of scanning them; files it does not hold are
+        scanned as usual.
+
+        None = scan every file
+
+        """
+        self.snapshot = snap
+        return
+
+    #
+    # Function to return the snapshot (or None)
+    #
+    def getsnapshot(self):
+        return self.snapshot
+
+    def setstore(self,store):
+        """
+        Keep the project's records and keys in a RecordStore
+        instead of memory. The store is the project's idlist
+        and the scans write the keys they find into it; tools
+        pass it as their idlist.
+
+        None = keep them in memory
+
+        """
+        self.store = store
+        if store!=None:
+            self.idlist = store
+        self.keyvalues = self.newKeys()
+        return
+
+    #
+    # Function to return the store (or None)
+    #
+    def getstore(self):
+        return self.store
+
+    #
+    # Function to return an empty key/value table for a scan:
+    # a dictionary, or the store's emptied key table
+    #
+    def newKeys(self):
+        if self.store==None:
+            return {}
+        self.store.keyvalues.clear()
+        return self.store.keyvalues
+
+    def setshard(self,shard,nshards=1,bydir=False):
+        """
+        Make GetFileInventory keep only the files in shard
+        (0 to nshards-1), split by hashed path or, with bydir,
+        by hashed directory (see shardOf).
+
+        None = all files
+
+        """
+        if shard==None:
+            self.shard = None
+        else:
+            self.shard = (shard,nshards,bydir)
+        if self.dbgflag:
+            print ("**setshard -",self.shard)
+        return
+
+    def setprogress(self,p):
+        """
+        Set the Progress object the scans report to and
+        check their time and memory budgets with.
+
+        None = no progress reporting and no budgets
+
+        """
+        self.progress = p
+        return
+
+    #
+    # Function to return the progress object (or None)
+    #
+    #
+    # Function to stop the scans after Ctrl-C, keeping what
+    # has been scanned so far. Without a progress reporter a
+    # quiet one is set, to record that the results are partial.
+    #
+    def interrupt(self):
+        if self.progress==None:
+            self.progress=Progress(show=False)
+        self.progress.cancel("interrupted")
+
+    def getprogress(self):
+        return self.progress
+
+    #
+    # Function to return the dbgflag value
+    #
+    def debugMode(self):
+        return self.dbgflag
+
+    #
+    # Function to return a copy of the project's scan settings
+    # for a parser thread to scan with, so files can be parsed
+    # at the same time without sharing keyvalues
+    #
+    def worker(self):
+        w=Project()
+        w.dbgflag=self.dbgflag
+        w.project_dir=self.project_dir
+        w.sigflag=self.sigflag
+        w.fields=self.fields
+        w.streamsize=self.streamsize
+        w.snapshot=self.snapshot
+        return w
+
+    #
+    # Function to scan a list of files in three overlapping
+    # stages:
+    #
+    #   readers - threads that read the bytes of the files in
+    #             list order, hinting the next READ_AHEAD files
+    #             to the OS so network and disk reads overlap
+    #   parsers - threads that parse the bytes into records
+    #             (lxml parses in memory with the GIL released)
+    #   merge   - this thread, which adds the records to idlist
+    #             in list order and calls merge(f,loclist)
+    #
+    # The stages are joined by queues holding at most depth
+    # files, and the readers wait while they are depth files
+    # ahead of the merge, so at most depth files are in flight
+    # (read, parsed or waiting for an earlier file to be
+    # merged) however fast the reads are, or however slow one
+    # file is to parse. Since records are merged in list order, idlist
+    # and the keys end up the same as in a serial scan.
+    #
+    # merge may append files to the list (ScanMapClosure
+    # queues the files a map refers to); the scan ends when
+    # every file in the list has been merged.
+    #
+    def PipeScan(self,files,idlist,merge):
+        import threading
+        import queue
+
+        if self.dbgflag:
+            print("Enter PipeScan",len(files),"files",self.readers,"readers",self.parsers,"parsers")
+
+        if len(files)==0:
+            return
+
+        readq=queue.Queue(self.depth)
+        parsedq=queue.Queue(self.depth)
+        # next file to read, files hinted, files merged, readers
+        # still running, and whether the list is complete (all
+        # merged)
+        lock=threading.Condition()
+        state={'next':0,'hinted':0,'merged':0,'readers':self.readers,'finished':False}
+        stop=threading.Event()
+
+        def reader():
+            while True:
+                with lock:
+                    # wait for more files, or for the merge to catch up
+                    while (state['next']>=len(files) and not state['finished'] or
+                           state['next']>=state['merged']+self.depth) and not stop.is_set():
+                        lock.wait()
+                    if state['next']>=len(files) or stop.is_set():
+                        break
+                    i=state['next']
+                    state['next']=i+1
+                    ahead=files[state['hinted']:i+1+READ_AHEAD]
+                    state['hinted']=state['hinted']+len(ahead)
+                adviseFiles(ahead)
+                readq.put((i,files[i],self.readSource(files[i])))
+            with lock:
+                state['readers']=state['readers']-1
+                last=state['readers']==0
+            if last:
+                # tell the parsers there is nothing more
+                for p in range(self.parsers):
+                    readq.put(None)
+
+        def parser():
+            w=self.worker()
+            while True:
+                job=readq.get()
+                if job==None:
+                    parsedq.put(None)
+                    return
+                i, f, data = job
+                recs=[]
+                loclist=[]
+                w.keyvalues={}
+                try:
+                    if not stop.is_set():
+                        loclist=w.ScanSourceFile(f,recs,data)
+                except Exception as e:
+                    # hand the error to the merge stage
+                    recs=e
+                parsedq.put((i,f,recs,loclist,w.keyvalues))
+
+        threads=[threading.Thread(target=reader,daemon=True) for r in range(self.readers)]
+        threads=threads+[threading.Thread(target=parser,daemon=True) for p in range(self.parsers)]
+        for t in threads:
+            t.start()
+
+        # merge the parsed files in list order
+        waiting={}
+        merged=0
+        ended=0
+        try:
+            while ended<self.parsers:
+                r=parsedq.get()
+                if r==None:
+                    ended=ended+1
+                    continue
+                waiting[r[0]]=r
+                while merged in waiting and not stop.is_set():
+                    i, f, recs, loclist, kv = waiting.pop(merged)
+                    if isinstance(recs,Exception):
+                        raise recs
+                    merged=merged+1
+                    idlist.extend(recs)
+                    self.keyvalues.update(kv)
+                    merge(f,loclist)
+                    if self.progress!=None:
+                        self.progress.parse()
+                        if self.progress.over():
+                            stop.set()
+                    with lock:
+                        state['merged']=merged
+                        if merged==len(files):
+                            state['finished']=True
+                        lock.notify_all()
+                if stop.is_set():
+                    with lock:
+                        lock.notify_all()
+        except BaseException as e:
+            # stop the other stages and wait for them to finish,
+            # then keep what has been merged so far (Ctrl-C) or
+            # pass the error on
+            stop.set()
+            with lock:
+                lock.notify_all()
+            while ended<self.parsers:
+                if parsedq.get()==None:
+                    ended=ended+1
+            if not isinstance(e,KeyboardInterrupt):
+                raise
+            self.interrupt()
+
+        for t in threads:
+            t.join()
+        return
+
+    #
+    # Function to return the bytes of a file for PipeScan to
+    # parse, or None for files ScanSourceFile should open
+    # itself (URLs, non-DITA and missing files, and files big
+    # enough to be streamed)
+    #
+    def readSource(self,f):
+        if isURL(f) or not isDITAext(f):
+            return None
+        if self.snapshot!=None and self.snapshot.hasFile(canonPath(f)):
+            return None
+        try:
+            fin=open(f,"rb")
+        except OSError:
+            return None
+        try:
+            size=os.fstat(fin.fileno()).st_size
+            if self.streamsize>0 and size>self.streamsize:
+                return None
+            if hasattr(os,"posix_fadvise"):
+                os.posix_fadvise(fin.fileno(),0,0,os.POSIX_FADV_SEQUENTIAL)
+            return fin.read()
+        except OSError:
+            return None
+        finally:
+            fin.close()
+
+    #
+    # Function to collect information from a DITA source file
+    #
+    # Each entry in the output list is a dictionary containing
+    # these keys:
+    #
+    # directory
+    # basename
+    # topicid
+    # elementids
+    # idlines (source line of each of the elementids)
+    # hrefs
+    # reftypes (href, conref or data for each of the hrefs)
+    # hreflines (source line of each of the hrefs)
+    # keyrefs
+    # keyreftypes (keyref or conkeyref for each of the keyrefs)
+    # keyreflines (source line of each of the keyrefs)
+    # keys
+    # keyhrefs (normalized href for each of the keys, or "")
+    # keywords
+    # keywordlines (source line of each of the keywords)
+    # indexterms
+    # title
+    # doctype
+    # minhash (only when signatures are turned on)
+    #
+    # With an extraction profile (see setfields) the records
+    # hold only directory, basename, topicid, doctype and the
+    # fields it asks for.
+    #
+    # data is the file's bytes when they have already been
+    # read (see PipeScan), None to read the file here.
+    #
+    def ScanSourceFile(self,fl,ilist,data=None):
+        if self.dbgflag:
+            print("Enter ScanSourceFile",fl)
+
+        # file path
+        f = fl
+        absf=canonPath(fl)
+        # initialize the dictionary
+        dict={}
+        locallist=[]
+
+        # bail if a URL
+        if isURL(fl):
+            dict['directory']=""
+            dict["basename"]=fl
+            ilist.append(dict)
+            return locallist
+
+        # take the records from the snapshot if it has the file
+        # (and the fields the profile asks for, signatures
+        # included when they are wanted)
+        if self.snapshot!=None:
+            recs=self.snapshot.fileRecords(absf)
+            names=self.recordFields()
+            for r in recs:
+                if 'topicid' in r and not all([n in r for n in names]):
+                    recs=[]
+                    break
+            if len(recs)>0:
+                for r in recs:
+                    ilist.append(r)
+                    if 'topicid' in r:
+                        locallist.append(r)
+                    for k in r.get('keys',[]):
+                        v=self.snapshot.keyValue(k)
+                        if v!=None:
+                            self.keyvalues[k]=v
+                return locallist
+
+        from lxml import etree
+
+        # bail if it is not the right filetype
+        if not isDITAext(absf):
+            dict['directory']=os.path.dirname(absf)
+            dict['basename']=os.path.basename(absf)
+            dict['doctype']=None
+            ilist.append(dict)
+            return locallist
+
+        # very large files are scanned without building a tree
+        if self.streamsize>0 and os.path.isfile(absf) and os.path.getsize(absf)>self.streamsize:
+            return self.ScanSourceStream(f,ilist)
+
+        # try to parse the file as XML
+        try:
+            # create a tree for the source file
+            if data!=None:
+                # bytes already read by PipeScan
+                tree = etree.fromstring(data,base_url=f).getroottree()
+            else:
+                tree = etree.parse(f)
+
+            # quick exit on error
+            if not tree:
+                print("ScanSourceFile error",f,"not parsed")
+                dict['directory']=os.path.dirname(absf)
+                dict['basename']=os.path.basename(absf)
+                dict['doctype']=None
+                ilist.append(dict)
+                return locallist
+
+            # get the root element for file
+            root = tree.getroot()
+            roottag = root.tag
+
+            # set the doctype
+            docinfo = tree.docinfo
+            tdoctype = docinfo.doctype
+            # make sure it is really DOCTYPE (other things can occur)
+            if len(tdoctype)>9 and tdoctype.find('<!DOCTYPE')>-1:
+                doctype=tdoctype
+            else:
+                doctype=None
+            dt=doctype
+
+            if self.dbgflag:
+                print(" root tag is", roottag)
+
+            if roottag == 'dita':
+                # there may be other topics inside this topic
+                topics = root.getchildren()
+                if self.dbgflag:
+                    for t in topics:
+                        print("topic: ",t.tag,t.get('id'))
+            else:
+                # there is only a single topic in the file
+                topics = [root]
+
+            # get ID info for this topic(s)
+            for t in topics:
+                self.ScanTopic(t,f,dt,locallist)
+
+            # add to big list
+            for ll in locallist:
+                ilist.append(ll)
+
+        except Exception:
+            if self.dbgflag:
+                print("ScanSourceFile EXCEPTION!",f)
+            # file cannot be parsed
+            # or also file may not exist.
+            if isURL(f):
+                # record data for a URL
+                dict['directory']=""
+                dict['basename']=f
+                dict['doctype']=None
+                ilist.append(dict)
+            else:
+                if os.path.exists(f):
+                    if self.dbgflag:
+                        print("  file could not be parsed")
+                    # record data for non-parseable file
+                    dict['directory']=os.path.dirname(absf)
+                    dict['basename']=os.path.basename(absf)
+                    dict['doctype']=None
+                    ilist.append(dict)
+                else:
+                    # do nothing if file does not exist
+                    if self.dbgflag:
+                        print("  file does not exist")
+
+
+        # free up resources
+        tree=None
+
+        return locallist
+
+    #
+    # Function to scan a file topic for information
+    #
+    # where: t = starting element
+    #        f = file path
+    #        doctype = DOCTYPE string
+    #        ilist = id list
+    #
+    def ScanTopic(self,t,f,doctype,ilist):
+        from lxml import etree
+
+        if self.dbgflag:
+            print("Enter ScanTopic",f,doctype,t.tag)
+
+        # initialize what we return
+        dict={}
+
+        # try to fetch the topic ID attribute
+        topicid = t.get("id", default="")
+        # file path split
+        topicdir=os.path.dirname(f)
+        topicdir=canonPath(topicdir)
+        topicfile=os.path.basename(f)
+
+        elementids=[]
+        idlines=[]
+
+        kids = t.getchildren()
+        # loop through all the child elements of the starting element
+        for kid in kids:
+            if self.dbgflag:
+                print("child element",kid.tag,kid.get('id'))
+            if kid.tag == 'topic':
+                if self.dbgflag:
+                    print("Recursive ScanTopic in",f)
+                # scan the sub-topics of this topic
+                self.ScanTopic(kid,f,doctype,ilist)
+            elif not self.wants('elementids'):
+                pass
+            elif "<!-- " in str(etree.tostring(kid)):
+                # ignore comments
+                pass
+            else:
+                # collect all the content IDs in this topic
+                ScanContentIDs(kid,elementids,idlines)
+            if not self.wants('keys'):
+                continue
+            # fill in key/value pairs
+            xpstr="@keys"
+            keysa = kid.xpath(xpstr)
+            if keysa!=[]:
+                hrefa = kid.get("href")
+                if self.debugMode():
+                    print("key/value",keysa,hrefa)
+                if hrefa!=None:
+                    ksplit = keysa[0].split(" ")
+                    for kkk in ksplit:
+                        self.keyvalues[kkk]=hrefa
+
+
+        # find all the external and internal references in the file
+        eref=[]
+        etypes=[]
+        elines=[]
+        for r in (refs if self.wants('hrefs') else []):
+            xpstr=".//@"+r
+            xrefs = t.xpath(xpstr)
+            if self.dbgflag and len(xrefs)>0:
+                print("  found",r,len(xrefs),"times")
+            for xx in xrefs:
+                if self.dbgflag:
+                    print("   href is",xx)
+                etypes.append(r)
+                elines.append(xx.getparent().sourceline)
+                if isURL(xx):
+                    eref.append(xx)
+                else:
+                    if xx[0]=="#":
+                        # internal reference
+                        if self.dbgflag:
+                            print("    internal reference",xx)
+                        ipath=f+xx
+                        eref.append(normHref(ipath))
+                    else:
+                        # external reference
+                        relpat=topicdir+os.sep+xx
+                        relpat=normHref(relpat)
+                        if self.dbgflag:
+                            print("    external reference",relpat)
+                        eref.append(relpat)
+
+        # find all the key references in the file
+        kref=[]
+        ktypes=[]
+        klines=[]
+        for kr in (keytypes if self.wants('keyrefs') else []):
+            xpstr=".//@"+kr
+            xrefs = t.xpath(xpstr)
+            if self.dbgflag and len(xrefs)>0:
+                print("  found",kr,len(xrefs),"times")
+            for xx in xrefs:
+                kref.append(xx)
+                ktypes.append(kr)
+                klines.append(xx.getparent().sourceline)
+
+        # find all the key definitions in the file, and
+        # the normalized href each key points to (if any)
+        keylist=[]
+        keyhrefs=[]
+        if self.wants('keys'):
+            xpstr=".//*[@keys]"
+            xrefs = t.xpath(xpstr)
+            if self.dbgflag and len(xrefs)>0:
+                print("  found",len(xrefs),"keys")
+            for xx in xrefs:
+                khref=refTarget(xx.get("href"),f,topicdir)
+                for kxx in xx.get("keys").split():
+                    keylist.append(kxx)
+                    keyhrefs.append(khref)
+
+        # find all keywords defined in the file
+        keywords=[]
+        keywordlines=[]
+        keys=[]
+        if self.wants('keywords'):
+            xpstr=".//*/keyword"
+            keys=t.xpath(xpstr)
+        if len(keys)>0:
+            if self.dbgflag:
+                print("  found",len(keys),"keywords")
+            for xx in keys:
+                if xx.text==None:
+                    keywords.append("")
+                else:
+                    keywords.append(xx.text)
+                keywordlines.append(xx.sourceline)
+
+        # find all index terms defined in the file (each level
+        # of a nested index term is recorded on its own)
+        indexterms=[]
+        if self.wants('indexterms'):
+            for xx in t.iter("indexterm"):
+                if xx.text!=None and len(xx.text.strip())>0:
+                    indexterms.append(xx.text.strip())
+
+        # get the topic title
+        tt=None
+        if self.wants('title'):
+            tt=t.find("title")
+        if tt!=None:
+            title=" ".join(tt.xpath("string()").split())
+        else:
+            title=""
+
+        # store information to return
+        xdir, xfile, xtopic, xcont = parseHref(f)
+        dict['directory']=topicdir
+        dict['basename']=xfile
+        dict['topicid']=topicid
+        dict['elementids']=elementids
+        dict['idlines']=idlines
+        dict['hrefs']=eref
+        dict['reftypes']=etypes
+        dict['hreflines']=elines
+        dict['keyrefs']=kref
+        dict['keyreftypes']=ktypes
+        dict['keyreflines']=klines
+        dict['keys']=keylist
+        dict['keyhrefs']=keyhrefs
+        dict['doctype']=doctype
+        dict['keywords']=keywords
+        dict['keywordlines']=keywordlines
+        dict['indexterms']=indexterms
+        dict['title']=title
+        if self.fields!=None:
+            # leave out what the profile did not ask for, so the
+            # record shows which fields it holds
+            self.dropFields(dict)
+        if self.sigflag:
+            dict['minhash']=MinHash(t.xpath("string()"))
+
+        # add the information collected to the big list
+        ilist.append(dict)
+
+        return [f]
+
+    #
+    # Function to collect information from a DITA source file
+    # without building a tree for it, for files too large to
+    # hold in memory. The records hold the same information
+    # as the ones ScanSourceFile/ScanTopic return (references
+    # are listed in document order rather than grouped by
+    # attribute), except that MinHash signatures are not
+    # computed.
+    #
+    # The file is read with iterparse and each element is
+    # cleared once it has been handled, so memory use depends
+    # on the nesting depth, not on the size of the file. Text
+    # is kept only inside title, keyword and indexterm elements
+    # until they end.
+    #
+    def ScanSourceStream(self,f,ilist):
+        from lxml import etree
+
+        if self.dbgflag:
+            print("Enter ScanSourceStream",f)
+
+        absf=canonPath(f)
+        topicdir=os.path.dirname(absf)
+        xdir, xfile, xtopic, xcont = parseHref(f)
+        locallist=[]
+        # all the ids in the file (ScanContentIDs also returns
+        # the ids of the whole document for every topic)
+        docids=[]
+        docidlines=[]
+        idseen=set()
+        # open topics: [depth, record, has content]
+        open_topics=[]
+        doctype=None
+        roottag=None
+        depth=0
+        # elements whose text is still needed
+        keep=0
+        # what the extraction profile asks for (see setfields)
+        wantids=self.wants('elementids')
+        wantkeys=self.wants('keys')
+        scanrefs=refs if self.wants('hrefs') else []
+        scankeyrefs=keytypes if self.wants('keyrefs') else []
+        texttags=[]
+        for field, tag in (('title','title'),('keywords','keyword'),('indexterms','indexterm')):
+            if self.wants(field):
+                texttags.append(tag)
+
+        try:
+            for event, e in etree.iterparse(f,events=("start","end")):
+                if event=="start":
+                    depth=depth+1
+                    tag=e.tag
+                    if depth==1:
+                        roottag=tag
+                        tdoctype=e.getroottree().docinfo.doctype
+                        if len(tdoctype)>9 and tdoctype.find('<!DOCTYPE')>-1:
+                            doctype=tdoctype
+                    # is this the start of a topic?
+                    istopic=False
+                    if depth==1 and tag!='dita':
+                        istopic=True
+                    elif depth==2 and roottag=='dita':
+                        istopic=True
+                    elif tag=='topic' and len(open_topics)>0 and open_topics[-1][0]==depth-1:
+                        istopic=True
+                    if len(open_topics)>0 and open_topics[-1][0]==depth-1:
+                        top=open_topics[-1]
+                        if not istopic and isinstance(tag,str):
+                            top[2]=True
+                        # key/value pairs on children of the topic
+                        keysa=e.get("keys")
+                        hrefa=e.get("href")
+                        if wantkeys and keysa!=None and hrefa!=None:
+                            for kkk in keysa.split(" "):
+                                self.keyvalues[kkk]=hrefa
+                    if istopic:
+                        item={}
+                        item['directory']=topicdir
+                        item['basename']=xfile
+                        item['topicid']=e.get("id", default="")
+                        item['elementids']=[]
+                        item['idlines']=[]
+                        item['hrefs']=[]
+                        item['reftypes']=[]
+                        item['hreflines']=[]
+                        item['keyrefs']=[]
+                        item['keyreftypes']=[]
+                        item['keyreflines']=[]
+                        item['keys']=[]
+                        item['keyhrefs']=[]
+                        item['doctype']=doctype
+                        item['keywords']=[]
+                        item['keywordlines']=[]
+                        item['indexterms']=[]
+                        item['title']=""
+                        open_topics.append([depth,item,False])
+                    # element ids
+                    eid=e.get("id")
+                    if wantids and eid!=None and not eid in idseen:
+                        idseen.add(eid)
+                        docids.append(eid)
+                        docidlines.append(e.sourceline)
+                    # references, key references and key definitions
+                    # belong to every open topic (as in ScanTopic)
+                    for r in scanrefs:
+                        xx=e.get(r)
+                        if xx!=None and len(xx)>0:
+                            target=refTarget(xx,f,topicdir)
+                            for ot in open_topics:
+                                if ot[0]<depth:
+                                    ot[1]['hrefs'].append(target)
+                                    ot[1]['reftypes'].append(r)
+                                    ot[1]['hreflines'].append(e.sourceline)
+                    for kr in scankeyrefs:
+                        xx=e.get(kr)
+                        if xx!=None:
+                            for ot in open_topics:
+                                if ot[0]<depth:
+                                    ot[1]['keyrefs'].append(xx)
+                                    ot[1]['keyreftypes'].append(kr)
+                                    ot[1]['keyreflines'].append(e.sourceline)
+                    xx=e.get("keys")
+                    if wantkeys and xx!=None:
+                        khref=refTarget(e.get("href"),f,topicdir)
+                        for ot in open_topics:
+                            if ot[0]<depth:
+                                for kxx in xx.split():
+                                    ot[1]['keys'].append(kxx)
+                                    ot[1]['keyhrefs'].append(khref)
+                    if tag in texttags:
+                        keep=keep+1
+                else:
+                    tag=e.tag
+                    if not tag in texttags:
+                        pass
+                    elif tag=='keyword':
+                        for ot in open_topics:
+                            if ot[0]<depth-1:
+                                ot[1]['keywords'].append(e.text if e.text!=None else "")
+                                ot[1]['keywordlines'].append(e.sourceline)
+                    elif tag=='indexterm':
+                        if e.text!=None and len(e.text.strip())>0:
+                            for ot in open_topics:
+                                if ot[0]<depth:
+                                    ot[1]['indexterms'].append(e.text.strip())
+                    elif tag=='title':
+                        if len(open_topics)>0 and open_topics[-1][0]==depth-1 and open_topics[-1][1]['title']=="":
+                            open_topics[-1][1]['title']=" ".join(e.xpath("string()").split())
+                    if tag in texttags:
+                        keep=keep-1
+                    # is this the end of a topic?
+                    if len(open_topics)>0 and open_topics[-1][0]==depth:
+                        ot=open_topics.pop()
+                        if ot[2]:
+                            ot[1]['elementids']=docids
+                            ot[1]['idlines']=docidlines
+                        if self.fields!=None:
+                            self.dropFields(ot[1])
+                        locallist.append(ot[1])
+                    depth=depth-1
+                    # free what has been handled
+                    if keep==0:
+                        e.clear(keep_tail=True)
+                        while e.getprevious() is not None:
+                            del e.getparent()[0]
+
+        except (OSError,etree.XMLSyntaxError) as ex:
+            if self.dbgflag:
+                print("ScanSourceStream EXCEPTION!",f,ex)
+            locallist=[]
+            if os.path.exists(f):
+                # record data for non-parseable file
+                dict={}
+                dict['directory']=topicdir
+                dict['basename']=os.path.basename(absf)
+                dict['doctype']=None
+                ilist.append(dict)
+            return locallist
+
+        # add to big list
+        for ll in locallist:
+            ilist.append(ll)
+
+        return locallist
+
+    #
+    # Function to try to repair all hrefs in a file.
+    #  Input must be an XML file with a DOCTYPE.
+    #
+    # line is the source line of the reference (from the
+    # record's hreflines), so that only the elements on that
+    # line are looked at; 0 looks through the whole file.
+    #
+    def FixHrefs(self,tree,item,href,idlist,line=0):
+        filepath=fpath(item)
+        topicdir=os.path.dirname(filepath)
+        topicdir=canonPath(topicdir)
+        if self.dbgflag:
+            print("Enter FixHrefs",filepath)
+            print("   ==>",href)
+
+
+        # count of references fixed
+        fixed = 0
+        oldref=None
+
+        # set the file and doctype
+        f = filepath
+
+        # skip files that are not DITA source files (i.e. no DOCTYPE)
+        if isSource(item)==False:
+            print("FixHrefs error",f,"is not XML source")
+            return
+
+        # get the root element in the file
+        root = tree.getroot()
+        # prepare to iterate over elements in the file
+        iter = root.getiterator()
+
+        # loop on all elements to find the reference to be fixed
+
+        for e in iter:
+            # stop if we have made a fix already
+            if fixed>0:
+                break
+            # skip to the reference's line (elements come in
+            # document order, so stop once past it)
+            if line>0 and e.sourceline!=line:
+                if e.sourceline!=None and e.sourceline>line:
+                    break
+                continue
+            # inner loop on type of reference
+            for r in refs:
+                # get the reference string
+                hr = e.get(r)
+                # put href in normalized form
+                if hr==None:
+                    relpat=""
+                elif hr[0]=="#":
+                        # internal reference
+                        relpat=filepath+hr
+                        if self.dbgflag:
+                            print("    internal reference",relpat)
+
+                else:
+                        # external reference
+                        relpat=topicdir+os.sep+hr
+                        relpat=normHref(relpat)
+                        if self.dbgflag:
+                            print("    external reference",relpat)
+
+                if relpat==href:
+                    # save the reference value
+                    oldref = hr
+                    newref=""
+                    # parse the reference
+                    hdir, hfile, htopic, hcontent = parseHref(relpat)
+
+                    # Fix #1: try using another file extension
+                    fdata = os.path.splitext(hfile)
+                    ext = fdata[1]
+                    newext=""
+                    if ext==".dita" or ext==".ditamap":
+                        newext=".xml"
+                    elif ext==".xml":
+                        newext=".dita"
+                    if newext!="":
+                        hfile2=fdata[0]+newext
+                        if self.dbgflag:
+                            print("FixHrefs try #1",hfile2)
+                        # try to find file with new extension
+                        ret2=findHref(item,hdir,hfile2,htopic,hcontent,idlist)
+                        if ret2:
+                            # we found the ref in a file with a
+                            # different file extension
+                            newref = makeRef(hdir,hfile2,htopic,hcontent)
+                            newref=relPath(newref,topicdir)
+                            if self.dbgflag:
+                                print("fix #1 succeeds",newref)
+
+                    if newref=="":
+                            # Fix #2: try looking for file in another directory
+                            if self.dbgflag:
+                                print("FixHrefs try #2")
+                            file_list = returnList(TYPE_FILE,hfile,idlist)
+                            ll = len(file_list)
+                            if ll==1:
+                                # we found the file in another directory
+                                l0 = file_list[0]
+                                filedir = os.path.dirname(f)
+                                newdir = l0['directory']
+                                reldir = relPath(newdir,filedir)
+                                # will this file satisfy the reference?
+                                ret2 = findHref(item,newdir,hfile,htopic,hcontent,idlist)
+                                if ret2:
+                                    # this file is OK, use it instead
+                                    newref = makeRef(reldir,hfile,htopic,hcontent)
+                                    if self.dbgflag:
+                                        print("FixHrefs #2 succeeds",newref)
+                            else:
+                                if self.dbgflag:
+                                    print(" file",hfile,"found in",ll,"places")
+                                    for ffl in file_list:
+                                        print(self.ppath(fpath(ffl)))
+
+                    if newref=="":
+                            # Fix #3: try looking for new topicid in same file
+                            if self.dbgflag:
+                                print("FixHrefs try #3")
+                            file_list = returnList(TYPE_FILE,hfile,idlist)
+                            ll = len(file_list)
+                            if ll==1:
+                                # we found the file, get its topicid
+                                l0 = file_list[0]
+                                htopic2 = l0['topicid']
+                                filedir = os.path.dirname(f)
+                                newdir = l0['directory']
+                                reldir = relPath(newdir,filedir)
+                                # will this topicid satisfy the reference?
+                                ret2 = findHref(item,newdir,hfile,htopic2,hcontent,idlist)
+                                if ret2:
+                                    # this topicid is OK, use it instead
+                                    newref = makeRef(reldir,hfile,htopic2,hcontent)
+                                    if self.dbgflag:
+                                        print("FixHrefs #3 succeeds",newref)
+
+                            else:
+                                if ll>0:
+                                    print(" file",hfile,"found in",ll,"places, cannot fix")
+                                    if self.dbgflag:
+                                        for ffl in file_list:
+                                            print(self.ppath(fpath(ffl)))
+                                else:
+                                    if self.dbgflag:
+                                        print(" file",hfile,"not found")
+
+                    if newref!="":
+                        # we have a changed reference, fix it in the source file
+                        print("  change from:",r,oldref)
+                        print("           to:",r,newref)
+                        e.set(r,newref)
+                        fixed=fixed+1
+
+                    else:
+                        if self.dbgflag:
+                            print("FixHrefs, all fixes failed, giving up")
+
+        # the file may have changed since it was scanned
+        if oldref==None and line>0:
+            return self.FixHrefs(tree,item,href,idlist)
+
+        # check for logic error
+        if oldref==None:
+            print("FixHrefs ERROR",href,"not found")
+
+        return fixed
+
+    #
+    # Function to save a scanned inventory to a file so
+    # later runs can start from it instead of a full scan.
+    #
+    #   path - inventory file to write (JSON)
+    #   source_spec - map or directory that was scanned
+    #   mapfiles - file paths that were scanned
+    #   idlist - dictionary list of file information
+    #   extra - optional dictionary of more entries to save
+    #
+    def SaveInventory(self,path,source_spec,mapfiles,idlist,extra=None):
+        import json
+
+        if self.dbgflag:
+            print("Enter SaveInventory",path,len(idlist))
+
+        data={}
+        data['version']=1
+        data['source']=os.path.abspath(source_spec)
+        data['project']=os.path.abspath(self.getpdir())
+        data['mapfiles']=mapfiles
+        data['records']=list(idlist)
+        data['keyvalues']=dict(self.keyvalues)
+        if extra!=None:
+            data.update(extra)
+
+        # write to a temporary file first so a failed run
+        # never leaves a truncated inventory behind
+        tmp=path+".tmp"
+        out=open(tmp,"w",encoding="utf-8")
+        json.dump(data,out)
+        out.close()
+        os.replace(tmp,path)
+
+        return
+
+    #
+    # Function to save a scanned inventory as a snapshot file
+    # (see Snapshot) that tools open with --index.
+    #
+    #   path - snapshot file to write
+    #   source_spec - map or directory that was scanned
+    #   mapfiles - file paths that were scanned
+    #   idlist - dictionary list of file information
+    #
+    # The records, the key space and the reference edges are
+    # stored. Every string is stored once, in a sorted table,
+    # and everything else refers to strings by their index.
+    #
+    def SaveSnapshot(self,path,source_spec,mapfiles,idlist):
+        import array
+        import struct
+
+        if self.dbgflag:
+            print("Enter SaveSnapshot",path,len(idlist))
+
+        graph=BuildRefGraph(idlist)
+        edges=sorted(graph.edges)
+
+        # field name -> type: 0 string (or None),
+        # 1 list of strings, 2 list of integers
+        fields={}
+        strings=set()
+        for item in idlist:
+            for name in item:
+                v=item[name]
+                if isinstance(v,list):
+                    if len(v)>0 and isinstance(v[0],int):
+                        fields[name]=2
+                    else:
+                        fields.setdefault(name,1)
+                        strings.update(v)
+                else:
+                    fields.setdefault(name,0)
+                    if v!=None:
+                        strings.add(v)
+        fieldnames=sorted(fields)
+        if len(fieldnames)>32:
+            print("SaveSnapshot error: records have more than 32 fields")
+            return
+        paths=[fpath(item) for item in idlist]
+        strings.update(paths)
+        strings.update(mapfiles)
+        strings.update(fieldnames)
+        strings.update(self.keyvalues)
+        strings.update(self.keyvalues.values())
+        for e in edges:
+            strings.update(e)
+        source=canonPath(source_spec)
+        project=canonPath(self.getpdir())
+        strings.add(source)
+        strings.add(project)
+
+        # the string table, sorted by UTF-8 bytes so that
+        # comparing indexes is comparing the strings
+        encoded=sorted([x.encode("utf-8") for x in strings])
+        index={}
+        stroffsets=array.array("Q",[0])
+        for i in range(len(encoded)):
+            index[encoded[i].decode("utf-8")]=i
+            stroffsets.append(stroffsets[-1]+len(encoded[i]))
+        sec={}
+        sec['stroffsets']=stroffsets
+        sec['strings']=b"".join(encoded)
+        sec['fields']=array.array("I")
+        for name in fieldnames:
+            sec['fields'].extend((index[name],fields[name]))
+
+        # records: a field mask, then the fields in name order
+        recoffsets=array.array("Q",[0])
+        records=array.array("I")
+        for item in idlist:
+            mask=0
+            for b in range(len(fieldnames)):
+                if fieldnames[b] in item:
+                    mask|=1<<b
+            records.append(mask)
+            for b in range(len(fieldnames)):
+                if mask&(1<<b):
+                    v=item[fieldnames[b]]
+                    if fields[fieldnames[b]]==0:
+                        records.append(0xFFFFFFFF if v==None else index[v])
+                    elif fields[fieldnames[b]]==1:
+                        records.append(len(v))
+                        records.extend([index[x] for x in v])
+                    else:
+                        records.append(len(v))
+                        for x in v:
+                            records.extend((x&0xFFFFFFFF,x>>32))
+            recoffsets.append(len(records))
+        sec['recoffsets']=recoffsets
+        sec['records']=records
+
+        # the records of each file
+        byfile=sorted(range(len(idlist)),key=lambda i: (index[paths[i]],i))
+        sec['byfile']=array.array("I",byfile)
+        sec['paths']=array.array("I")
+        i=0
+        while i<len(byfile):
+            j=i
+            while j<len(byfile) and paths[byfile[j]]==paths[byfile[i]]:
+                j=j+1
+            sec['paths'].extend((index[paths[byfile[i]]],i,j-i))
+            i=j
+
+        sec['keys']=array.array("I")
+        for k in sorted(self.keyvalues,key=lambda k: index[k]):
+            sec['keys'].extend((index[k],index[self.keyvalues[k]]))
+        sec['mapfiles']=array.array("I",[index[m] for m in mapfiles])
+
+        # edges sorted by source, and their order by target
+        sec['edges']=array.array("I")
+        for e in edges:
+            sec['edges'].extend((index[e[0]],index[e[1]],index[e[2]]))
+        sec['redges']=array.array("I",sorted(range(len(edges)),key=lambda i: (index[edges[i][1]],i)))
+        sec['meta']=array.array("I",[index[source],index[project]])
+
+        # header, section table, then the sections (8-byte aligned)
+        head=struct.calcsize("<8sII")+16*len(SNAPSHOT_SECTIONS)
+        table=[]
+        blobs=[]
+        pos=head
+        for name in SNAPSHOT_SECTIONS:
+            b=sec[name]
+            if isinstance(b,array.array):
+                if sys.byteorder=="big":
+                    b=array.array(b.typecode,b)
+                    b.byteswap()
+                b=b.tobytes()
+            pad=(-pos)%8
+            blobs.append(b"\0"*pad)
+            pos=pos+pad
+            table.append((pos,len(b)))
+            blobs.append(b)
+            pos=pos+len(b)
+
+        tmp=path+".tmp"
+        out=open(tmp,"wb")
+        out.write(struct.pack("<8sII",SNAPSHOT_MAGIC,SNAPSHOT_VERSION,len(SNAPSHOT_SECTIONS)))
+        for off, size in table:
+            out.write(struct.pack("<QQ",off,size))
+        for b in blobs:
+            out.write(b)
+        out.close()
+        os.replace(tmp,path)
+        return
+
+    #
+    # Function to load an inventory saved by SaveInventory.
+    # The saved lists are appended to mapfiles and idlist,
+    # and the entries saved with extra are put in the
+    # dictionary extra (if one is given).
+    #
+    # Returns the scanned source spec, or None if the
+    # inventory cannot be read.
+    #
+    def LoadInventory(self,path,mapfiles,idlist,extra=None):
+        import json
+
+        if self.dbgflag:
+            print("Enter LoadInventory",path)
+
+        try:
+            fin=open(path,"r",encoding="utf-8")
+            data=json.load(fin)
+            fin.close()
+        except (OSError,ValueError) as e:
+            print("LoadInventory error",path,e)
+            return None
+
+        if data.get('version')!=1:
+            print("LoadInventory error",path,"has an unknown version")
+            return None
+
+        self.setpdir(data['project'])
+        self.keyvalues=self.newKeys()
+        self.keyvalues.update(data['keyvalues'])
+        mapfiles.extend(data['mapfiles'])
+        idlist.extend(data['records'])
+        if extra!=None:
+            for k in data:
+                if not k in ('version','source','project','mapfiles','records','keyvalues'):
+                    extra[k]=data[k]
+
+        return data['source']
+
+    #
+    # Function to scan one shard of a directory on its own
+    # (on this host or another) into a partial index file.
+    #
+    #   dir - directory being scanned (the same tree on every host)
+    #   path - partial index file to write
+    #   shard, nshards, bydir - which shard (see setshard)
+    #
+    # The partial index is a saved inventory (see SaveInventory)
+    # of the shard's files, plus:
+    #
+    #   shard - index, count and bydir
+    #   targets - the targets the shard holds, sorted
+    #   bloom - Bloom filter of the same targets
+    #   bad - references into the shard's own files that
+    #         were checked here and are bad
+    #   remote - references into other shards, left for the
+    #            merge to check
+    #
+    # References are saved as (source, target) paths relative
+    # to dir, so hosts can have the tree in different places.
+    #
+    # Returns the number of records scanned.
+    #
+    def ScanShard(self,dir,path,shard,nshards,bydir=False):
+
+        if self.dbgflag:
+            print("Enter ScanShard",dir,shard,"of",nshards)
+
+        filelist=[]
+        idlist=[]
+        old=self.shard
+        self.setshard(shard,nshards,bydir)
+        try:
+            self.GetFileInventory(filelist,dir,idlist)
+        finally:
+            self.shard=old
+
+        # the targets this shard holds
+        root=canonPath(dir)
+        targets=set()
+        for item in idlist:
+            targets.update(recordTargets(item,root))
+        bloom=BloomFilter(len(targets))
+        for t in targets:
+            bloom.add(t)
+
+        # check the references into this shard now
+        bad=[]
+        remote=[]
+        for item in idlist:
+            src=None
+            for h in item.get('hrefs',[]):
+                if isURL(h):
+                    continue
+                if src==None:
+                    src=relPath(fpath(item),root).replace(os.sep,"/")
+                t=targetKey(h,root)
+                if shardOf(hrefFile(t),nshards,bydir)!=shard:
+                    remote.append([src,t])
+                elif not t in targets:
+                    bad.append([src,t])
+
+        extra={'shard':{'index':shard,'count':nshards,'bydir':bydir},
+               'targets':sorted(targets),'bloom':bloom.todict(),
+               'bad':bad,'remote':remote}
+        self.SaveInventory(path,dir,filelist,idlist,extra)
+        return len(idlist)
+
+    #
+    # Function to merge the partial index files written by
+    # ScanShard into one inventory, and check the references
+    # between shards.
+    #
+    # The shards' lists are appended to mapfiles and idlist
+    # in shard order, with paths moved to this host's copy of
+    # the tree (the first shard's). The key spaces are merged;
+    # as in DITA the first definition of a key wins, and keys
+    # defined differently by two shards are reported.
+    #
+    # A reference into another shard is checked against the
+    # targets that shard saved when it was scanned. The
+    # shard's Bloom filter is only a negative precheck: a
+    # target the filter has certainly not seen is bad without
+    # a lookup, and a shard that only such references point
+    # into never has its target set built. Every other
+    # reference, valid ones included, is looked up. Key
+    # references are checked against the merged key space.
+    #
+    # Returns a dictionary:
+    #   bad - (source, target) bad references, relative paths
+    #   badkeys - (source, keyref) undefined key references
+    #   conflicts - (key, href kept, other href)
+    #   missing - shard numbers with no partial index
+    #   remote, skipped, lookups - references between shards,
+    #       how many the Bloom filters found bad, how many were
+    #       looked up in the target sets
+    # or None if a partial index cannot be read.
+    #
+    def MergeShards(self,paths,mapfiles,idlist):
+        import json
+
+        if self.dbgflag:
+            print("Enter MergeShards",len(paths),"files")
+
+        shards=[]
+        for p in paths:
+            try:
+                fin=open(p,"r",encoding="utf-8")
+                data=json.load(fin)
+                fin.close()
+            except (OSError,ValueError) as e:
+                print("MergeShards error",p,e)
+                return None
+            if data.get('version')!=1 or not 'shard' in data:
+                print("MergeShards error",p,"is not a partial index")
+                return None
+            shards.append(data)
+        if len(shards)==0:
+            return None
+        shards.sort(key=lambda d: d['shard']['index'])
+        nshards=shards[0]['shard']['count']
+        bydir=shards[0]['shard']['bydir']
+        byindex={}
+        for d in shards:
+            byindex[d['shard']['index']]=d
+
+        # paths are moved into the first shard's tree
+        self.setpdir(shards[0]['project'])
+        root=canonPath(shards[0]['project'])
+        self.keyvalues=self.newKeys()
+        report={'bad':[],'badkeys':[],'conflicts':[],'remote':0,'skipped':0,'lookups':0}
+        report['missing']=[i for i in range(nshards) if not i in byindex]
+        for d in shards:
+            old=canonPath(d['project'])
+            for m in d['mapfiles']:
+                mapfiles.append(rebasePath(m,old,root))
+            for item in d['records']:
+                if old!=root:
+                    rebaseRecord(item,old,root)
+                idlist.append(item)
+            for k in d['keyvalues']:
+                v=d['keyvalues'][k]
+                if not k in self.keyvalues:
+                    self.keyvalues[k]=v
+                elif self.keyvalues[k]!=v:
+                    report['conflicts'].append((k,self.keyvalues[k],v))
+            report['bad'].extend([tuple(b) for b in d['bad']])
+
+        # references between shards
+        blooms={}
+        targets={}
+        for d in shards:
+            for src, t in d['remote']:
+                report['remote']=report['remote']+1
+                ts=shardOf(hrefFile(t),nshards,bydir)
+                if not ts in byindex:
+                    # the shard was not scanned; nothing to check against
+                    continue
+                if not ts in blooms:
+                    blooms[ts]=BloomFilter().fromdict(byindex[ts]['bloom'])
+                if not t in blooms[ts]:
+                    report['skipped']=report['skipped']+1
+                    report['bad'].append((src,t))
+                    continue
+                report['lookups']=report['lookups']+1
+                if not ts in targets:
+                    if 'targets' in byindex[ts]:
+                        targets[ts]=set(byindex[ts]['targets'])
+                    else:
+                        # a partial index saved without its targets
+                        targets[ts]=set()
+                        for item in byindex[ts]['records']:
+                            targets[ts].update(recordTargets(item,root))
+                if not t in targets[ts]:
+                    report['bad'].append((src,t))
+
+        # key references, against every key defined anywhere
+        defined=set(self.keyvalues)
+        for item in idlist:
+            for k in item.get('keys',[]):
+                defined.update(k.split(" "))
+        for item in idlist:
+            for kr in item.get('keyrefs',[]):
+                key, kid = parseKeyref(kr)
+                if not key in defined:
+                    report['badkeys'].append((relPath(fpath(item),root).replace(os.sep,"/"),kr))
+
+        report['bad'].sort()
+        return report
+
+    #
+    # Function to bring a saved inventory up to date after
+    # some files changed.
+    #
+    # The records of the changed files are dropped and the
+    # files are scanned again. Files that the new references
+    # reach but that were not in the inventory are scanned too.
+    #
+    #   changed - absolute paths of the changed files (matched
+    #             to the inventory by real path, see realPaths)
+    #   mapfiles - file paths in the inventory (updated)
+    #   idlist - dictionary list of file information (updated)
+    #   staged - True to scan the content staged for commit
+    #            (see GitStagedData) rather than the working
+    #            tree, where there is staged content
+    #
+    # Returns the list of records that were scanned again.
+    #
+    def RescanFiles(self,changed,mapfiles,idlist,staged=False):
+        if self.dbgflag:
+            print("Enter RescanFiles",len(changed))
+
+        # only files that are part of the inventory are rescanned
+        known=set(mapfiles)
+        cset=set(realPaths(changed,mapfiles))
+
+        # drop the old records of the changed files
+        keep=[]
+        for item in idlist:
+            if item['directory']=="" or not fpath(item) in cset:
+                keep.append(item)
+        idlist[:]=keep
+
+        # scan them again, following any new references
+        newrecs=[]
+        pending=collections.deque(sorted(cset))
+        while len(pending)>0:
+            ff=pending.popleft()
+            if not ff in known:
+                known.add(ff)
+                mapfiles.append(ff)
+            data=None
+            if staged and not isURL(ff):
+                data=GitStagedData(ff)
+            loclist=self.ScanSourceFile(ff,idlist,data)
+            for lcl in loclist:
+                newrecs.append(lcl)
+                for href in lcl.get('hrefs',[]):
+                    if isURL(href):
+                        xfpath=href
+                    else:
+                        xfpath=hrefFile(href)
+                    if not xfpath in known:
+                        pending.append(xfpath)
+                        known.add(xfpath)
+                        mapfiles.append(xfpath)
+                        cset.add(xfpath)
+
+        return newrecs
+
+# project used by the module functions
+defaultproject = Project()
+
+#
+# Function to scan several projects at the same time,
+# sharing one pool of worker threads.
+#
+#   paths - map files or map directories, one per project
+#   jobs - number of threads (0 = one per project)
+#   allfiles - scan every file in the directories instead
+#              of only the files reachable from the maps
+#
+# Returns the list of scanned Project objects.
+#
+def ScanProjects(paths,jobs=0,allfiles=False):
+    import concurrent.futures
+
+    projects=[Project() for p in paths]
+    if jobs<=0:
+        jobs=max(1,len(paths))
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+        futures=[]
+        for i in range(len(paths)):
+            if allfiles:
+                futures.append(pool.submit(projects[i].scanFiles,paths[i]))
+            else:
+                futures.append(pool.submit(projects[i].scanMaps,paths[i]))
+        for f in futures:
+            f.result()
+    return projects
@@ -0,0 +1,273 @@
+###################################
+# PROLOG SECTION
+# benchmemory.py
+#
+# A program that measures how much memory the scans and the
+# report tools use, so that a change that makes the records
+# or the tree handling heavier is caught.
+#
+#   benchmemory.py [--sizes=n,n,...] [--cases=name,...] [--scale=x]
+#
+# A corpus of generated topics (and a map with keys that
+# reaches them all) is made for each size (default 250, 500
+# and 1000 files). Each case is run on each corpus in a fresh
+# interpreter, with tracemalloc on, and reports:
+#
+#   peak      - most memory allocated by Python during the run
+#   retained  - memory still allocated when it ends (the
+#               inventory, or the tool's globals)
+#   rss       - growth of the process's peak resident size,
+#               which includes what lxml allocates
+#
+# and those divided by the number of files (and, for the
+# inventories, by the number of records). A case fails if
+# its peak or retained bytes per file on the largest corpus
+# is more than its limit in LIMITS (times --scale), or if
+# its peak bytes per file grows by more than GROWTH from the
+# smallest corpus to the largest (memory that grows faster
+# than the corpus). The exit status is 1 when any case fails.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+import subprocess
+import tempfile
+import shutil
+import json
+
+# case name: (tool script and arguments, or None for the
+# inventory functions)
+cases = {
+    "GetMapInventory":  None,
+    "GetFileInventory": None,
+    "debug":    ["ditadebug.py","main.ditamap"],
+    "ids":      ["ditaids.py","main.ditamap"],
+    "keywords": ["ditakeywords.py","main.ditamap"],
+    "unused":   ["ditaunused.py","main.ditamap"],
+    "graph":    ["ditagraph.py","main.ditamap"],
+    "impact":   ["ditaimpact.py","main.ditamap","t0/t0.dita"],
+    "dups":     ["ditadups.py","."],
+    "maps":     ["ditamaps.py","."],
+    "conref":   ["ditaconref.py","main.ditamap"],
+    "stat":     ["ditastat.py","main.ditamap"],
+}
+
+# case name: (peak, retained) bytes per file allowed on the
+# largest corpus (about half again what they used when the
+# suite was written)
+LIMITS = {
+    "GetMapInventory":  (10000, 10000),
+    "GetFileInventory": (10000, 10000),
+    "debug":    (10000, 10000),
+    "ids":      (11000, 11000),
+    "keywords": (12000, 12000),
+    "unused":   (18000, 18000),
+    "graph":    (21000, 21000),
+    "impact":   (18000, 18000),
+    "dups":     (36000, 36000),
+    "maps":     (18000, 18000),
+    "conref":   (10000, 10000),
+    "stat":     (14000, 14000),
+}
+
+# how much the peak bytes per file may grow from the
+# smallest corpus to the largest
+GROWTH = 1.5
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to write a corpus of n topics (100 to a
+# directory) and a map that refers to them all, with some
+# keys, keywords, cross references and a conref, so that
+# every tool has work to do.
+#
+def makeCorpus(dir,n):
+    map=open(os.path.join(dir,"main.ditamap"),"w")
+    map.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    map.write('<!DOCTYPE map PUBLIC "-//OASIS//DTD DITA Map//EN" "map.dtd">\n')
+    map.write('<map id="main"><title>Benchmark</title>\n')
+    for k in range(10):
+        map.write('  <keydef keys="k%d" href="t%d/t%d.dita"/>\n' % (k,k//100,k))
+    for i in range(n):
+        d="t%d" % (i//100)
+        if i%100==0:
+            os.makedirs(os.path.join(dir,d))
+        map.write('  <topicref href="%s/t%d.dita"/>\n' % (d,i))
+        out=open(os.path.join(dir,d,"t%d.dita" % i),"w")
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write('<!DOCTYPE topic PUBLIC "-//OASIS//DTD DITA Topic//EN" "topic.dtd">\n')
+        out.write('<topic id="t%d"><title>Topic %d</title>\n' % (i,i))
+        out.write('<prolog><metadata><keywords><keyword>word%d</keyword>'
+                  '<keyword>common</keyword><indexterm>term%d</indexterm>'
+                  '</keywords></metadata></prolog>\n<body>\n' % (i%50,i%20))
+        for p in range(8):
+            out.write('<p id="p%d">Paragraph %d of topic %d, with some words to shingle '
+                      'and count in the signatures.</p>\n' % (p,p,i))
+        for x in (1,7,31):
+            j=(i+x)%n
+            out.write('<p><xref href="../t%d/t%d.dita#t%d/p%d"/></p>\n' % (j//100,j,j,x%8))
+        out.write('<p><keyword keyref="k%d"/></p>\n' % (i%10))
+        out.write('<p conref="../t0/t0.dita#t0/p0"/>\n')
+        out.write('</body></topic>\n')
+        out.close()
+    map.write('</map>\n')
+    map.close()
+
+#
+# Function to return the peak resident size of this process
+# in bytes (0 if it cannot be found)
+#
+def peakRSS():
+    try:
+        fin=open("/proc/self/status","r")
+        for line in fin:
+            if line.startswith("VmHWM:"):
+                fin.close()
+                return int(line.split()[1])*1024
+        fin.close()
+    except OSError:
+        pass
+    return memoryUsed()
+
+#
+# Function to run one case in this process and print its
+# measurements as JSON (see --child)
+#
+def runChild(name,dir):
+    import tracemalloc
+    import runpy
+    import io
+    # imported before measuring so that only the work counts
+    from lxml import etree
+
+    os.chdir(dir)
+    pathcache.reset()
+    args=cases[name]
+    rss=peakRSS()
+    tracemalloc.start()
+    start=tracemalloc.get_traced_memory()[0]
+    records=0
+    if args==None:
+        mapfiles=[]
+        idlist=[]
+        if name=="GetMapInventory":
+            GetMapInventory(mapfiles,idlist,"main.ditamap")
+        else:
+            GetFileInventory(mapfiles,".",idlist)
+        keep=idlist
+        records=len(idlist)
+    else:
+        # run the tool with its output thrown away
+        sys.argv=args
+        out=sys.stdout
+        sys.stdout=io.StringIO()
+        try:
+            keep=runpy.run_path(os.path.join(here,args[0]),run_name="__main__")
+        except SystemExit:
+            keep=None
+        sys.stdout=out
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result={'peak':peak-start,'retained':cur-start,'rss':max(0,peakRSS()-rss),'records':records}
+    print(json.dumps(result))
+
+#
+# Function to run a case in a fresh interpreter and return
+# its measurements
+#
+def runCase(name,dir):
+    p=subprocess.run([sys.executable,os.path.abspath(__file__),"--child="+name,dir],
+                     stdout=subprocess.PIPE,stderr=subprocess.PIPE,text=True)
+    if p.returncode!=0:
+        print(name,"failed:")
+        print(p.stderr)
+        return None
+    return json.loads(p.stdout.strip().splitlines()[-1])
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0,here)
+
+child = GetOption("child")
+if child!=None:
+    runChild(child,GetArgs()[0])
+    sys.exit(0)
+
+sizes = [int(n) for n in GetOption("sizes","250,500,1000").split(",")]
+names = list(cases)
+if GetOption("cases")!=None:
+    names = GetOption("cases").split(",")
+scale = float(GetOption("scale","1"))
+
+# startup message
+print(" ")
+print("benchmemory:",", ".join([str(n) for n in sizes]),"files")
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+tmpdir=tempfile.mkdtemp()
+corpora={}
+for n in sizes:
+    corpora[n]=os.path.join(tmpdir,str(n))
+    os.makedirs(corpora[n])
+    makeCorpus(corpora[n],n)
+
+print("%-17s %6s %10s %10s %10s %9s %9s %9s" %
+      ("case","files","peak","retained","rss","peak/f","kept/f","kept/rec"))
+failed=0
+for name in names:
+    first=None
+    for n in sizes:
+        r=runCase(name,corpora[n])
+        if r==None:
+            failed=failed+1
+            break
+        # files: the topics and the map
+        files=n+1
+        perfile=r['peak']/files
+        keptfile=r['retained']/files
+        perrec="-"
+        if r['records']>0:
+            perrec="%9.0f" % (r['retained']/r['records'])
+        if first==None:
+            first=perfile
+        status=""
+        if n==sizes[-1]:
+            peaklimit, keptlimit = LIMITS[name]
+            if perfile>peaklimit*scale:
+                status="PEAK OVER %d" % (peaklimit*scale)
+            elif keptfile>keptlimit*scale:
+                status="RETAINED OVER %d" % (keptlimit*scale)
+            elif len(sizes)>1 and perfile>first*GROWTH:
+                status="GROWS %.1fx" % (perfile/first)
+            if status!="":
+                failed=failed+1
+        print("%-17s %6d %10d %10d %10d %9.0f %9.0f %9s  %s" %
+              (name,files,r['peak'],r['retained'],r['rss'],perfile,keptfile,perrec,status))
+
+shutil.rmtree(tmpdir)
+
+print(" ")
+print("end benchmemory: (%d failed)" % failed)
+print(" ")
+
+if failed>0:
+    sys.exit(1)
@@ -0,0 +1,141 @@
+###################################
+# PROLOG SECTION
+# benchstartup.py
+#
+# A program that measures how long the DITA tools take to
+# start, so that an eager import creeping back in is caught.
+#
+#   benchstartup.py [map-or-dir] [--runs=n] [--limit=ms] [--scanlimit=ms]
+#
+# Each case is started --runs times (default 10) in a fresh
+# interpreter and the median time is reported, less the time
+# of an interpreter that does nothing. A case fails if that
+# overhead is more than its limit, or if it imports lxml when
+# it should not need to. The exit status is 1 when any case
+# fails.
+#
+# The startup cases are held to --limit milliseconds (default
+# 60). The maps startup case loads a tool and gives it a map
+# that does not exist, so nothing is scanned. The index case
+# builds a term index of map-or-dir (default the current
+# directory) once and then times a lookup that must be
+# answered from the index alone.
+#
+# The scan case runs a full ditamaps scan of map-or-dir and
+# has its own limit, --scanlimit milliseconds (default 1000),
+# since its time grows with the size of the project.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+import subprocess
+import tempfile
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Start a command runs times and return the median wall time
+# in milliseconds.
+#
+def timeCommand(cmd,runs):
+    times=[]
+    # the first run only warms the bytecode cache
+    subprocess.run(cmd,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,env=env)
+    for i in range(runs):
+        t=time.perf_counter()
+        subprocess.run(cmd,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,env=env)
+        times.append((time.perf_counter()-t)*1000.0)
+    times.sort()
+    return times[len(times)//2]
+
+#
+# Run a command once with -X importtime and return True
+# if lxml was imported.
+#
+def importsLxml(cmd):
+    p=subprocess.run(cmd[:1]+["-X","importtime"]+cmd[1:],
+                     stdout=subprocess.DEVNULL,stderr=subprocess.PIPE,text=True,env=env)
+    for line in p.stderr.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip()=="lxml":
+            return True
+    return False
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# get the directory to index and the limits
+source_spec = GetInputPath()
+runs = int(GetOption("runs",10))
+limit = float(GetOption("limit",60))
+scanlimit = float(GetOption("scanlimit",1000))
+
+here = os.path.dirname(os.path.abspath(__file__))
+dita = os.path.join(here,"dita.py")
+py = sys.executable
+indexfile = os.path.join(tempfile.mkdtemp(),"terms.idx")
+# a map that is not there, so a tool starts and scans nothing
+nomap = os.path.join(os.path.dirname(indexfile),"none.ditamap")
+
+# time the tools as they normally run, with compiled modules cached
+env = dict(os.environ)
+env.pop("PYTHONDONTWRITEBYTECODE",None)
+
+# case name, command, may it import lxml, limit in ms
+cases = [
+    ("import DITAmod", [py,"-c","import sys; sys.path.insert(0,%r); import DITAmod" % here], False, limit),
+    ("dita --help",    [py,dita,"--help"], False, limit),
+    ("keywords index", [py,dita,"keywords",source_spec,"--terms="+indexfile,"--find=a","--prefix"], False, limit),
+    ("maps startup",   [py,dita,"maps",nomap], False, limit),
+    ("maps scan",      [py,dita,"maps",source_spec], True, scanlimit),
+]
+
+# startup message
+print(" ")
+print("benchstartup:",source_spec)
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# build the term index the index case reads
+subprocess.run([py,dita,"keywords",source_spec,"--terms="+indexfile],
+               stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,env=env)
+
+base=timeCommand([py,"-c","pass"],runs)
+print("%-16s %8.1f ms" % ("python",base))
+
+failed=0
+for name, cmd, lxmlok, caselimit in cases:
+    ms=timeCommand(cmd,runs)
+    status="ok"
+    if ms-base>caselimit:
+        status="SLOW"
+    if not lxmlok and importsLxml(cmd):
+        status="IMPORTS LXML"
+    if status!="ok":
+        failed=failed+1
+    print("%-16s %8.1f ms  %+8.1f ms  %s" % (name,ms,ms-base,status))
+
+if os.path.exists(indexfile):
+    os.remove(indexfile)
+os.rmdir(os.path.dirname(indexfile))
+
+print(" ")
+print("end benchstartup:",source_spec,"(%d failed)" % failed)
+print(" ")
+
+if failed>0:
+    sys.exit(1)
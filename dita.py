@@ -0,0 +1,102 @@
+###################################
+# PROLOG SECTION
+# dita.py
+#
+# A single command that runs any of the DITA tools as a
+# subcommand, so hooks and scripts only need one entry point.
+#
+#   dita.py command [arguments]
+#   dita.py --help
+#
+# Only the chosen tool's script is loaded, and DITAmod imports
+# lxml and the other heavy modules when they are first used,
+# so --help and quick queries start without them.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+import sys
+import os.path
+
+# subcommand name: (script, one line description)
+commands = {
+    "debug":    ("ditadebug.py",    "list bad references in one or more maps"),
+    "ids":      ("ditaids.py",      "list topic ids and flag duplicates"),
+    "keywords": ("ditakeywords.py", "list or look up keywords and index terms"),
+    "authors":  ("ditaauthors.py",  "report the authors and other prolog metadata"),
+    "stat":     ("ditastat.py",     "count tags and attributes"),
+    "unused":   ("ditaunused.py",   "list source files no map refers to"),
+    "links":    ("ditalinks.py",    "test the URLs the files reference"),
+    "repair":   ("DITARepair.py",   "repair references in the current directory"),
+    "journal":  ("ditajournal.py",  "show, finish or undo the last repair"),
+    "graph":    ("ditagraph.py",    "write the reference graph (DOT, GraphML, JSON)"),
+    "impact":   ("ditaimpact.py",   "list what is affected by changed files"),
+    "changed":  ("ditachanged.py",  "rescan only the files changed since a saved inventory"),
+    "dups":     ("ditadups.py",     "find duplicate and near-duplicate topics"),
+    "conref":   ("ditaconref.py",   "resolve and check conrefs and conkeyrefs"),
+    "maps":     ("ditamaps.py",     "list which maps contain which files"),
+    "shard":    ("ditashard.py",    "scan a directory in shards and merge the results"),
+    "index":    ("ditaindex.py",    "save or describe a snapshot the tools read with --index"),
+    "diff":     ("ditadiff.py",     "compare two saved scans of a project"),
+}
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Print the usage message and the list of subcommands.
+#
+def usage(out):
+    out.write("usage: dita.py command [arguments]\n\n")
+    out.write("commands:\n")
+    for name in commands:
+        out.write("  %-10s %s\n" % (name,commands[name][1]))
+
+#
+# Run the script for a subcommand as if it had been started
+# directly: argv[0] is the script and the rest of the
+# arguments are passed through unchanged. The script is run
+# as a module so its compiled bytecode is cached like
+# DITAmod's. sys.path and sys.argv are put back afterwards,
+# so runCommand can be called more than once in a process.
+#
+def runCommand(name,args):
+    import runpy
+
+    oldpath=sys.path[:]
+    oldargv=sys.argv[:]
+    here=os.path.dirname(os.path.abspath(__file__))
+    try:
+        if not here in sys.path:
+            sys.path.insert(0,here)
+        sys.argv=[sys.argv[0]]+args
+        runpy.run_module(os.path.splitext(commands[name][0])[0],run_name="__main__",alter_sys=True)
+    finally:
+        sys.path[:]=oldpath
+        sys.argv=oldargv
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+if __name__ == "__main__":
+    if len(sys.argv)<2 or sys.argv[1] in ("-h","--help","help"):
+        usage(sys.stdout)
+        sys.exit(0)
+
+    name=sys.argv[1]
+    if not name in commands:
+        sys.stderr.write("dita.py: unknown command '%s'\n\n" % name)
+        usage(sys.stderr)
+        sys.exit(2)
+
+    runCommand(name,sys.argv[2:])
@@ -2,8 +2,17 @@
 # PROLOG SECTION
 # ditaauthors.py
 #
-# A program that lists authors in DITA source
-# files.
+# A program that lists authors and the other prolog
+# metadata in DITA source files.
+#
+#   ditaauthors.py map-or-dir [--jobs=n]
+#
+# The report counts the authors, contributors, permissions,
+# other metadata (othermeta), audiences, products and
+# copyrights of every topic, nested topics included, and
+# gives the range of the critical dates and the topics past
+# their expiry date. Only the prologs are read (see
+# ReadMetadata), in parallel (--jobs=1 turns this off).
 #
 # Tested with Python 3.12.2 and the lxml module installed.
 # May 22, 2024
@@ -18,11 +27,22 @@
 
 # import needed modules
 from DITAmod import *
+import collections
+import datetime
 
 ###################################
 # FUNCTION DEFINITION SECTION
 ###################################
 
+#
+# Function to print a section of counts
+#
+def showCounts(title,counts,label):
+    print(title)
+    print("="*len(title))
+    for a in counts:
+        print("count: %5d, %s: %s" % (counts[a],label,a))
+    print(" ")
 
 ###################################
 # PROCESSING INITIALIZATION SECTION
@@ -34,9 +54,18 @@ idlist=[]
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+# only the files are needed from the scan
+setfields(['topicid'])
 
 # get map(s) to be processed
 source_spec = GetInputPath()
+jobs = int(GetOption("jobs","0"))
 
 # startup message
 print(" ")
@@ -52,55 +81,86 @@ print(" ")
 # scan for files
 GetMapInventory(mapfiles,idlist,source_spec)
 
-if len(idlist)==0:
+# the topic files, once each (a file holding several
+# topics has a record for each)
+files=[]
+seen=set()
+for l in idlist:
+    # only look in doctype files that are not maps
+    if isSource(l) and not isDITAMap(fpath(l)) and not fpath(l) in seen:
+        seen.add(fpath(l))
+        files.append(fpath(l))
+
+if len(files)==0:
     print("No files found.")
-else:
-    # create the report
-    copyrights = {}
-    authorlist = {}
-    contribs = {}
-    nsource=0
-    for l in idlist:
-        # only look in doctype files
-        if isSource(l):
-            flpath=fpath(l)
-            atree = etree.parse(flpath)
-            aroot = atree.getroot()
-            prolog = aroot.xpath("prolog")
-            if len(prolog)>0:
-                authors = prolog[0].xpath("author")
-                for author in authors:
-                    tp = author.get('type')
-                    if tp=="creator":
-                        creator = author.text
-                        if creator in authorlist:
-                            authorlist[creator]=authorlist[creator]+1
-                        else:
-                            authorlist[creator]=1
-                    if tp=="contributor":
-                        contributor = author.text
-                        if contributor in contribs:
-                            contribs[contributor]=contribs[contributor]+1
-                        else:
-                            contribs[contributor]=1
-                       
-            nsource=nsource+1
-            atree=None
-
-print("Authors")
-print("=======")
-for a in authorlist:
-    print("count: %5d, author: %s" % (authorlist[a],a))
-
+    print(" ")
+    print("end ditaauthors")
+    print(" ")
+    exit(0)
+
+# read the prologs, in parallel
+results=ParallelMap(ReadMetadata,files,jobs)
+
+# create the report
+authorlist = collections.Counter()
+contribs = collections.Counter()
+others = collections.Counter()
+permissions = collections.Counter()
+othermeta = collections.Counter()
+audiences = collections.Counter()
+products = collections.Counter()
+copyrights = collections.Counter()
+created = []
+revised = []
+expired = []
+today = datetime.date.today().isoformat()
+ntopics = 0
+nprologs = 0
+for i in range(len(files)):
+    for t in results[i]:
+        ntopics=ntopics+1
+        if any([len(t[k])>0 for k in t if k!='topicid']):
+            nprologs=nprologs+1
+        for tp, name in t['authors']:
+            if tp=="creator":
+                authorlist[name]+=1
+            elif tp=="contributor":
+                contribs[name]+=1
+            else:
+                others[(name+" ("+tp+")") if tp!="" else name]+=1
+        permissions.update(t['permissions'])
+        othermeta.update([n+" = "+c for n, c in t['othermeta']])
+        audiences.update(t['audience'])
+        products.update(t['products'])
+        copyrights.update(t['copyrights'])
+        created.extend(t['created'])
+        revised.extend(t['revised'])
+        for d in t['expiry']:
+            if d<today:
+                expired.append((d,files[i]+"#"+t['topicid']))
+
+showCounts("Authors",authorlist,"author")
+showCounts("Contributors",contribs,"contributor")
+showCounts("Other authors",others,"author")
+
+print("Critical dates")
+print("==============")
+if len(created)>0:
+    print("created:  %s to %s (%d topics)" % (min(created),max(created),len(created)))
+if len(revised)>0:
+    print("revised:  %s to %s (%d revisions)" % (min(revised),max(revised),len(revised)))
+for d, loc in sorted(expired):
+    print("expired: ",d,ppath(loc))
 print(" ")
 
-print("Contributors")
-print("============")
-for a in contribs:
-    print("count: %5d, contributor: %s" % (contribs[a],a))
+showCounts("Permissions",permissions,"view")
+showCounts("Other metadata",othermeta,"othermeta")
+showCounts("Audiences",audiences,"audience")
+showCounts("Products",products,"product")
+showCounts("Copyrights",copyrights,"copyright")
 
-print(" ")
-print(nsource,"source files in",source_spec)
+print(ntopics,"topics,",nprologs,"with prolog metadata")
+print(len(files),"source files in",source_spec)
 print(" ")
 print("end ditaauthors")
 print(" ")
@@ -0,0 +1,258 @@
+# PROLOG SECTION
+# ditachanged.py
+#
+# A program that checks only the references touched by
+# the files changed in a git working tree, starting from
+# an inventory saved by an earlier run.
+#
+#   ditachanged.py map-or-dir --inventory=file [--since=rev]
+#
+# Without --since the files staged for commit are used
+# (pre-commit mode), and what is checked is their staged
+# content, not the working tree. With --since=rev the working
+# tree is checked, and the files changed since the revision
+# are checked even if an earlier run saw them (per-PR mode).
+#
+# The inventory records the commit it was saved at (HEAD),
+# whether it holds staged or working tree content, and which
+# files differed from that commit. A run scans again the
+# files that differ between that commit and what is checked
+# now, and the files that differed before. If the inventory
+# does not exist yet, or its commit is not recorded or not
+# in the repository, a full scan is done and saved.
+#
+# With --terms=file the term index saved by ditakeywords
+# is brought up to date for the changed files too.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to check reference i of a record against the
+# target index and report it (with its source line, if
+# known) if bad
+#
+def checkRef(item,i):
+    global nbad
+    href=item['hrefs'][i]
+    if isURL(href):
+        return
+    if not targetKey(href,root) in targets:
+        hdir, hfile, htopic, hcontent = parseHref(href)
+        tid=""
+        if 'topicid' in item and item['topicid']!="":
+            tid="#"+item['topicid']
+        line=""
+        if i<len(item.get('hreflines',[])):
+            line=" (line %d)" % item['hreflines'][i]
+        print("Bad reference:",ppath(fpath(item))+tid+line)
+        print("  -> ",ppath(makeRef(hdir,hfile,htopic,hcontent)))
+        nbad=nbad+1
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+nbad=0
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+
+# get map(s) to be processed and the options
+source_spec = GetInputPath()
+invfile = GetOption("inventory")
+rev = GetOption("since")
+termfile = GetOption("terms")
+
+# startup message
+print(" ")
+print("ditachanged:",source_spec)
+print(" ")
+
+if invfile==None:
+    print("ditachanged error: --inventory=file is required")
+    exit(1)
+
+# the commit checked against, and the content checked
+head=GitRevision(source_spec)
+if head==None:
+    print("ditachanged error: no git commit found for",source_spec)
+    exit(1)
+if rev!=None and GitRevision(source_spec,rev)==None:
+    print("ditachanged error: unknown revision",rev)
+    exit(1)
+staged=(rev==None)
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# load the saved inventory, if it can be trusted
+extra={}
+full=True
+if not os.path.exists(invfile):
+    print("no inventory yet, scanning everything")
+elif LoadInventory(invfile,mapfiles,idlist,extra)==None:
+    print("the inventory cannot be read, scanning everything")
+elif extra.get('revision')==None or GitRevision(source_spec,extra['revision'])==None:
+    print("the inventory records no known commit, scanning everything")
+else:
+    full=False
+
+if full:
+    # no usable inventory, do the full scan once (it reads
+    # the working tree, which differs from HEAD in these)
+    mapfiles=[]
+    idlist=[]
+    GetMapInventory(mapfiles,idlist,source_spec)
+    base=head
+    changed=GitChangedFiles(source_spec,head,False)
+    if changed==None:
+        exit(1)
+    if not staged:
+        changed=[]
+    cset=set(mapfiles)
+else:
+    base=extra['revision']
+    changed=list(extra.get('differs',[]))
+
+# files whose content differs from what the inventory holds
+if staged or not full:
+    more=GitChangedFiles(source_spec,base,staged)
+    if more==None:
+        exit(1)
+    changed=changed+more
+if rev!=None and not full:
+    more=GitChangedFiles(source_spec,rev,False)
+    if more==None:
+        exit(1)
+    changed=changed+more
+changed=sorted(set(changed))
+
+newrecs=[]
+oldkeys={}
+if not full:
+    # the changed files as the inventory names them
+    cset=set(realPaths(changed,mapfiles))
+    if staged:
+        print(len(changed),"files changed (staged) since",base[:12])
+    else:
+        print(len(changed),"files changed since",base[:12],"or",rev)
+
+    # keys defined by the changed files before the change
+    for item in idlist:
+        if item['directory']!="" and fpath(item) in cset:
+            for key in item.get('keys',[]):
+                oldkeys[key]=fpath(item)
+
+if len(changed)>0:
+    # scan the changed files again
+    newrecs=RescanFiles(changed,mapfiles,idlist,staged)
+    print(len(newrecs),"records scanned again")
+
+# save the result with the commit and the files that differ
+differs=GitChangedFiles(source_spec,head,staged)
+if differs==None:
+    exit(1)
+SaveInventory(invfile,source_spec,mapfiles,idlist,
+    {'revision':head,'content':'staged' if staged else 'tree','differs':differs})
+
+if full:
+    touched=list(idlist)
+else:
+    touched=newrecs
+
+    # update the term index for the changed files
+    if termfile!=None and os.path.exists(termfile):
+        index=TermIndex()
+        if index.load(termfile):
+            for c in cset:
+                index.removeFile(c)
+            for item in newrecs:
+                index.removeFile(fpath(item))
+            for item in newrecs:
+                index.addRecord(item)
+            index.save(termfile)
+
+print(" ")
+
+# one pass over the inventory for the index of the targets
+# references can point to (see recordTargets), the keys
+# defined now, the records with references into the changed
+# files and those using keys
+root=canonPath(getpdir())
+targets=set()
+keymaster=set()
+referrers=[]
+keyrefusers=[]
+for item in idlist:
+    if item['directory']=="":
+        continue
+    targets.update(recordTargets(item,root))
+    for key in item.get('keys',[]):
+        keymaster.add(key)
+    if len(touched)<len(idlist) and not fpath(item) in cset:
+        for h in item.get('hrefs',[]):
+            if hrefFile(h) in cset:
+                referrers.append(item)
+                break
+    if len(oldkeys)>0 and len(item.get('keyrefs',[]))>0:
+        keyrefusers.append(item)
+
+# check the key references of the rescanned records, and
+# the users of keys the changed files no longer define
+keyusers=[]
+for item in newrecs:
+    for keyr in item.get('keyrefs',[]):
+        keyusers.append((item,keyr))
+for item in keyrefusers:
+    for keyr in item['keyrefs']:
+        key, kid = parseKeyref(keyr)
+        if key in oldkeys and not key in keymaster:
+            keyusers.append((item,key))
+seenkey=set()
+for item, keyr in keyusers:
+    key, kid = parseKeyref(keyr)
+    if not key in keymaster and not (itemNode(item),keyr) in seenkey:
+        seenkey.add((itemNode(item),keyr))
+        print("missing key definition:",ppath(fpath(item)))
+        print("  -> ",keyr)
+        nbad=nbad+1
+
+# check the references of the rescanned records
+for item in touched:
+    for i in range(len(item.get('hrefs',[]))):
+        checkRef(item,i)
+
+# check references from other files into the changed files
+for item in referrers:
+    for i in range(len(item['hrefs'])):
+        if hrefFile(item['hrefs'][i]) in cset:
+            checkRef(item,i)
+
+print(" ")
+print(nbad,"problems found")
+print(" ")
+print("end ditachanged:",source_spec)
+print(" ")
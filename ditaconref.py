@@ -0,0 +1,105 @@
+# PROLOG SECTION
+# ditaconref.py
+#
+# A program that resolves every conref and conkeyref in
+# one or more ditamaps and reports the ones that fail:
+# missing targets, undefined keys, conref cycles, and
+# elements that reuse content of a different type.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+nref=0
+nfail=0
+linelimit=100
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+
+# get map(s) to be processed
+source_spec = GetInputPath()
+
+# startup message
+print(" ")
+print("ditaconref:",source_spec)
+print(" ")
+      
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# scan for files
+GetMapInventory(mapfiles,idlist,source_spec)
+
+resolver=ConrefResolver(getKeyTargets(idlist))
+
+# files to check, in scan order
+sources=[]
+seen=set()
+for item in idlist:
+    if isSource(item):
+        f=fpath(item)
+        if not f in seen:
+            seen.add(f)
+            sources.append(f)
+
+for f in sources:
+    tree=resolver.tree(f)
+    if tree==None:
+        continue
+    for e in tree.getroot().xpath("//*[@conref or @conkeyref]"):
+        nref=nref+1
+        target, msg = resolver.targetOf(e,f)
+        if target==None:
+            result=ConrefResult(False,e.tag,[],msg,None)
+        else:
+            result=resolver.resolve(target)
+            if result.ok and result.tag!=e.tag:
+                result=ConrefResult(False,result.tag,result.chain,
+                                    "type mismatch: "+e.tag+" uses "+result.tag,None)
+        if not result.ok:
+            nfail=nfail+1
+            if nfail<=linelimit:
+                ref=e.get('conref') or e.get('conkeyref')
+                print("Bad conref:",ppath(f)+":"+str(e.sourceline),"<"+e.tag+">",ref)
+                print("  -> ",result.error)
+                for c in result.chain:
+                    print("     ",ppath(c))
+
+if nfail>linelimit:
+    print("\nonly first",linelimit,"displayed")
+
+print(" ")
+print(nref,"conrefs checked,",len(resolver.memo),"distinct targets resolved")
+print(nfail,"conrefs could not be resolved")
+print(" ")
+print("end ditaconref:",source_spec)
+print(" ")
@@ -4,6 +4,21 @@
 #
 # A program that lists bad references in one or more ditamaps.
 #
+# With --validate each file is also checked against the DTD
+# its DOCTYPE declares. DTDs are found through the OASIS XML
+# catalog(s) given with --catalog=file[,file] (default: the
+# XML_CATALOG_FILES environment variable), never the network,
+# and the files are checked on --jobs=n workers.
+#
+# With --store=file (or --store for a temporary file) the
+# records are kept in an SQLite database instead of memory,
+# and references and keys are looked up by indexed queries.
+#
+# In repair mode the repaired files are written together at
+# the end as one transaction, journaled in the .ditarepair
+# directory, so an interrupted repair can be finished or
+# undone with ditajournal.py.
+#
 # Tested with Python 3.1.2 and the lxml module installed.
 # July 19, 2010
 #
@@ -17,12 +32,22 @@
 ###################################
 
 # import needed modules
+from   lxml import etree
 from DITAmod import *
 
 ###################################
 # FUNCTION DEFINITION SECTION
 ###################################
 
+#
+# Function to return " (line n)" for entry i of a record's
+# list of source lines, or "" if the line is not known
+#
+def showLine(lines,i):
+    if i<len(lines) and lines[i]!=None:
+        return " (line %d)" % lines[i]
+    return ""
+
 
 ###################################
 # PROCESSING INITIALIZATION SECTION
@@ -35,15 +60,32 @@ idlist=[]
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+# keep the records in an SQLite database instead of memory (--store)
+setstore(StoreFromArgs())
+if getstore()!=None:
+    idlist=getstore()
 
 # control whether running in repair mode
 fixflag=False
 
-if len(sys.argv)>2:
+if len(GetArgs())>1:
 	fixflag=True
 
 # get map(s) to be processed
 source_spec = GetInputPath()
+# show the maps each bad reference belongs to?
+mapflag = GetOption("bymap",False)
+graph = None
+if mapflag:
+    graph = RefGraph()
+# check the files against their DTDs too?
+validflag = GetOption("validate",False)
 
 # startup message
 print(" ")
@@ -58,6 +100,16 @@ else:
     spec_dir = os.path.dirname(source_spec)
     
 print(" ")
+
+# repairs are planned during the scan and written at the end
+txn=None
+if fixflag:
+    txn=RepairTransaction(os.path.join(spec_dir,REPAIR_DIR))
+    if txn.blocked():
+        print("An unfinished repair is recorded in",txn.journal)
+        print("finish it with ditajournal.py --resume, undo it with --rollback,")
+        print("or look at it with ditajournal.py")
+        exit(1)
       
 ###################################
 #
@@ -68,10 +120,13 @@ print(" ")
 # scan the input files
 if fixflag:
     # read all files if we want to fix problems
-    GetFileInventory(mapfiles,source_spec,idlist)
+    GetFileInventory(mapfiles,source_spec,idlist,graph)
 else:
     # only read files included in a map
-    GetMapInventory(mapfiles,idlist,source_spec)
+    GetMapInventory(mapfiles,idlist,source_spec,graph)
+
+if mapflag:
+    members=MapMembership(getRootMaps(source_spec),graph)
 
 if len(idlist)==0:
     print("No files found.")
@@ -81,11 +136,16 @@ if len(idlist)==0:
 # First look for and report invalid key references
 #
 keymaster=[]
-for item in idlist:
-    # create the list of keys that have been defined
-    if 'keys' in item and item['keys']!=[]:
-        for key in item['keys']:
-            keymaster=keymaster+key.split(" ")
+if getstore()!=None:
+    # the store has indexed the keys as the records came in
+    keymaster=list(getstore().definedKeys())
+else:
+    for item in idlist:
+        # create the list of keys that have been defined
+        if 'keys' in item and item['keys']!=[]:
+            for key in item['keys']:
+                keymaster=keymaster+key.split(" ")
+keyset=set(keymaster)
 
 # list all the defined key strings
 if len(keymaster)>0:
@@ -102,46 +162,73 @@ linelimit=50
 for item in idlist:
     # check that keys references point to defined keys
     if 'keyrefs' in item and item['keyrefs']!=[]:
-        for keyr in item['keyrefs']:
+        keylines=item.get('keyreflines',[])
+        for i in range(len(item['keyrefs'])):
+            keyr=item['keyrefs'][i]
             key, kid = parseKeyref(keyr)
             # is the key reference in the list of defined keys?
-            if key in keymaster:
+            if key in keyset:
                 pass
             else:
                 # error, key has not been defined
                 if nline>linelimit:
                     break
-                print("missing key definition:",ppath(fpath(item)))
+                print("missing key definition:",ppath(fpath(item))+showLine(keylines,i))
                 print("  -> ",keyr)
+                if mapflag:
+                    inmaps=[ppath(m) for m in members.mapsContaining(fpath(item))]
+                    print("  in maps:",", ".join(inmaps) or "(none)")
                 nline=nline+1
 
 if nline>=linelimit:
     print("\nonly first",nline,"displayed")
     
+#
+# Validate the files against the DTDs their DOCTYPEs declare,
+# resolved through the XML catalog(s) given with --catalog
+# (or XML_CATALOG_FILES), on --jobs workers
+#
+invalid={}
+if validflag:
+    catalogs=GetOption("catalog")
+    if catalogs!=None:
+        catalogs=catalogs.split(",")
+    invalid=ValidateInventory(idlist,DTDCache(Catalog(catalogs)),int(GetOption("jobs","0")))
+    print(len(invalid),"files not valid against their DTDs")
+
 #
 # Second look for and report bad href/conref references
+# (and the DTD errors of each file)
 #
 print(" ")
 nline=0
 linelimit=100
 setdebug(False)
+prog=getprogress()
 # loop through the big list
 for item in idlist:
     itempath=fpath(item)
+    # stop early if the time or memory budget is used up
+    if prog!=None and prog.over():
+        break
     # only process DITA source files
     if isSource(item):
         if nline>linelimit:
             break
-        # parse the XML file
+        # the XML file is parsed only if it needs repairs
         total_fixes=0
-        tree=etree.parse(itempath)
+        tree=None
         if 'hrefs' in item:
             if nline>linelimit:
                 break
+            hreflines=item.get('hreflines',[])
             # loop through all references in a file
-            for href in item['hrefs']:
+            for i in range(len(item['hrefs'])):
+                href=item['hrefs'][i]
                 if nline>linelimit:
                     break
+                if prog!=None:
+                    prog.check()
                 # ref must not be a URL
                 if not isURL(href):
                     # parse the file reference
@@ -155,22 +242,55 @@ for item in idlist:
                             tid="#"+item['topicid']
                         else:
                             tid=""
-                        print("Bad reference:",ppath(itempath)+tid)
+                        print("Bad reference:",ppath(itempath)+tid+showLine(hreflines,i))
                         badref=makeRef(hdir,hfile,htopic,hcontent)
                         print("  -> ",ppath(badref))
+                        if mapflag:
+                            inmaps=[ppath(m) for m in members.mapsContaining(itempath)]
+                            print("  in maps:",", ".join(inmaps) or "(none)")
                         # try to fix the problem if requested
                         if fixflag:
-                            fixes=FixHrefs(tree,item,href,idlist)
+                            if tree==None:
+                                tree=etree.parse(itempath)
+                            line=0
+                            if i<len(hreflines):
+                                line=hreflines[i]
+                            fixes=FixHrefs(tree,item,href,idlist,line)
                             total_fixes=total_fixes+fixes
                         nline=nline+1
 
+        # DTD errors, once per file
+        if itempath in invalid:
+            print("Invalid file:",ppath(itempath))
+            for line, msg in invalid.pop(itempath):
+                if line>0:
+                    print("   line %d: %s" % (line,msg))
+                else:
+                    print("  ",msg)
+            if mapflag:
+                inmaps=[ppath(m) for m in members.mapsContaining(itempath)]
+                print("  in maps:",", ".join(inmaps) or "(none)")
+            nline=nline+1
+
         if total_fixes>0:
             outfile=itempath
             print("writing file",outfile)
-            tree.write(outfile)
+            txn.add(outfile,etree.tostring(tree))
                     
 if nline>=linelimit:
     print("\nonly first",nline,"displayed")
+
+# write the repaired files
+if txn!=None and len(txn)>0:
+    try:
+        txn.commit()
+    except KeyboardInterrupt:
+        print("repair interrupted: finish it with ditajournal.py --resume or undo it with --rollback")
+        raise
+    print(len(txn.entries),"files repaired (undo with ditajournal.py --rollback)")
+
+if prog!=None and prog.stopped==None:
+    prog.report()
                         
          
 print(" ")
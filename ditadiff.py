@@ -0,0 +1,113 @@
+###################################
+# PROLOG SECTION
+# ditadiff.py
+#
+# A program that reports what changed in a project between
+# two saved scans, such as the last release and this one.
+#
+#   ditadiff.py old-scan new-scan
+#
+# A scan is an inventory saved by ditachanged.py --inventory
+# or ditashard.py --out, or a snapshot saved by ditaindex.py.
+# The report lists the files added and removed, the files
+# whose topic IDs changed, the references and key references
+# that are newly broken, the keys removed, the keys whose
+# target changed and the topics whose references point
+# somewhere else. Paths are relative to the project of each
+# scan, so scans of two copies of the tree can be compared.
+#
+# Records are compared by digest (see DiffScans), so the
+# time grows with the size of the project, not with the
+# size of a text diff of the reports.
+#
+# Tested with Python 3.12.2.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to print a section heading with a count
+#
+def showTitle(title,items):
+    print(" ")
+    title=title+" ("+str(len(items))+")"
+    print(title)
+    print("="*len(title))
+
+#
+# Print the differences found (see DiffScans)
+#
+def showReport(report):
+    showTitle("Files added",report['added'])
+    for f in report['added']:
+        print("  ",f)
+    showTitle("Files removed",report['removed'])
+    for f in report['removed']:
+        print("  ",f)
+    showTitle("Topic IDs changed",report['ids'])
+    for f, oldids, newids in report['ids']:
+        print("  ",f+":",", ".join(oldids),"->",", ".join(newids))
+    showTitle("Newly broken references",report['broken']+report['badkeys'])
+    for src, t in report['broken']:
+        print("Bad reference:",src)
+        print("  -> ",t)
+    for src, kr in report['badkeys']:
+        print("missing key definition:",src)
+        print("  -> ",kr)
+    showTitle("Keys removed",report['keys'])
+    for k in report['keys']:
+        print("  ",k)
+    showTitle("Key targets changed",report['keytargets'])
+    for k, oldt, newt in report['keytargets']:
+        print("  ",k+":",oldt or "(none)","->",newt or "(none)")
+    showTitle("Reference targets changed",report['targets'])
+    for node, removed, added in report['targets']:
+        print("  ",node)
+        for t in removed:
+            print("      -",t)
+        for t in added:
+            print("      +",t)
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+args = GetArgs()
+
+# startup message
+print(" ")
+print("ditadiff:"," ".join(args))
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+if len(args)!=2:
+    print("Give the old scan and the new scan.")
+    exit(1)
+
+report=DiffScans(args[0],args[1])
+if report==None:
+    print("The scans could not be compared.")
+    exit(1)
+
+showReport(report)
+
+print(" ")
+print(report['same'],"records unchanged,",report['changed'],"changed")
+print(" ")
+print("end ditadiff:"," ".join(args))
+print(" ")
@@ -0,0 +1,171 @@
+# PROLOG SECTION
+# ditadups.py
+#
+# A program that finds groups of nearly identical topics
+# in one or more ditamaps (or a whole directory with --all).
+#
+#   ditadups.py map-or-dir [--threshold=0.8] [--all]
+#
+# Each topic gets a MinHash signature while it is scanned.
+# Signatures are split into bands and only topics that share
+# a band are compared (locality-sensitive hashing), so the
+# work grows with the number of topics, not the number of
+# pairs.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to pick the number of rows per band. The LSH
+# threshold (1/bands)**(1/rows) is kept below the requested
+# similarity so that few real duplicates are missed.
+#
+def bandRows(threshold):
+    best=1
+    for rows in (1,2,4,8,16,32):
+        bands=MINHASH_SIZE//rows
+        if (1.0/bands)**(1.0/rows) <= threshold-0.1:
+            best=rows
+    return best
+
+#
+# Function to find the root of a union-find entry
+#
+def findRoot(parent,i):
+    while parent[i]!=i:
+        parent[i]=parent[parent[i]]
+        i=parent[i]
+    return i
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+setsignatures(True)
+
+# get map(s) to be processed
+source_spec = GetInputPath()
+threshold = float(GetOption("threshold","0.8"))
+allflag = GetOption("all",False)
+
+# startup message
+print(" ")
+print("ditadups:",source_spec)
+print(" ")
+      
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# scan for files
+if allflag:
+    GetFileInventory(mapfiles,source_spec,idlist)
+else:
+    GetMapInventory(mapfiles,idlist,source_spec)
+
+# topics with a signature; topics with identical signatures
+# are joined at once and only the first one takes part in
+# the bucket comparisons
+topics=[]
+reps=[]
+firstsig={}
+for item in idlist:
+    if 'minhash' in item and len(item['minhash'])>0 and not isDITAMap(item['basename']):
+        sigkey=tuple(item['minhash'])
+        if sigkey in firstsig:
+            firstsig[sigkey].append(len(topics))
+        else:
+            firstsig[sigkey]=[len(topics)]
+            reps.append(len(topics))
+        topics.append(item)
+
+parent=list(range(len(topics)))
+best={}
+for sigkey in firstsig:
+    same=firstsig[sigkey]
+    if len(same)>1:
+        for m in same:
+            parent[m]=same[0]
+            best[m]=1.0
+
+# put topics that share a band of their signature in a bucket
+rows=bandRows(threshold)
+buckets={}
+for i in reps:
+    sig=topics[i]['minhash']
+    for b in range(0,len(sig),rows):
+        bkey=(b,tuple(sig[b:b+rows]))
+        if bkey in buckets:
+            buckets[bkey].append(i)
+        else:
+            buckets[bkey]=[i]
+
+# check the candidate pairs and join the similar ones
+compared=set()
+for bkey in buckets:
+    members=buckets[bkey]
+    if len(members)<2:
+        continue
+    for j in range(1,len(members)):
+        for k in range(j):
+            pair=(members[k],members[j])
+            if pair in compared:
+                continue
+            compared.add(pair)
+            sim=sigSimilarity(topics[pair[0]]['minhash'],topics[pair[1]]['minhash'])
+            if sim>=threshold:
+                r0=findRoot(parent,pair[0])
+                r1=findRoot(parent,pair[1])
+                if r0!=r1:
+                    parent[r1]=r0
+                for m in pair:
+                    best[m]=max(best.get(m,0.0),sim)
+
+# collect the clusters
+clusters={}
+for i in best:
+    r=findRoot(parent,i)
+    if r in clusters:
+        clusters[r].append(i)
+    else:
+        clusters[r]=[i]
+
+nclus=0
+for r in sorted(clusters, key=lambda c: -len(clusters[c])):
+    nclus=nclus+1
+    print("cluster",nclus,"(%d topics)" % len(clusters[r]))
+    for i in sorted(clusters[r], key=lambda m: itemNode(topics[m])):
+        print("  %4.2f  %s" % (best[i],ppath(itemNode(topics[i]))))
+    print(" ")
+
+print(len(topics),"topics compared,",len(compared),"candidate pairs checked")
+print(nclus,"clusters of near-duplicate topics (similarity >= %.2f)" % threshold)
+print(" ")
+print("end ditadups:",source_spec)
+print(" ")
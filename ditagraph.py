@@ -0,0 +1,102 @@
+# PROLOG SECTION
+# ditagraph.py
+#
+# A program that builds the reference graph for one or
+# more ditamaps and exports it, or lists the references
+# to and from a single file or topic.
+#
+#   ditagraph.py map-or-dir [--format=dot|graphml|json] [--out=file]
+#   ditagraph.py map-or-dir --to=file[#topicid]
+#   ditagraph.py map-or-dir --from=file[#topicid]
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to turn a command line file[#topicid]
+# into a graph node
+#
+def argNode(a):
+    p=a.find('#')
+    if p>-1:
+        return canonPath(a[0:p])+a[p:]
+    return canonPath(a)
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+graph=RefGraph()
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+
+# get map(s) to be processed
+source_spec = GetInputPath()
+fmt = GetOption("format","dot")
+outfile = GetOption("out")
+tonode = GetOption("to")
+fromnode = GetOption("from")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# scan for files, building the graph as we go
+GetMapInventory(mapfiles,idlist,source_spec,graph)
+
+if tonode!=None or fromnode!=None:
+    # list the references to or from a node
+    print(" ")
+    print("ditagraph:",source_spec)
+    print(" ")
+    if tonode!=None:
+        node=argNode(tonode)
+        print("references to",ppath(node))
+        for src, etype in sorted(graph.sources(node)):
+            print("  ",etype.ljust(10),ppath(src))
+    if fromnode!=None:
+        node=argNode(fromnode)
+        print("references from",ppath(node))
+        for dst, etype in sorted(graph.targets(node)):
+            print("  ",etype.ljust(10),ppath(dst))
+    print(" ")
+    print("end ditagraph:",source_spec)
+    print(" ")
+else:
+    # export the whole graph
+    if outfile!=None:
+        out=open(outfile,"w",encoding="utf-8")
+    else:
+        out=sys.stdout
+    if fmt=="graphml":
+        graph.writeGraphML(out)
+    elif fmt=="json":
+        graph.writeJSON(out)
+    else:
+        graph.writeDOT(out)
+    if outfile!=None:
+        out.close()
@@ -5,6 +5,9 @@
 # A program that lists topic ids in DITA source
 # files and flags duplicates.
 #
+# With --store=file the records are kept in an SQLite
+# database, which also sorts the ids.
+#
 # Tested with Python 3.2 and the lxml module installed.
 # May 1, 2011
 #
@@ -35,6 +38,18 @@ idlist=[]
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+# only the topic ids are reported
+setfields(['topicid'])
+# keep the records in an SQLite database instead of memory (--store)
+setstore(StoreFromArgs())
+if getstore()!=None:
+    idlist=getstore()
 
 # get map(s) to be processed
 source_spec = GetInputPath()
@@ -56,17 +71,24 @@ GetMapInventory(mapfiles,idlist,source_spec)
 if len(idlist)==0:
     print("No files found.")
 else:
-    topiclist=[]
-    for l in idlist:
-        # only look in source files
-        if isSource(l):
-            flpath=fpath(l)
-            if 'topicid' in l:
-                topicid=l['topicid']
+    if getstore()!=None:
+        # let the database sort the ids (and keep them)
+        topiclist=getstore().topicIDs()
+        ntopics=getstore().countSources()
+    else:
+        topiclist=[]
+        for l in idlist:
+            # only look in source files
+            if isSource(l):
+                flpath=fpath(l)
+                if 'topicid' in l:
+                    topicid=l['topicid']
                 
-            else:
-                topicid=""
-            topiclist.append([topicid,flpath])
+                else:
+                    topicid=""
+                topiclist.append([topicid,flpath])
+        topiclist=sorted(topiclist)
+        ntopics=len(topiclist)
     
     
     pad=35*" "
@@ -75,7 +97,7 @@ else:
     dupind=False
     ndup=0
     # print out the results
-    for ll in sorted(topiclist):
+    for ll in topiclist:
         tid=ll[0]
         tfile=ll[1]
         ptid=(tid+pad)[0:35]
@@ -101,7 +123,7 @@ else:
         
             
 print(" ")
-print("Total topics",len(topiclist))
+print("Total topics",ntopics)
 print(" ")
 print(ndup,"duplicate IDs")
 print(" ")
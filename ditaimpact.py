@@ -0,0 +1,111 @@
+# PROLOG SECTION
+# ditaimpact.py
+#
+# A program that lists the maps and topics affected
+# by a set of changed files, so that only those need
+# to be validated and published again.
+#
+#   ditaimpact.py map-or-dir changed-file ...
+#   git diff --name-only | ditaimpact.py map-or-dir
+#
+# With --paths only the affected file paths are printed,
+# one per line, for use by other scripts.
+#
+# With --index=file the reference graph is taken from the
+# edges stored in a project snapshot (see ditaindex.py), so
+# no file is read when the snapshot holds all of them. The time reported covers building the
+# graph and finding what is affected.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+import time
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+start=time.perf_counter()
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+
+# get map(s) to be processed and the changed files
+source_spec = GetInputPath()
+changed = GetArgs()[1:]
+if len(changed)==0 or changed==["-"]:
+    # read the changed files from stdin
+    changed=[]
+    for line in sys.stdin:
+        line=line.strip()
+        if len(line)>0:
+            changed.append(line)
+pathsonly = GetOption("paths",False)
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+graph=None
+if getsnapshot()!=None:
+    # the graph stored in the snapshot, if it holds every
+    # file the maps reach
+    setpdir(source_spec)
+    graph=getsnapshot().refGraph(getRootMaps(source_spec))
+if graph==None:
+    # scan for files, building the graph as we go
+    graph=RefGraph()
+    GetMapInventory(mapfiles,idlist,source_spec,graph)
+
+cfiles=[canonPath(c) for c in changed]
+maps, topics = graph.impact(cfiles)
+elapsed=time.perf_counter()-start
+
+if pathsonly:
+    for m in sorted(maps):
+        print(m)
+    for t in sorted(topics):
+        print(t)
+else:
+    print(" ")
+    print("ditaimpact:",source_spec)
+    print(" ")
+    print(len(cfiles),"changed files")
+    print(" ")
+    print("Affected maps")
+    print("=============")
+    for m in sorted(maps):
+        print("  ",ppath(m))
+    print(" ")
+    print("Affected topics")
+    print("===============")
+    for t in sorted(topics):
+        print("  ",ppath(t))
+    print(" ")
+    print("%d maps, %d topics affected (%.1f ms)" % (len(maps),len(topics),elapsed*1000))
+    print(" ")
+    print("end ditaimpact:",source_spec)
+    print(" ")
@@ -0,0 +1,128 @@
+###################################
+# PROLOG SECTION
+# ditaindex.py
+#
+# A program that saves a scan of a project as a compact
+# snapshot file, which the other tools then read with
+# --index=file instead of parsing the source files again.
+#
+#   ditaindex.py map-or-dir --out=file [--signatures]
+#       scan a map (and everything it reaches) or a whole
+#       directory and save the snapshot; --signatures also
+#       saves the MinHash signatures ditadups.py needs
+#
+#   ditaindex.py map-or-dir --index=file [--find=path]
+#       describe a snapshot, or list the records of one file
+#       and the references to and from it
+#
+# The snapshot is memory-mapped, so opening it costs the same
+# for any project size and processes that open the same
+# snapshot share its pages. It records the files as they were
+# when it was saved; files it does not hold are scanned as
+# usual, so save it again after the sources change.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to print what a snapshot holds
+#
+def showSnapshot(snap):
+    print("snapshot:",snap.path,"(%d bytes)" % os.path.getsize(snap.path))
+    print("  source: ",snap.source)
+    print("  project:",snap.project)
+    print("  records:",len(snap))
+    print("  files:  ",len(snap.sec['paths'])//3)
+    print("  keys:   ",len(snap.sec['keys'])//2)
+    print("  edges:  ",len(snap.sec['edges'])//3)
+    print("  strings:",snap.nstrings)
+    print("  fields: ",", ".join([name for name, ftype in snap.fields]))
+
+#
+# Function to print the records of a file and the edges
+# to and from it
+#
+def showFile(snap,f):
+    absf=canonPath(f)
+    recs=snap.fileRecords(absf)
+    if len(recs)==0:
+        print("not in snapshot:",absf)
+        return
+    for r in recs:
+        print(fpath(r))
+        for name in sorted(r):
+            if name in ('directory','basename','minhash'):
+                continue
+            print("   %-12s %s" % (name,r[name]))
+    nodes=[absf]+[absf+"#"+r['topicid'] for r in recs if 'topicid' in r]
+    for node in nodes:
+        for t, rtype in snap.targets(node):
+            print("  ->",ppath(t),"("+rtype+")")
+        for src, rtype in snap.sources(node):
+            print("  <-",ppath(src),"("+rtype+")")
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+setsignatures(GetOption("signatures",False))
+
+source_spec = GetInputPath()
+outfile = GetOption("out")
+findpath = GetOption("find")
+
+# startup message
+print(" ")
+print("ditaindex:",source_spec)
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+snap=SnapshotFromArgs()
+if snap!=None:
+    # report from an existing snapshot
+    if findpath!=None:
+        showFile(snap,findpath)
+    else:
+        showSnapshot(snap)
+    snap.close()
+elif outfile==None:
+    print("Give --out=file to save a snapshot or --index=file to read one.")
+    exit(1)
+else:
+    if os.path.isdir(source_spec):
+        GetFileInventory(mapfiles,source_spec,idlist)
+    else:
+        GetMapInventory(mapfiles,idlist,source_spec)
+    SaveSnapshot(outfile,source_spec,mapfiles,idlist)
+    print(len(idlist),"records from",len(mapfiles),"files saved to",outfile)
+
+print(" ")
+print("end ditaindex:",source_spec)
+print(" ")
@@ -0,0 +1,101 @@
+###################################
+# PROLOG SECTION
+# ditajournal.py
+#
+# A program that shows, finishes or undoes the last repair
+# made by ditadebug.py or DITARepair.py in a directory.
+#
+#   ditajournal.py [dir]             show the repair and where
+#                                    each file stands
+#   ditajournal.py [dir] --resume    finish an interrupted repair
+#   ditajournal.py [dir] --rollback  put back the files it changed
+#   ditajournal.py [dir] --discard   forget it (it can no longer
+#                                    be rolled back)
+#
+# Repairs are journaled in the .ditarepair directory of the
+# directory that was repaired (see RepairTransaction). Files
+# changed by something else since the repair are left alone
+# and listed; a rollback keeps their journal and backups so
+# it can be run again.
+#
+# Tested with Python 3.12.2.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Function to list the files another program changed
+#
+def showConflicts(txn):
+    for f in txn.conflicts:
+        print("changed since the repair, left alone:",ppath(f))
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+source_spec = GetInputPath()
+setpdir(source_spec)
+
+# startup message
+print(" ")
+print("ditajournal:",source_spec)
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+txn=RepairTransaction(os.path.join(source_spec,REPAIR_DIR))
+
+if txn.state==None:
+    print("No repair is recorded.")
+elif GetOption("discard",False):
+    txn.discard()
+    print("repair journal removed")
+elif txn.state=="unreadable":
+    print("The repair journal",txn.journal,"cannot be read:",txn.error)
+    print("The backups are in",os.path.join(txn.dir,"backup")+"; remove them with --discard.")
+elif GetOption("resume",False):
+    if txn.state=="conflicts":
+        print("The repair was partly rolled back; finish that with --rollback.")
+    elif txn.resume():
+        print(len(txn.entries),"files repaired")
+    elif txn.state==None:
+        print("The repair was interrupted before any file was changed.")
+    showConflicts(txn)
+elif GetOption("rollback",False):
+    n=len(txn.entries)
+    txn.rollback()
+    print(n-len(txn.conflicts),"files put back")
+    showConflicts(txn)
+    if len(txn.conflicts)>0:
+        print("The journal and the backups of these files are kept in",txn.dir)
+        print("Put back the repaired contents and run --rollback again, or --discard.")
+else:
+    print("repair state:",txn.state)
+    counts=collections.Counter()
+    for e in txn.entries:
+        st="planned"
+        if txn.state!="preparing":
+            st=txn.entryState(e)
+        counts[st]+=1
+        print("  %-9s %s" % (st,ppath(e['path'])))
+    print(" ")
+    print(", ".join(["%d %s" % (counts[k],k) for k in sorted(counts)]))
+
+print(" ")
+print("end ditajournal:",source_spec)
+print(" ")
@@ -1,9 +1,18 @@
 #
 # PROLOG SECTION
-# ditunused.py
+# ditakeywords.py
 #
 # A program that lists keywords used in one or more ditamaps.
 #
+# The keywords, index terms and (with --titles) title words
+# can be saved in a term index file with --terms=file.
+# The index answers queries without scanning again:
+#
+#   ditakeywords.py map-or-dir --terms=file --find=term [--prefix] [--nocase]
+#
+# --index names a project snapshot (see ditaindex.py) to read
+# the files from, as in the other tools.
+#
 # Tested with Python 3.12.2 and the lxml module installed.
 # May 23, 2024
 #
@@ -23,6 +32,17 @@ from DITAmod import *
 # FUNCTION DEFINITION SECTION
 ###################################
 
+#
+# Function to print the result of a term index query
+#
+def showLookup(index,term):
+    found=index.lookup(term,GetOption("prefix",False),GetOption("nocase",False))
+    pad=35*" "
+    for t, kind, loc in found:
+        print("%35s %-10s %s" % ((t+pad)[0:35],kind,ppath(loc)))
+    print(" ")
+    print(len(found),"places found for",term)
+
 
 ###################################
 # PROCESSING INITIALIZATION SECTION
@@ -35,9 +55,22 @@ idlist=[]
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
 
 # get map(s) to be processed
 source_spec = GetInputPath()
+indexfile = GetOption("terms")
+findterm = GetOption("find")
+# only the terms (and the titles, with --titles) are indexed
+if GetOption("titles",False):
+    setfields(['keywords','indexterms','title'])
+else:
+    setfields(['keywords','indexterms'])
 # debug
 #source_spec="C:/DITAdemo/DITAinformationcenter_DOCUMENTATION/demo.ditamap"
 # startup message
@@ -57,8 +90,32 @@ print(" ")
 #
 ###################################
 
-# scan map files
-GetMapInventory(mapfiles,idlist,source_spec)
+# answer a query from a saved index without scanning
+if findterm!=None and indexfile!=None and os.path.exists(indexfile):
+    setpdir(source_spec)
+    index=TermIndex()
+    if index.load(indexfile):
+        showLookup(index,findterm)
+    print(" ")
+    print("end ditakeywords:",source_spec)
+    print(" ")
+    exit(0)
+
+# scan map files, indexing the terms as we go
+index=TermIndex(GetOption("titles",False))
+GetMapInventory(mapfiles,idlist,source_spec,None,index)
+if indexfile!=None:
+    index.save(indexfile)
+    print("term index saved to",indexfile)
+
+if findterm!=None:
+    # just answer the query
+    print(" ")
+    showLookup(index,findterm)
+    print(" ")
+    print("end ditakeywords:",source_spec)
+    print(" ")
+    exit(0)
 
 print(" ")
 print("ditakeywords:",source_spec)
@@ -37,6 +37,12 @@ timeout=10
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
 
 # get map(s) to be processed
 source_spec = GetInputPath()
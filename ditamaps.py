@@ -0,0 +1,77 @@
+# PROLOG SECTION
+# ditamaps.py
+#
+# A program that lists the maps in a directory that
+# contain each of the given files, or with no files given,
+# how many files each map contains.
+#
+#   ditamaps.py map-dir [file ...]
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+graph=RefGraph()
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+
+# get map(s) to be processed and the files to look up
+source_spec = GetInputPath()
+queries = GetArgs()[1:]
+
+# startup message
+print(" ")
+print("ditamaps:",source_spec)
+print(" ")
+      
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+# scan all the maps once
+GetMapInventory(mapfiles,idlist,source_spec,graph)
+members=MapMembership(getRootMaps(source_spec),graph)
+
+if len(queries)==0:
+    for m in members.maps:
+        print("%6d files  %s" % (len(members.filesInMap(m)),ppath(m)))
+else:
+    for q in queries:
+        print(q)
+        inmaps=members.mapsContaining(canonPath(q))
+        if len(inmaps)==0:
+            print("   (in no map)")
+        for m in inmaps:
+            print("  ",ppath(m))
+
+print(" ")
+print("end ditamaps:",source_spec)
+print(" ")
@@ -0,0 +1,160 @@
+###################################
+# PROLOG SECTION
+# ditashard.py
+#
+# A program that scans a very large directory of DITA files
+# in shards, on several hosts or several processes, and
+# merges the results.
+#
+#   ditashard.py dir --shards=n --shard=i [--bydir] [--out=file]
+#       scan shard i (0 to n-1) of dir into a partial index
+#       (default shard-i-of-n.json)
+#
+#   ditashard.py --merge partial ... [--out=file]
+#       merge partial indexes, report the bad references
+#       and key references, and optionally save the merged
+#       inventory
+#
+#   ditashard.py dir --shards=n [--bydir] [--out=file]
+#       run all n shards as processes on this host, then merge
+#       (the other options, such as --readers or --maxtime, are
+#       passed to every shard; --status=file becomes file.i)
+#
+# Files are split by a hash of their path (or, with --bydir,
+# of their directory) relative to dir, so every host splits
+# the tree the same way.
+#
+# Tested with Python 3.12.2 and the lxml module installed.
+#
+###################################
+
+###################################
+# ENVIRONMENT SETUP SECTION
+###################################
+
+# import needed modules
+from DITAmod import *
+import subprocess
+import tempfile
+
+###################################
+# FUNCTION DEFINITION SECTION
+###################################
+
+#
+# Print the findings of a merge (see MergeShards)
+#
+def showReport(report):
+    if len(report['missing'])>0:
+        print("shards missing:",", ".join([str(i) for i in report['missing']]))
+        print("  references into them were not checked")
+        print(" ")
+    for k, kept, other in report['conflicts']:
+        print("Key defined differently in two shards:",k)
+        print("   ",kept,"(used)")
+        print("   ",other)
+    for src, t in report['bad']:
+        print("Bad reference:",src)
+        print("  -> ",t)
+    for src, kr in report['badkeys']:
+        print("missing key definition:",src)
+        print("  -> ",kr)
+    print(" ")
+    print(len(report['bad']),"bad references,",len(report['badkeys']),"missing key definitions")
+    print(report['remote'],"references between shards:",report['skipped'],
+          "found bad by Bloom filters,",report['lookups'],"looked up")
+
+###################################
+# PROCESSING INITIALIZATION SECTION
+###################################
+
+# initialization of variables
+mapfiles=[]
+idlist=[]
+
+# control debugging level
+setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+
+source_spec = GetInputPath()
+mergeflag = GetOption("merge",False)
+nshards = int(GetOption("shards","1"))
+shard = GetOption("shard")
+bydir = GetOption("bydir",False)
+outfile = GetOption("out")
+
+# startup message
+print(" ")
+print("ditashard:",source_spec)
+print(" ")
+
+###################################
+#
+# MAIN PROCESSING SECTION
+#
+###################################
+
+if mergeflag:
+    # merge partial indexes made elsewhere
+    parts=GetArgs()
+elif shard!=None:
+    # scan one shard
+    shard=int(shard)
+    if outfile==None:
+        outfile="shard-%d-of-%d.json" % (shard,nshards)
+    n=ScanShard(source_spec,outfile,shard,nshards,bydir)
+    print("shard",shard,"of",nshards,":",n,"records saved to",outfile)
+    print(" ")
+    print("end ditashard:",source_spec)
+    print(" ")
+    exit(0)
+else:
+    # run every shard as a process on this host
+    tmpdir=tempfile.mkdtemp()
+    parts=[os.path.join(tmpdir,"shard-%d.json" % i) for i in range(nshards)]
+    # the options each shard is run with, other than which
+    # shard it is and where it goes
+    passed=[]
+    status=None
+    for a in sys.argv[1:]:
+        name=a.split("=")[0]
+        if not a.startswith("--") or name in ("--shards","--shard","--out","--merge"):
+            continue
+        if name=="--status":
+            status=a[len("--status="):]
+        else:
+            passed.append(a)
+    procs=[]
+    for i in range(nshards):
+        cmd=[sys.executable,os.path.abspath(__file__),source_spec,
+             "--shards=%d" % nshards,"--shard=%d" % i,"--out="+parts[i]]+passed
+        if status:
+            # one status file per shard
+            cmd.append("--status=%s.%d" % (status,i))
+        procs.append(subprocess.Popen(cmd,stdout=subprocess.DEVNULL))
+    for p in procs:
+        p.wait()
+
+report=MergeShards(parts,mapfiles,idlist)
+
+if not mergeflag:
+    for p in parts:
+        if os.path.exists(p):
+            os.remove(p)
+    os.rmdir(tmpdir)
+
+if report==None:
+    print("No partial indexes could be merged.")
+    exit(1)
+
+showReport(report)
+if outfile!=None:
+    SaveInventory(outfile,getpdir(),mapfiles,idlist)
+    print("merged inventory saved to",outfile)
+
+print(" ")
+print("end ditashard:",source_spec)
+print(" ")
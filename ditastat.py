@@ -4,6 +4,16 @@
 # A program that displays tag statistics for
 # a set of DITA files.
 #
+#   ditastat.py map-or-dir [--attrs] [--byfile] [--bydir] [--bymap] [--jobs=n]
+#
+# --attrs also counts attribute usage, --byfile, --bydir and
+# --bymap add breakdowns per file, per directory and per root
+# map. The scan that finds the files extracts only the
+# references it follows; the tags are then counted in
+# parallel (--jobs=1 turns this off) with a streaming parser,
+# so memory use stays flat, and each worker's counts are
+# merged at the end.
+#
 # Tested with Python 3.12.2 and the lxml module installed.
 # May 23, 2024
 #
@@ -22,6 +32,35 @@ from DITAmod import *
 # FUNCTION DEFINITION SECTION
 ###################################
 
+#
+# Function to print a table of counts
+#
+def showCounts(counts,indent=""):
+    for tag in sorted(counts):
+        print(indent+str(tag).ljust(40-len(indent)),str(counts[tag]).rjust(10))
+
+#
+# Function to print a breakdown: one table per group
+#
+def showGroups(title,groups,attrgroups):
+    print(" ")
+    print(title)
+    print("="*len(title))
+    for g in sorted(groups):
+        print(ppath(g),"("+str(sum(groups[g].values()))+" tags)")
+        showCounts(groups[g],"   ")
+        if attrflag:
+            print("   attributes:")
+            showCounts(attrgroups[g],"     ")
+
+#
+# Function to add counts to a group of a breakdown
+#
+def addGroup(groups,g,counts):
+    if g in groups:
+        groups[g].update(counts)
+    else:
+        groups[g]=collections.Counter(counts)
 
 ###################################
 # PROCESSING INITIALIZATION SECTION
@@ -30,9 +69,20 @@ from DITAmod import *
 idlist=[]
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
 
 # get map(s) to be processed
 source_spec = GetInputPath()
+attrflag = GetOption("attrs",False)
+fileflag = GetOption("byfile",False)
+dirflag = GetOption("bydir",False)
+mapflag = GetOption("bymap",False)
+jobs = int(GetOption("jobs","0"))
 
 # startup message
 print(" ")
@@ -40,42 +90,74 @@ print("ditastat:",source_spec)
 print(" ")
 
 mapfiles = []
-dstats = {}
+graph = None
+# the scan only finds the files (and, for --bymap, the
+# references and keys that place them in the maps)
+if mapflag:
+    graph = RefGraph()
+    setfields(['hrefs','keys','keyrefs'])
+else:
+    setfields(['hrefs'])
 
 # scan for files
-GetMapInventory(mapfiles,idlist,source_spec)
+GetMapInventory(mapfiles,idlist,source_spec,graph)
 
 # print the number of files found
 print(str(len(mapfiles))+" files in the list\n")
 
 #
-# loop through the files counting the tags in
-# all of them.
+# count the tags in all the files, in parallel
 #
-for f in mapfiles:
-    # try to parse the (XML) file
-    if not isDITAext(f):
-        continue
-    
-    tree=etree.parse(f)
-    if tree!=False:
-        # start at the root element
-        root=tree.getroot()
-        # loop through all the elements
-        items=root.getiterator()
-        for i in items:
-            if etree.iselement(i):
-                # count this tag
-                thistag = str(i.tag)
-                if thistag in dstats:
-                    dstats[thistag] = dstats[thistag]+1
-                else:
-                    dstats[thistag] = 1
+files=[f for f in mapfiles if isDITAext(f) and os.path.exists(f)]
+results=ParallelMap(CountTags,files,jobs)
+
+# merge the per-file counts
+dstats=collections.Counter()
+astats=collections.Counter()
+fgroups={}
+fattrs={}
+dgroups={}
+dattrs={}
+for i in range(len(files)):
+    tags, attrs = results[i]
+    dstats.update(tags)
+    astats.update(attrs)
+    if fileflag:
+        fgroups[files[i]]=tags
+        fattrs[files[i]]=attrs
+    if dirflag:
+        d=os.path.dirname(files[i])
+        addGroup(dgroups,d,tags)
+        addGroup(dattrs,d,attrs)
 
 # print out how many tags of each type were found
 print(len(dstats),"tags found in files:")
-for tag in sorted(dstats):
-    print(tag.ljust(40),str(dstats[tag]).rjust(10))
+showCounts(dstats)
+
+if attrflag:
+    print(" ")
+    print(len(astats),"attributes found in files:")
+    showCounts(astats)
+
+if fileflag:
+    showGroups("Tags per file",fgroups,fattrs)
+
+if dirflag:
+    showGroups("Tags per directory",dgroups,dattrs)
+
+if mapflag:
+    # each file counts toward every root map that reaches it
+    mgroups={}
+    mattrs={}
+    members=MapMembership(getRootMaps(source_spec),graph)
+    for m in members.maps:
+        mgroups[m]=collections.Counter()
+        mattrs[m]=collections.Counter()
+    for i in range(len(files)):
+        for m in members.mapsContaining(files[i]):
+            mgroups[m].update(results[i][0])
+            mattrs[m].update(results[i][1])
+    showGroups("Tags per map",mgroups,mattrs)
 
 print(" ")
 print("end ditastat:")
@@ -5,6 +5,15 @@
 # A program that lists source files not refered to in one or
 # more ditamaps.
 #
+# Only the directories the maps use (those holding files the
+# maps reach) are looked in, and only for DITA files, images
+# and resources: files with the extension of a non-DITA file
+# the maps refer to (a .pdf or .svg, say).
+#
+# With --bymap the report is made for each map on its own:
+# files in the directories a map uses that the map does not
+# reach.
+#
 # Tested with Python 3.12.2 and the lxml module installed.
 # May 23,2024
 #
@@ -32,23 +41,63 @@ def showmapfiles():
         print(f)
 
 #
-# Test to see if a file in in a map
+# Function to return the kind of an unused file:
+# map, topic, image or resource
 #
-def inMaps(f, mapf):
-    if debugMode():
-        print("inMaps",f)
+def fileKind(f):
+    if isDITAMap(f):
+        return "map"
+    elif isDITAext(f):
+        return "topic"
+    elif isImage(f):
+        return "image"
+    else:
+        return "resource"
 
-    rc = False
+#
+# Function to test for hidden files and directories
+# (.git, .svn, editor backups) that are never resources.
+# The file path must be absolute and inside spec_abs.
+#
+def isHidden(f):
+    rel=f[len(spec_abs)+1:]
+    for part in rel.split(os.sep):
+        if part.startswith("."):
+            return True
+    return False
 
-    fnorm = os.path.abspath(f)
+#
+# Function to test if a file is one that can be unused: a
+# DITA file, an image or a resource, in a directory the
+# maps use. Returns the maps using its directory, as a
+# bitset of MapMembership map numbers (0 if none).
+#
+def candidateMaps(f):
+    if isHidden(f):
+        return 0
+    if not (isDITAext(f) or isImage(f) or os.path.splitext(f)[1].lower() in resexts):
+        return 0
+    return dirowners.get(os.path.dirname(f),0)
 
-    for mf in mapf:
-        mfn = os.path.abspath(mf)
-        if mfn == fnorm:
-            rc = True
-            break
-    
-    return rc
+#
+# Function to return the names of the maps in a bitset
+#
+def bitMaps(b):
+    out=[]
+    i=0
+    while b!=0:
+        if b&1:
+            out.append(ppath(members.maps[i]))
+        b=b>>1
+        i=i+1
+    return out
+
+#
+# Function to print an unused file
+#
+def showUnused(afabs,mlist):
+    print(("unused "+fileKind(afabs)+":").ljust(17),ppath(afabs))
+    print("  map:".ljust(17),mlist)
 
 ###################################
 # PROCESSING INITIALIZATION SECTION
@@ -58,13 +107,23 @@ def inMaps(f, mapf):
 mapfiles=[]
 allfiles=[]
 idlist=[]
+graph=RefGraph()
 ucount = 0
 
 # control debugging level
 setdebug(False)
+# report progress and apply budgets (--progress, --status, --maxtime, --maxmem)
+setprogress(ProgressFromArgs())
+# pipelined scanning (--readers, --parsers, --depth)
+setpipeline(*PipelineFromArgs())
+# saved snapshot to read files from (--index)
+setsnapshot(SnapshotFromArgs())
+# only the references and keys are followed
+setfields(['hrefs','keys','keyrefs'])
 
 # get map(s) to be processed
 source_spec = GetInputPath()
+mapflag = GetOption("bymap",False)
 
 # startup message
 print(" ")
@@ -75,7 +134,8 @@ print(" ")
 if os.path.isdir(source_spec):
     spec_dir = source_spec
 else:
-    spec_dir = os.path.dirname(source_spec)
+    spec_dir = os.path.dirname(source_spec) or "."
+spec_abs = canonPath(spec_dir)
     
 print(" ")
       
@@ -85,34 +145,75 @@ print(" ")
 #
 ###################################
 
-# scan map files
-GetMapInventory(mapfiles,idlist,source_spec)
-# get all files in the directory
+# get all files in the directory (the only directory walk)
 GetFileInventory(allfiles,spec_dir,None)
 
-mapdirs = getMapDirs(mapfiles)
+# pick the root maps out of the walk
+if os.path.isdir(source_spec):
+    maps=[]
+    for afile in allfiles:
+        if isDITAMap(afile) and os.path.dirname(canonPath(afile))==spec_abs:
+            maps.append(afile)
+else:
+    maps=[source_spec]
+
+# scan everything reachable from the maps, and find
+# which maps reach each file
+ScanMapClosure(maps,mapfiles,idlist,graph)
+members=MapMembership(maps,graph)
+
+# remember which maps use each directory, and the
+# extensions of the resources they refer to
+dirowners={}
+resexts=set()
+for mf in mapfiles:
+    if not isURL(mf):
+        mfd=os.path.dirname(mf)
+        dirowners[mfd]=dirowners.get(mfd,0)|members.bitsOf(mf)
+        if not (isDITAext(mf) or isImage(mf)):
+            resexts.add(os.path.splitext(mf)[1].lower())
+resexts.discard("")
 
 if debugMode():
-    for md in sorted(mapdirs):
+    for md in sorted(dirowners):
         print("source file directory",ppath(md))
     print(" ")
 
 if len(allfiles)==0:
     print("No files found.")
+elif mapflag:
+    # files each map could use but does not
+    unused={}
+    rootmaps=set(members.maps)
+    for afile in allfiles:
+        afabs = canonPath(afile)
+        if afabs in rootmaps:
+            continue
+        missing = candidateMaps(afabs) & ~members.bitsOf(afabs)
+        i=0
+        while missing!=0:
+            if missing&1:
+                unused.setdefault(i,[]).append(afabs)
+            missing=missing>>1
+            i=i+1
+    for i in range(len(members.maps)):
+        print("Map",ppath(members.maps[i]))
+        for afabs in unused.get(i,[]):
+            print(("  unused "+fileKind(afabs)+":").ljust(17),ppath(afabs))
+            ucount=ucount+1
+        print(" ")
 else:
-    # loop through all source and image files to see if they are a map
+    # loop through all files to see if they are used by a map
     ucount=0
     for afile in allfiles:
-        if isDITAext(afile) or isImage(afile) and not isURL(afile):
-            # is the file in the map?
-            afabs = os.path.abspath(afile)
-            afd = os.path.dirname(afabs)
-            if afd in mapdirs:
-                if not inMaps(afile,mapfiles):
-                    # oh oh! file is not in the map
-                    print("unused file:",ppath(afile))
-                    missingf = afile
-                    ucount=ucount+1
+        afabs = canonPath(afile)
+        owners = candidateMaps(afabs)
+        if owners==0 or members.bitsOf(afabs)!=0:
+            continue
+        # oh oh! file is not in the map
+        mlist = ", ".join(sorted(bitMaps(owners)))
+        showUnused(afabs,mlist)
+        ucount=ucount+1
                 
     
 if ucount>0:
@@ -126,5 +227,3 @@ else:
 print(" ")
 print("end ditaunused:",source_spec)
 print(" ")
-
-